@@ -26,14 +26,18 @@ setup(
         'Topic :: Software Development :: Libraries :: Python Modules',
     ],
 
-    packages=['taiga'],
+    packages=['taiga', 'taiga.ext'],
+    package_data={'taiga': ['templates/*.html']},
     install_requires=[
         'cached-property',
         'werkzeug',
+        'jinja2',
     ],
     extras_require={
         'test': ['nose', 'coverage'],
         'dev': ['ipython'],
+        'fast': ['orjson'],
+        'compression': ['brotli', 'zstandard'],
     },
     zip_safe=False,
     include_package_data=True,
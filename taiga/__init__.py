@@ -1,5 +1,50 @@
-from .application import Application
-from .tree import Tree, Leaf
-from .response import EndpointHandler, MethodHandler, RenderHandler
-from .resource import Resource, ControllerMixin
-from .component import Index, Create, Read, Update, Delete
+"""
+    taiga
+    ~~~~~~~~
+
+    The public names are imported from their submodule on first access, so
+    ``import taiga`` is cheap and only the parts an application uses (and
+    their dependencies, like jinja2) are imported.
+"""
+import importlib
+
+EXPORTS = {
+    'Application': 'application',
+    'Tree': 'tree',
+    'Leaf': 'tree',
+    'EndpointHandler': 'response',
+    'MethodHandler': 'response',
+    'RenderHandler': 'response',
+    'MenuHandler': 'response',
+    'MetricsHandler': 'response',
+    'Resource': 'resource',
+    'ControllerMixin': 'resource',
+    'AsyncControllerMixin': 'resource',
+    'Index': 'component',
+    'Create': 'component',
+    'Read': 'component',
+    'Update': 'component',
+    'Delete': 'component',
+    'BulkCreate': 'component',
+    'BulkUpdate': 'component',
+    'BulkDelete': 'component',
+    'Export': 'component',
+    'ASGIApplication': 'asgi',
+}
+
+__all__ = list(EXPORTS)
+
+
+def __getattr__(name):
+    try:
+        module_name = EXPORTS[name]
+    except KeyError:
+        raise AttributeError('module {!r} has no attribute {!r}'.format(
+            __name__, name)) from None
+    module = importlib.import_module('.' + module_name, __name__)
+    value = globals()[name] = getattr(module, name)
+    return value
+
+
+def __dir__():
+    return sorted({*globals(), *EXPORTS})
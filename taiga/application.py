@@ -1,5 +1,10 @@
+import threading
+from functools import partial
+
 from werkzeug import routing, wrappers, exceptions
 
+from . import metrics, urls
+
 
 class Application:
     """Handle WSGI requests with ``Tree``.
@@ -16,16 +21,165 @@ class Application:
 
     Arguments:
         tree (Tree): the tree with the urls and request handlers
+        router (callable): optional router backend, called with the
+            ``url_map``, like ``taiga.router.TrieRouter``. it is tried after
+            ``static_routes`` and before ``url_map``
+        template_env (jinja2.Environment): environment for the handlers
+            ``template_name``, the default is built by
+            ``taiga.templating.create_environment``
+        compressor (callable): optional response compression, called with
+            the request and each response, like
+            ``taiga.compression.Compressor()``
+        tracer: optional instrumentation, like ``taiga.metrics.Metrics()``,
+            requests are traced with ``tracer.start_trace`` and the
+            handlers may be profiled with ``tracer.profile``
+        lazy (bool): skip `compile`, the url map, the endpoints and the
+            templates are built when first needed, static routes are
+            served without compiling the url map
+
+    Attributes:
+        url_for_cache_size (int): max urls memoized per host/script-root,
+            the cache is cleared when it gets full, ``0`` disables it
+        url_for_cache_hosts (int): max host/script-root caches, all are
+            cleared when there are more, since the host comes from the
+            request
     """
-    def __init__(self, tree=None):
-        self.url_map = routing.Map([tree.get_url_rules()])
-        self.endpoint_map = dict(tree.get_endpoints())
+
+    url_for_cache_size = 4096
+    url_for_cache_hosts = 64
+
+    def __init__(self, tree=None, router=None, template_env=None,
+                 compressor=None, tracer=None, lazy=False):
         self.tree = tree
+        self.router_class = router
+        self.template_env = template_env
+        self.compressor = compressor
+        self.tracer = tracer
+        self.url_for_cache = {}
+        self.compile_lock = threading.Lock()
+        self._url_rules = self._url_map = self._router = None
+        self._endpoint_map = self._static_routes = None
+        if not lazy:
+            self.compile()
+        tree.mount(self)
+
+    def compile(self):
+        """Build the url map, the endpoints, the static routes and the
+        templates, instead of on first use."""
+        self.compile_url_map()
+        self._static_routes = self.compile_static_routes()
+        self._endpoint_map = dict(self.tree.get_endpoints())
+        self.get_template_env()
+        self.precompile_templates()
+
+    @property
+    def url_map(self):
+        if self._url_map is None:
+            self.compile_url_map()
+        return self._url_map
+
+    @property
+    def router(self):
+        if self._url_map is None:
+            self.compile_url_map()
+        return self._router
+
+    @property
+    def endpoint_map(self):
+        if self._endpoint_map is None:
+            self._endpoint_map = dict(self.tree.get_endpoints())
+        return self._endpoint_map
+
+    @property
+    def static_routes(self):
+        if self._static_routes is None:
+            self._static_routes = self.compile_static_routes()
+        return self._static_routes
+
+    def get_url_rules(self):
+        """The rules of ``tree``, flattened and not bound to a map.
+
+        Returns:
+            list: the ``werkzeug.routing.Rule``
+        """
+        if self._url_rules is None:
+            # rule factories only pass the map down to the rules
+            rules = self.tree.get_url_rules().get_rules(None)
+            self._url_rules = list(rules)
+        return self._url_rules
+
+    def compile_url_map(self):
+        """Bind the rules to ``url_map`` and build ``router``, once.
+
+        The garbage collector is paused meanwhile, see
+        ``taiga.urls.paused_gc``.
+        """
+        with self.compile_lock:
+            if self._url_map is not None:
+                return
+            url_map = routing.Map()
+            with urls.paused_gc():
+                for rule in self.get_url_rules():
+                    url_map.add(rule)
+                url_map.update()  # sorts the matcher
+                router = None
+                if self.router_class is not None:
+                    router = self.router_class(url_map)
+            self._router = router
+            self._url_map = url_map
+
+    def add_items(self, node, items):
+        """Route `items`, just registered under `node` in ``tree``.
+
+        Called by ``Tree.register_items``. only the new rules are compiled,
+        the url matcher and the router are updated copy-on-write (see
+        ``taiga.urls.add_rules`` and ``TrieRouter.extend``), and keys are
+        added to the endpoint and static route tables, which requests only
+        read by key. so the cost depends on `items`, not on the size of
+        the tree, and requests don't wait for it. since the tables only
+        grow, a request reading some tables before and some after the
+        update is still served.
+
+        Arguments:
+            node (Tree): the parent of `items`
+            items (list[Tree]): the new children of `node`
+        """
+        endpoints = [
+            endpoint for item in items for endpoint in item.get_endpoints()]
+        with self.compile_lock:
+            if self._endpoint_map is not None:
+                self._endpoint_map.update(endpoints)
+            if self._url_rules is not None:
+                self.add_url_rules(list(
+                    node.get_items_url_rules(items, self.tree).get_rules(None)
+                ))
+        if self.template_env is not None:
+            for _, handler_class in endpoints:
+                name = getattr(handler_class, 'template_name', None)
+                if name is not None:
+                    self.get_template(name)
 
     def __call__(self, environ, start_response):  # pragma: no cover
-        response = self.dispatch_request(wrappers.Request(environ))
+        request = wrappers.Request(environ)
+        response = self.process_response(
+            request, self.dispatch_request(request))
         return response(environ, start_response)
 
+    def process_response(self, request, response):
+        """Apply the response stages, like ``compressor``.
+
+        Arguments:
+            request (werkzeug.wrappers.Request): werkzeug request wrapper
+            response: the return value of ``dispatch_request``
+
+        Returns:
+            a valid WSGI application, usually ``response`` itself
+        """
+        if self.compressor is not None and isinstance(
+                response, wrappers.Response):
+            response = self.compressor(request, response)
+        return response
+
     def dispatch_request(self, request):
         """Choose a `RequestHandler` to respond the request.
 
@@ -36,20 +190,176 @@ class Application:
             The return value of the ``RequestHandler.endpoint``, it should be
             a valid WSGI application like ``werkzeug.wrappers.Response``
         """
-        adapter = self.get_url_adapter(request)
+        if self.tracer is None:
+            return self.handle_request(request)
+        with self.tracer.start_trace(request).activate():
+            return self.handle_request(request)
+
+    def handle_request(self, request):
         try:
-            endpoint, values = adapter.match()
+            with metrics.span('route'):
+                endpoint, values = self.match_request(request)
+            metrics.set_endpoint(endpoint)
             return self.serve_endpoint(request, endpoint, values)
         except exceptions.NotFound as e:
             return e
         except exceptions.HTTPException as e:  # pragma: no cover
             return e
 
+    def match_request(self, request):
+        """Match the request against ``static_routes``, ``router``, then
+        ``url_map``.
+
+        Arguments:
+            request (werkzeug.wrappers.Request): werkzeug request wrapper
+
+        Returns:
+            tuple: the endpoint (str) and the url values (dict)
+
+        Raises:
+            werkzeug.exceptions.HTTPException: same as ``MapAdapter.match``
+        """
+        static_routes = self.static_routes
+        path, method = request.path, request.method
+        for key in ((path, method), (path, None)):
+            try:
+                return static_routes[key], {}
+            except KeyError:
+                pass
+        adapter = self.get_url_adapter(request)
+        if self.router is not None:
+            found = self.router.match(
+                adapter.path_info, adapter.default_method)
+            if found is not None:
+                return found
+        return adapter.match()
+
+    def add_url_rules(self, rules):
+        """Extend the tables built from the url rules, with ``compile_lock``
+        held."""
+        if self._url_map is not None:
+            urls.add_rules(self._url_map, rules)
+            if self._router is not None:
+                self._router = self._router.extend(rules)
+        if self._static_routes is not None:
+            self.compile_static_routes(rules, self._static_routes)
+        self._url_rules.extend(rules)
+
+    def compile_static_routes(self, rules=None, static_routes=None):
+        """Build an exact-match table for rules without converters.
+
+        Rules with defaults, redirects, hosts or subdomains are left to
+        ``url_map``, as are paths that would need a strict-slash redirect,
+        since those are never an exact match. the table is built from the
+        unbound rules, it doesn't need the url map.
+
+        Arguments:
+            rules (list): the rules, ``get_url_rules()`` by default
+            static_routes (dict): a table to extend with `rules`
+
+        Returns:
+            dict: (path, method) to endpoint, method is ``None`` when the
+            rule accepts any method
+        """
+        if rules is None:
+            rules = self.get_url_rules()
+        if static_routes is None:
+            static_routes = {}
+        for rule in rules:
+            if ('<' in rule.rule or rule.defaults or rule.build_only or
+                    rule.redirect_to is not None or rule.subdomain or
+                    rule.host or getattr(rule, 'websocket', False)):
+                continue
+            if (rule.rule, None) in static_routes:
+                continue  # shadowed by an earlier any-method rule
+            for method in rule.methods or (None,):
+                static_routes.setdefault((rule.rule, method), rule.endpoint)
+        return static_routes
+
     def get_url_adapter(self, request):
-        return self.url_map.bind_to_environ(request.environ)
+        """Bind the url map to the request, once per request.
+
+        The adapter is stored in ``request.url_adapter`` so matching and
+        url building share it.
+
+        Arguments:
+            request (werkzeug.wrappers.Request): werkzeug request wrapper
+
+        Returns:
+            werkzeug.routing.MapAdapter: the adapter bound to ``request``
+        """
+        try:
+            return request.url_adapter
+        except AttributeError:
+            pass
+        adapter = self.url_map.bind_to_environ(request.environ)
+        request.url_adapter = adapter
+        return adapter
 
     def get_url_for(self, request):
-        return self.get_url_adapter(request).build
+        """Build a memoized ``url_for`` for the request.
+
+        Urls are cached by (endpoint, values, method, force_external),
+        one cache for each (host, script-root, url scheme).
+
+        Arguments:
+            request (werkzeug.wrappers.Request): werkzeug request wrapper
+
+        Returns:
+            callable: with the same signature as ``MapAdapter.build``
+        """
+        adapter = self.get_url_adapter(request)
+        if not self.url_for_cache_size:
+            return adapter.build
+        cache_key = (adapter.server_name, adapter.script_name,
+                     adapter.url_scheme)
+        try:
+            cache = self.url_for_cache[cache_key]
+        except KeyError:
+            if len(self.url_for_cache) >= self.url_for_cache_hosts:
+                self.url_for_cache.clear()
+            cache = self.url_for_cache[cache_key] = {}
+
+        def url_for(endpoint, values=None, method=None,
+                    force_external=False, **kwargs):
+            build = partial(
+                adapter.build, endpoint, values, method=method,
+                force_external=force_external, **kwargs)
+            if kwargs:
+                return build()
+            try:
+                key = (endpoint, freeze(values), method, force_external)
+                return cache[key]
+            except TypeError:  # unhashable values
+                return build()
+            except KeyError:
+                pass
+            if len(cache) >= self.url_for_cache_size:
+                cache.clear()
+            url = cache[key] = build()
+            return url
+        return url_for
+
+    def get_template_env(self):
+        if self.template_env is None:
+            # jinja2 is imported with the first template
+            from .templating import create_environment
+            self.template_env = create_environment()
+        return self.template_env
+
+    def get_template(self, name):
+        return self.get_template_env().get_template(name)
+
+    def precompile_templates(self):
+        """Load the templates of all handlers in ``endpoint_map``.
+
+        Templates are compiled (or read from the bytecode cache) once at
+        startup instead of on the first request.
+        """
+        for handler_class in self.endpoint_map.values():
+            name = getattr(handler_class, 'template_name', None)
+            if name is not None:
+                self.get_template(name)
 
     def serve_endpoint(self, request, endpoint, values):
         try:
@@ -57,4 +367,23 @@ class Application:
         except KeyError:
             raise exceptions.NotFound('Endpoint not found.')
         handler = handler_class(self, request)
-        return handler.entrypoint(**values)
+        if self.tracer is None:
+            return handler.entrypoint(**values)
+        with metrics.span('handler'), self.tracer.profile(endpoint):
+            return handler.entrypoint(**values)
+
+
+def freeze(values):
+    """Turn url values in a hashable key.
+
+    Arguments:
+        values (dict): the url values, may be ``None``
+
+    Returns:
+        tuple: sorted (key, value) pairs
+    """
+    if not values:
+        return ()
+    if hasattr(values, 'items'):
+        values = values.items()
+    return tuple(sorted(values))
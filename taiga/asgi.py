@@ -0,0 +1,199 @@
+"""
+    taiga.asgi
+    ~~~~~~~~~~~~~
+
+    ASGI entrypoint for ``Tree`` applications.
+
+    This module implements an ``Application`` that speaks ASGI, handlers
+    with ``async_entrypoint`` are awaited on the event loop, so controllers
+    can use async database clients, see ``AsyncControllerMixin``.
+"""
+import io
+import sys
+
+from werkzeug import exceptions, wrappers
+
+from . import metrics
+from .application import Application
+from .response import maybe_await
+
+
+class ASGIApplication(Application):
+    """Handle ASGI requests with ``Tree``.
+
+    The request is wrapped in a ``werkzeug.wrappers.Request`` like in WSGI,
+    so handlers work with both applications. Handlers are served with
+    ``async_entrypoint`` when they have one, otherwise with ``entrypoint``,
+    awaiting the result if needed.
+
+    Only the ``http`` and ``lifespan`` scopes are supported, the response
+    body is iterated on the event loop.
+
+    Arguments:
+        same as ``Application``
+    """
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            if scope['type'] == 'websocket':
+                await send({'type': 'websocket.close', 'code': 1000})
+            return
+        body = await read_body(receive)
+        environ = make_environ(scope, body)
+        request = wrappers.Request(environ)
+        response = self.process_response(
+            request, await self.dispatch_request_async(request))
+        await send_response(response, environ, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def dispatch_request_async(self, request):
+        """Same as ``dispatch_request``, awaiting the handler.
+
+        Arguments:
+            request (werkzeug.wrappers.Request): werkzeug request wrapper
+
+        Returns:
+            a valid WSGI application like ``werkzeug.wrappers.Response``
+        """
+        if self.tracer is None:
+            return await self.handle_request_async(request)
+        with self.tracer.start_trace(request).activate():
+            return await self.handle_request_async(request)
+
+    async def handle_request_async(self, request):
+        try:
+            with metrics.span('route'):
+                endpoint, values = self.match_request(request)
+            metrics.set_endpoint(endpoint)
+            return await self.serve_endpoint_async(request, endpoint, values)
+        except exceptions.HTTPException as e:
+            return e
+
+    async def serve_endpoint_async(self, request, endpoint, values):
+        try:
+            handler_class = self.endpoint_map[endpoint]
+        except KeyError:
+            raise exceptions.NotFound('Endpoint not found.')
+        handler = handler_class(self, request)
+        with metrics.span('handler'):
+            try:
+                entrypoint = handler.async_entrypoint
+            except AttributeError:
+                return await maybe_await(handler.entrypoint(**values))
+            return await entrypoint(**values)
+
+
+async def read_body(receive):
+    chunks = []
+    more_body = True
+    while more_body:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunks.append(message.get('body', b''))
+        more_body = message.get('more_body', False)
+    return b''.join(chunks)
+
+
+def make_environ(scope, body):
+    """Build a WSGI environ from an ASGI ``http`` scope.
+
+    Arguments:
+        scope (dict): the ASGI connection scope
+        body (bytes): the request body
+
+    Returns:
+        dict: the WSGI environ
+    """
+    root_path = scope.get('root_path', '')
+    path = scope['path']
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': root_path,
+        'PATH_INFO': path.encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': 'HTTP/{}'.format(scope.get('http_version', '1.1')),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.input_terminated': True,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': False,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+        'asgi.scope': scope,
+    }
+    client = scope.get('client')
+    if client:
+        environ['REMOTE_ADDR'] = client[0]
+        environ['REMOTE_PORT'] = str(client[1])
+    for name, value in scope.get('headers', ()):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE' or name == 'CONTENT_LENGTH':
+            key = name
+        else:
+            key = 'HTTP_{}'.format(name)
+        if key in environ:
+            # repeated headers join with commas, but cookies with '; '
+            separator = '; ' if key == 'HTTP_COOKIE' else ','
+            value = '{}{}{}'.format(environ[key], separator, value)
+        environ[key] = value
+    environ.setdefault('CONTENT_LENGTH', str(len(body)))
+    return environ
+
+
+async def send_response(response, environ, send):
+    """Send a WSGI application's response as ASGI messages.
+
+    Arguments:
+        response (callable): a WSGI application, like
+            ``werkzeug.wrappers.Response`` or an ``HTTPException``
+        environ (dict): the WSGI environ
+        send (callable): the ASGI send channel
+    """
+    started = []
+
+    def start_response(status, headers, exc_info=None):
+        started[:] = [status, headers]
+
+    app_iter = response(environ, start_response)
+    try:
+        chunks = iter(app_iter)
+        first = next(chunks, b'')
+        status, headers = started
+        await send({
+            'type': 'http.response.start',
+            'status': int(status.split(' ', 1)[0]),
+            'headers': [
+                (name.lower().encode('latin-1'), value.encode('latin-1'))
+                for name, value in headers
+            ],
+        })
+        chunk = first
+        for next_chunk in chunks:
+            if chunk:
+                await send({'type': 'http.response.body', 'body': chunk,
+                            'more_body': True})
+            chunk = next_chunk
+        await send({'type': 'http.response.body', 'body': chunk})
+    finally:
+        close = getattr(app_iter, 'close', None)
+        if close is not None:
+            close()
@@ -0,0 +1,185 @@
+"""
+    taiga.cache
+    ~~~~~~~~~~~~~~
+
+    Result cache backends for controllers.
+
+    This module implements small key-value caches with TTL and size
+    limits, they count hits and misses so they can be monitored.
+"""
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+MISSING = object()
+
+
+class Cache:
+    """Base class for cache backends.
+
+    Subclasses implement ``peek``, ``set``, ``delete``, ``clear`` and
+    ``__len__``.
+
+    Attributes:
+        hits (int): ``get`` calls that found a value
+        misses (int): ``get`` calls that found nothing
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        """Get a value, counting the hit or miss.
+
+        Arguments:
+            key: a hashable (and picklable, for shared backends) key
+            default: returned when the key is missing or expired
+
+        Returns:
+            the cached value or ``default``
+        """
+        value = self.peek(key)
+        if value is MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def peek(self, key):
+        """Get a value without counting it.
+
+        Returns:
+            the cached value, ``MISSING`` if it is missing or expired
+        """
+        raise NotImplementedError
+
+    def set(self, key, value):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def stats(self):
+        """Hit and miss counters.
+
+        Returns:
+            dict: hits, misses and size
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self)}
+
+
+class LRUCache(Cache):
+    """In-process cache with LRU eviction.
+
+    Arguments:
+        maxsize (int): max entries, the least recently used is evicted
+        ttl (float): seconds an entry is valid, ``None`` for no limit
+        clock (callable): returns the current time in seconds
+    """
+
+    def __init__(self, maxsize=1024, ttl=None, clock=time.monotonic):
+        super().__init__()
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def peek(self, key):
+        with self.lock:
+            try:
+                value, expires = self.entries[key]
+            except KeyError:
+                return MISSING
+            if expires is not None and expires < self.clock():
+                del self.entries[key]
+                return MISSING
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        expires = None
+        if self.ttl is not None:
+            expires = self.clock() + self.ttl
+        with self.lock:
+            self.entries[key] = (value, expires)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class MappingCache(Cache):
+    """Cache on top of a mapping shared with other processes.
+
+    Values are pickled, so the mapping can be a
+    ``multiprocessing.Manager().dict()``, a ``shelve`` or a client for an
+    external cache with a dict interface. when the mapping is full the
+    oldest entries (in the mapping order) are evicted.
+
+    Arguments:
+        mapping (MutableMapping): the storage, a dict by default
+        maxsize (int): max entries, ``None`` leaves eviction to the storage
+        ttl (float): seconds an entry is valid, ``None`` for no limit
+        clock (callable): returns the current time in seconds, it must
+            agree between processes
+    """
+
+    def __init__(self, mapping=None, maxsize=None, ttl=None, clock=time.time):
+        super().__init__()
+        self.mapping = {} if mapping is None else mapping
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+
+    def peek(self, key):
+        try:
+            data = self.mapping[key]
+        except KeyError:
+            return MISSING
+        value, expires = pickle.loads(data)
+        if expires is not None and expires < self.clock():
+            self.delete(key)
+            return MISSING
+        return value
+
+    def set(self, key, value):
+        expires = None
+        if self.ttl is not None:
+            expires = self.clock() + self.ttl
+        if self.maxsize is not None and key not in self.mapping:
+            for old_key in list(self.mapping.keys()):
+                if len(self.mapping) < self.maxsize:
+                    break
+                self.delete(old_key)
+        self.mapping[key] = pickle.dumps((value, expires))
+
+    def delete(self, key):
+        try:
+            del self.mapping[key]
+        except KeyError:
+            pass
+
+    def clear(self):
+        self.mapping.clear()
+
+    def __len__(self):
+        return len(self.mapping)
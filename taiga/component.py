@@ -1,37 +1,67 @@
+import csv
+import io
 from math import ceil
-import jinja2
 
+from werkzeug import exceptions, wrappers
+
+from .pagination import InvalidCursor
 from .response import RenderHandler
 
 
 class Component(RenderHandler):
-    template = jinja2.Template(
-        'request: {{ request }}\n'
-        'url_for: {{ url_for }}\n'
-    )
+    template_name = 'component.html'
     controller = None
 
 
 class Index(Component):
     show_in_menu = True
+    # the fields and relationships the listing shows, so the controller
+    # loads only those, ``None`` loads everything (see
+    # ``ControllerMixin.load_items``)
+    columns = None
+    relationships = None
 
     def get(self):
-        page, order_by, reverse, filters = self._get_args()
-        items, count = self.controller.get_items(
-            page=page, order_by=order_by, reverse=reverse, filters=filters,
-        )
+        query = self._get_query()
+        try:
+            items, count = yield self.controller.get_items(**query)
+        except InvalidCursor:
+            raise exceptions.BadRequest('Invalid cursor.')
+        return self._get_body(query, items, count)
+
+    def get_version(self):
+        *_, filters = self._get_args()
+        return self.controller.get_items_version(filters)
+
+    def _get_query(self):
+        page, order_by, reverse, cursor, filters = self._get_args()
         return {
-            'pagination': self._get_pagination(count, page),
-            'items': items, 'count': count,
+            'page': page, 'order_by': order_by, 'reverse': reverse,
+            'filters': filters, 'cursor': cursor,
+            'columns': self.columns, 'relationships': self.relationships,
         }
 
+    def _get_body(self, query, items, count):
+        pagination = self._get_pagination(count, query['page'])
+        if self.controller.cursor_pagination:
+            items = list(items)
+            pagination['cursor'] = query['cursor']
+            pagination['next_cursor'] = self._get_next_cursor(
+                items, query['order_by'])
+        return {'pagination': pagination, 'items': items, 'count': count}
+
     def _get_args(self):
         args = dict(self.request.args)
-        reverse = self._pop_args(args, 'reverse', default=False)
-        reverse = bool(int(reverse))
+        try:
+            reverse = bool(int(self._pop_args(args, 'reverse', default=0)))
+            page = int(self._pop_args(args, 'page', default=1))
+        except ValueError:
+            raise exceptions.BadRequest('Invalid page or reverse.')
+        if page < 1:
+            raise exceptions.BadRequest('Invalid page.')
         order_by = self._pop_args(args, 'order_by')
-        page = self._pop_args(args, 'page', default=1)
-        return page, order_by, reverse, args
+        cursor = self._pop_args(args, 'cursor')
+        return page, order_by, reverse, cursor, args
 
     def _pop_args(self, args, key, default=None):
         try:
@@ -41,10 +71,100 @@ class Index(Component):
 
     def _get_pagination(self, count, page):
         per_page = self.controller.per_page
-        if per_page == 0:
-            pages = 0
-        pages = ceil(count/per_page)
-        return {'pages': pages, 'page': page}
+        count_limit = self.controller.count_limit
+        count_capped = count_limit is not None and count > count_limit
+        if count_capped:
+            count = count_limit
+        pages = 0
+        if per_page:
+            pages = ceil(count/per_page)
+        return {'pages': pages, 'page': page, 'count_capped': count_capped}
+
+    def _get_next_cursor(self, items, order_by):
+        if len(items) < self.controller.per_page:
+            return None
+        return self.controller.get_cursor(items[-1], order_by)
+
+
+class Export(Index):
+    """Stream all filtered and sorted items as CSV or NDJSON.
+
+    The format comes from the ``format`` argument (``csv`` by default) or
+    the ``render`` url value, the fields from ``columns`` or, when it is
+    ``None``, from the first item.
+    """
+
+    render_names = ('csv', 'ndjson')
+    default_render = 'csv'
+    # csv rows written per chunk of the response
+    export_chunk_size = 100
+
+    def get_render(self, name=None):
+        if name is None:
+            name = self.request.args.get('format')
+        return super().get_render(name)
+
+    def get(self):
+        items = yield self.controller.export_items(**self._get_export_query())
+        return {'items': items}
+
+    def _get_export_query(self):
+        _, order_by, reverse, _, filters = self._get_args()
+        filters.pop('format', None)
+        return {
+            'order_by': order_by, 'reverse': reverse, 'filters': filters,
+            'columns': self.columns, 'relationships': self.relationships,
+        }
+
+    def render_csv(self, context):
+        return self._make_response(
+            self._iter_csv(context['items']), 'text/csv', 'csv')
+
+    def render_ndjson(self, context):
+        return self._make_response(
+            self._iter_ndjson(context['items']),
+            'application/x-ndjson', 'ndjson',
+        )
+
+    def _make_response(self, body, mimetype, extension):
+        response = wrappers.Response(body, mimetype=mimetype)
+        response.headers['Content-Disposition'] = (
+            'attachment; filename=export.{}'.format(extension))
+        return response
+
+    def _iter_csv(self, items):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        columns = self.columns
+        for i, item in enumerate(items):
+            row = self._as_dict(item)
+            if columns is None:
+                columns = list(row)
+            if i == 0:
+                writer.writerow(columns)
+            writer.writerow([row.get(column) for column in columns])
+            if i % self.export_chunk_size == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    def _iter_ndjson(self, items):
+        dumps = self.json_serializer.dumps
+        for item in items:
+            if self.columns is not None:
+                row = self._as_dict(item)
+                item = {
+                    str(column): row.get(column) for column in self.columns
+                }
+            yield dumps(item) + '\n'
+
+    def _as_dict(self, item):
+        if isinstance(item, dict):
+            return item
+        if isinstance(item, (list, tuple)):
+            return dict(enumerate(item))
+        return self.json_serializer.default(item)
 
 
 class Create(Component):
@@ -52,33 +172,97 @@ class Create(Component):
         return {}
 
     def post(self):
-        item = self.controller.create_item(self.request.form)
+        item = yield self.controller.create_item(self.request.form)
         return {'item': item}
 
 
 class Read(Component):
+    def get_version(self, key):
+        return self.controller.get_item_version(key)
+
     def get(self, key):
-        item = self.controller.get_item(key)
+        item = yield self.controller.get_item(key)
         return {'item': item, 'key': key}
 
 
 class Update(Component):
     def get(self, key):
-        item = self.controller.get_item(key)
+        item = yield self.controller.get_item(key)
         return {'item': item, 'key': key}
 
     def post(self, key):
-        item = self.controller.get_item(key)
-        self.controller.update_item(item, self.request.form)
+        item = yield self.controller.get_item(key)
+        yield self.controller.update_item(item, self.request.form)
         return {'item': item, 'key': key}
 
 
 class Delete(Component):
     def get(self, key):
-        item = self.controller.get_item(key)
+        item = yield self.controller.get_item(key)
         return {'item': item, 'key': key}
 
     def post(self, key):
-        item = self.controller.get_item(key)
-        self.controller.delete_item(item)
+        item = yield self.controller.get_item(key)
+        yield self.controller.delete_item(item)
         return {'item': item, 'key': key}
+
+
+class BulkComponent(Component):
+    def get(self):
+        return {}
+
+    def _get_batch(self):
+        """Read the batch from a JSON array, or from form fields named
+        ``<index>-<field>``.
+
+        Returns:
+            list: the batch rows, in order
+        """
+        if self.request.is_json:
+            batch = self.request.get_json(silent=True)
+            if not isinstance(batch, list):
+                raise exceptions.BadRequest('Expected a JSON array.')
+            return batch
+        rows = {}
+        for name, value in self.request.form.items(multi=True):
+            index, sep, field = name.partition('-')
+            if sep and index.isdigit():
+                rows.setdefault(int(index), {})[field] = value
+        return [rows[index] for index in sorted(rows)]
+
+    def _get_result(self, batch, errors):
+        return {'count': len(batch) - len(errors), 'errors': errors}
+
+
+class BulkCreate(BulkComponent):
+    def post(self):
+        batch = self._get_batch()
+        errors = yield self.controller.create_items(batch)
+        return self._get_result(batch, errors)
+
+
+class BulkUpdate(BulkComponent):
+    def post(self):
+        batch = self._get_batch()
+        errors = yield self.controller.update_items(self._get_rows(batch))
+        return self._get_result(batch, errors)
+
+    def _get_rows(self, batch):
+        return [
+            (row.get('key'), {k: v for k, v in row.items() if k != 'key'})
+            if isinstance(row, dict) else (None, row)
+            for row in batch
+        ]
+
+
+class BulkDelete(BulkComponent):
+    def post(self):
+        batch = self._get_batch()
+        errors = yield self.controller.delete_items(self._get_keys(batch))
+        return self._get_result(batch, errors)
+
+    def _get_keys(self, batch):
+        return [
+            row.get('key') if isinstance(row, dict) else row
+            for row in batch
+        ]
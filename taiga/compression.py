@@ -0,0 +1,235 @@
+"""
+    taiga.compression
+    ~~~~~~~~~~~~~~~~~~~~
+
+    Response compression for ``Application``.
+
+    This module implements content negotiation on ``Accept-Encoding`` and
+    compresses response bodies with zlib (gzip, deflate) or, when they are
+    installed, brotli and zstandard. Streamed bodies are compressed as they
+    are sent, bodies with a strong ``ETag`` are compressed once and cached.
+"""
+import zlib
+
+from .cache import LRUCache
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+# mimetypes compressed besides ``text/*``, ``*+json`` and ``*+xml``
+COMPRESSIBLE_MIMETYPES = frozenset((
+    'application/json', 'application/x-ndjson', 'application/javascript',
+    'application/xml', 'image/svg+xml',
+))
+
+
+class ZlibCodec:
+    """gzip or deflate streams from ``zlib``.
+
+    Arguments:
+        wbits (int): the zlib window bits, selects the container
+    """
+
+    def __init__(self, wbits):
+        self.wbits = wbits
+
+    def compressobj(self, level):
+        compressobj = zlib.compressobj(level, zlib.DEFLATED, self.wbits)
+        return StreamCompressor(
+            compressobj.compress,
+            lambda: compressobj.flush(zlib.Z_SYNC_FLUSH),
+            compressobj.flush,
+        )
+
+
+class BrotliCodec:
+    def compressobj(self, level):
+        # brotli qualities go from 0 to 11, zlib levels from 0 to 9
+        compressobj = brotli.Compressor(quality=min(11, level + 2))
+        return StreamCompressor(
+            compressobj.process, compressobj.flush, compressobj.finish)
+
+
+class ZstandardCodec:
+    def compressobj(self, level):
+        compressobj = zstandard.ZstdCompressor(level=level).compressobj()
+        return StreamCompressor(
+            compressobj.compress,
+            lambda: compressobj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK),
+            compressobj.flush,
+        )
+
+
+class StreamCompressor:
+    """Common interface over the codec compressors.
+
+    Arguments:
+        compress (callable): bytes in, compressed bytes out (maybe empty)
+        flush (callable): emits the buffered data, the stream goes on
+        finish (callable): emits the remaining data and ends the stream
+    """
+
+    __slots__ = ('compress', 'flush', 'finish')
+
+    def __init__(self, compress, flush, finish):
+        self.compress = compress
+        self.flush = flush
+        self.finish = finish
+
+
+def available_codecs():
+    """The codecs usable here, by ``Content-Encoding`` token.
+
+    Returns:
+        dict: token to codec, in preference order
+    """
+    codecs = {}
+    if zstandard is not None:
+        codecs['zstd'] = ZstandardCodec()
+    if brotli is not None:
+        codecs['br'] = BrotliCodec()
+    codecs['gzip'] = ZlibCodec(16 + zlib.MAX_WBITS)
+    codecs['deflate'] = ZlibCodec(zlib.MAX_WBITS)
+    return codecs
+
+
+class Compressor:
+    """Compress responses for clients that accept it.
+
+    Responses are compressed when they are successful, compressible (see
+    `is_compressible`), not encoded yet and, for buffered bodies, at least
+    `min_size` bytes long. Streamed bodies are always compressed, flushing
+    the compressor every `flush_size` input bytes so the client keeps
+    receiving data.
+
+    Buffered bodies with a strong ``ETag`` are compressed once and cached
+    by (url, etag, encoding), an ``ETag`` only identifies a version of one
+    resource. the ``ETag`` of compressed responses is made weak
+    so conditional requests still match the uncompressed one.
+
+    Arguments:
+        min_size (int): smaller buffered bodies are sent uncompressed
+        level (int): compression level, 0 to 9 like zlib, mapped to the
+            codec range
+        codecs (dict): ``Content-Encoding`` token to codec, in preference
+            order, ``available_codecs()`` by default
+        cache_size (int): compressed bodies cached, ``0`` disables it
+        flush_size (int): input bytes between flushes of streamed bodies
+    """
+
+    def __init__(self, min_size=500, level=6, codecs=None, cache_size=256,
+                 flush_size=16384):
+        if codecs is None:
+            codecs = available_codecs()
+        self.min_size = min_size
+        self.level = level
+        self.codecs = codecs
+        self.cache = None
+        if cache_size:
+            self.cache = LRUCache(maxsize=cache_size)
+        self.flush_size = flush_size
+
+    def __call__(self, request, response):
+        """Compress `response` if `request` accepts it.
+
+        Arguments:
+            request (werkzeug.wrappers.Request): werkzeug request wrapper
+            response (werkzeug.wrappers.Response): the response
+
+        Returns:
+            werkzeug.wrappers.Response: the same response, updated
+        """
+        if not self.is_compressible(response):
+            return response
+        if not response.is_streamed:
+            size = response.content_length
+            if size is None:
+                size = len(response.get_data())
+            if size < self.min_size:
+                return response
+        response.vary.add('Accept-Encoding')
+        encoding = self.negotiate(request)
+        if encoding is None or request.method == 'HEAD':
+            return response
+        if response.is_streamed:
+            response.response = self.iter_compressed(
+                response.iter_encoded(), encoding)
+            response.headers.pop('Content-Length', None)
+        else:
+            response.set_data(
+                self.compress_body(request, response, encoding))
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag is not None and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+    def is_compressible(self, response):
+        if not 200 <= response.status_code < 300:
+            return False
+        if response.status_code in (204, 206):
+            return False
+        if response.direct_passthrough:
+            return False
+        if 'Content-Encoding' in response.headers:
+            return False
+        if 'no-transform' in response.cache_control:
+            return False
+        mimetype = response.mimetype or ''
+        return (
+            mimetype.startswith('text/') or
+            mimetype in COMPRESSIBLE_MIMETYPES or
+            mimetype.endswith(('+json', '+xml'))
+        )
+
+    def negotiate(self, request):
+        """Choose the encoding from ``Accept-Encoding``.
+
+        Returns:
+            str: a key of `codecs`, ``None`` for identity
+        """
+        return request.accept_encodings.best_match(list(self.codecs))
+
+    def compress_body(self, request, response, encoding):
+        etag, weak = response.get_etag()
+        if self.cache is None or etag is None or weak:
+            return self.compress(response.get_data(), encoding)
+        key = (request.url, etag, encoding)
+        data = self.cache.get(key)
+        if data is None:
+            data = self.compress(response.get_data(), encoding)
+            self.cache.set(key, data)
+        return data
+
+    def compress(self, data, encoding):
+        compressobj = self.codecs[encoding].compressobj(self.level)
+        return compressobj.compress(data) + compressobj.finish()
+
+    def iter_compressed(self, chunks, encoding):
+        """Compress a streamed body chunk by chunk.
+
+        Arguments:
+            chunks (iterable): the body, as bytes
+            encoding (str): a key of `codecs`
+
+        Yields:
+            bytes: the compressed body
+        """
+        compressobj = self.codecs[encoding].compressobj(self.level)
+        pending = 0
+        for chunk in chunks:
+            data = compressobj.compress(chunk)
+            pending += len(chunk)
+            if pending >= self.flush_size:
+                data += compressobj.flush()
+                pending = 0
+            if data:
+                yield data
+        yield compressobj.finish()
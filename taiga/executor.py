@@ -0,0 +1,153 @@
+"""
+    taiga.executor
+    ~~~~~~~~~~~~~~~~~
+
+    Bounded thread pools for blocking handlers and controllers.
+
+    This module implements a thread pool with a limit on queued work, when
+    the pool is saturated new work is rejected right away instead of
+    waiting, so a traffic spike gets fast errors instead of slow responses.
+"""
+import asyncio
+import contextvars
+import threading
+from concurrent import futures
+from functools import partial
+
+
+class ExecutorSaturated(RuntimeError):
+    """Raised by ``BoundedExecutor.submit`` when the pool and its queue
+    are full."""
+
+
+class BoundedExecutor:
+    """A ``ThreadPoolExecutor`` with a queue-depth limit.
+
+    At most ``max_workers`` calls run at once and ``max_queue`` more wait
+    for a worker, further calls raise ``ExecutorSaturated``.
+
+    Calls submitted from one of the pool workers run inline in that
+    worker, so a handler running in the pool can use the same pool in its
+    controller without deadlocking it. calls run in a copy of the caller
+    context, so they are traced with the request (see ``taiga.metrics``).
+
+    Resources bound to the worker thread, like the session of a
+    ``scoped_session``, are released after each call by `cleanup`.
+
+    Arguments:
+        max_workers (int): the number of threads
+        max_queue (int): calls waiting for a thread, ``max_workers`` by
+            default
+        retry_after (int): seconds clients should wait when the pool is
+            saturated, sent in the ``Retry-After`` header of the 503
+        cleanup (callable): called in the worker after each call, like
+            ``scoped_session.remove``
+
+    Attributes:
+        rejected (int): calls rejected since the pool was created
+    """
+
+    def __init__(self, max_workers=8, max_queue=None, retry_after=1,
+                 cleanup=None):
+        if max_queue is None:
+            max_queue = max_workers
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self.cleanup = cleanup
+        self.rejected = 0
+        self.slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self.local = threading.local()
+        self.executor = futures.ThreadPoolExecutor(
+            max_workers, thread_name_prefix='taiga',
+            initializer=self._init_worker,
+        )
+
+    def _init_worker(self):
+        self.local.worker = True
+
+    def in_worker(self):
+        """Whether the current thread is one of the pool workers."""
+        return getattr(self.local, 'worker', False)
+
+    def submit(self, func, *args, **kwargs):
+        """Schedule ``func(*args, **kwargs)`` in the pool.
+
+        Returns:
+            concurrent.futures.Future: the result of the call
+
+        Raises:
+            ExecutorSaturated: when the workers and the queue are busy
+        """
+        if self.in_worker():
+            return run_inline(func, *args, **kwargs)
+        if not self.slots.acquire(blocking=False):
+            self.rejected += 1
+            raise ExecutorSaturated('Executor is saturated.')
+        context = contextvars.copy_context()
+        if self.cleanup is not None:
+            func = partial(self._call_and_cleanup, func)
+        try:
+            future = self.executor.submit(
+                context.run, func, *args, **kwargs)
+        except BaseException:
+            self.slots.release()
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def _call_and_cleanup(self, func, *args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.cleanup()
+
+    def _release(self, future):  # pylint: disable=unused-argument
+        self.slots.release()
+
+    def submit_or_run(self, func, *args, **kwargs):
+        """Like `submit`, running ``func`` inline when saturated.
+
+        For optional parallelism, where doing the work in the caller
+        thread is better than failing.
+
+        Returns:
+            concurrent.futures.Future: the result of the call
+        """
+        try:
+            return self.submit(func, *args, **kwargs)
+        except ExecutorSaturated:
+            return run_inline(func, *args, **kwargs)
+
+    def run(self, func, *args, **kwargs):
+        """Call ``func`` in the pool and wait for its result."""
+        return self.submit(func, *args, **kwargs).result()
+
+    async def run_async(self, func, *args, **kwargs):
+        """Call ``func`` in the pool without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(func, *args, **kwargs))
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
+
+    def stats(self):
+        """Pool counters.
+
+        Returns:
+            dict: max_workers, max_queue and rejected
+        """
+        return {
+            'max_workers': self.max_workers,
+            'max_queue': self.max_queue,
+            'rejected': self.rejected,
+        }
+
+
+def run_inline(func, *args, **kwargs):
+    """Call ``func`` now, wrapping the outcome in a completed future."""
+    future = futures.Future()
+    try:
+        future.set_result(func(*args, **kwargs))
+    except Exception as e:  # pylint: disable=broad-except
+        future.set_exception(e)
+    return future
@@ -0,0 +1,526 @@
+"""
+    taiga.ext.memory
+    ~~~~~~~~~~~~~~~~~~~
+
+    Columnar in-memory controller for reference datasets.
+
+    This module implements a controller that keeps rows as one array per
+    field, with hash indexes for equality filters and presorted row orders
+    for sortable fields, so listing pages of large lookup tables doesn't
+    scan or sort every row on each request.
+"""
+import bisect
+import contextlib
+import contextvars
+import heapq
+import threading
+from array import array
+
+from taiga import resource
+from taiga.pagination import (
+    InvalidCursor, KeyView, bisect_cursor, decode_cursor,
+)
+
+# array typecodes for homogeneous columns, other columns are lists
+ARRAY_TYPES = ((int, 'q'), (float, 'd'))
+
+# when a filtered selection is smaller than ``size // SPARSE_RATIO`` it is
+# sorted directly instead of walking a presorted order
+SPARSE_RATIO = 8
+
+
+class ColumnarController(resource.ControllerMixin):
+    """Controller for read-mostly rows kept in memory, by column.
+
+    Rows are dicts with the same fields, stored as one array per field
+    (``array.array`` for int and float columns). Items passed between the
+    ``get_items`` steps are arrays of row numbers, `resolve_items` turns
+    the page back into dicts.
+
+    - equality filters on `indexes` fields read a hash index, other
+      filters scan their column
+    - `sortable` fields have a presorted row order, pages are sliced from
+      it, other fields are ordered with ``heapq`` partial selection
+    - ties are ordered by `pk_field`
+
+    Writes rebuild the indexes, so the controller is meant for lookup
+    tables and catalogs, not for frequently written data. a rebuild makes
+    a new ``ColumnarTable`` swapped in at once, and each call reading the
+    rows reads one table (see `pin_table`). each rebuild bumps
+    `generation`, the version for conditional GETs.
+
+    Arguments:
+        rows (iterable): dicts with the same fields
+        fields (sequence): the fields to keep, from the first row when
+            ``None``
+        indexes (sequence): fields with a hash index for equality filters
+        sortable (sequence): fields with a presorted order, their values
+            must be comparable
+        filters (dict): filter name to field, equality filters on
+            `indexes` by default
+        pk_field (str): the unique field, for `get_item` and tie breaks
+    """
+
+    def __init__(self, rows, fields=None, indexes=(), sortable=(),
+                 filters=None, pk_field='id'):
+        self.fields = None if fields is None else tuple(fields)
+        self.index_fields = tuple(indexes)
+        self.sortable = tuple(sortable)
+        if filters is None:
+            filters = {field: field for field in self.index_fields}
+        self.filters = filters
+        self.pk_field = pk_field
+        self._table = None
+        self.pinned_table = contextvars.ContextVar(
+            'pinned_table', default=None)
+        self.write_lock = threading.Lock()
+        self.load(rows)
+
+    @property
+    def table(self):
+        """The ``ColumnarTable`` read by the current call."""
+        table = self.pinned_table.get()
+        return self._table if table is None else table
+
+    size = property(lambda self: self.table.size)
+    columns = property(lambda self: self.table.columns)
+    pk_index = property(lambda self: self.table.pk_index)
+    indexes = property(lambda self: self.table.indexes)
+    orders = property(lambda self: self.table.orders)
+    generation = property(lambda self: self.table.generation)
+
+    @contextlib.contextmanager
+    def pin_table(self):
+        """Read the current table in a ``with`` block, even if a write
+        swaps in a new one meanwhile, so row numbers stay valid."""
+        token = self.pinned_table.set(self.table)
+        try:
+            yield
+        finally:
+            self.pinned_table.reset(token)
+
+    def load(self, rows):
+        """Replace the rows, building the columns and indexes aside and
+        swapping them in at once.
+
+        Arguments:
+            rows (iterable): dicts with the same fields
+
+        Raises:
+            ValueError: if `pk_field` values are duplicated, the rows are
+                left unchanged
+        """
+        rows = list(rows)
+        fields = self.fields
+        if fields is None:
+            fields = tuple(rows[0]) if rows else (self.pk_field,)
+        columns = {
+            field: make_column([row.get(field) for row in rows])
+            for field in fields
+        }
+        pks = columns[self.pk_field]
+        pk_index = {pk: number for number, pk in enumerate(pks)}
+        if len(pk_index) != len(rows):
+            raise ValueError('Duplicated {} values.'.format(self.pk_field))
+        indexes = {
+            field: build_index(columns[field])
+            for field in self.index_fields
+        }
+        orders = {
+            field: build_order(range(len(rows)), field, columns,
+                               self.pk_field)
+            for field in set(self.sortable) | {self.pk_field}
+        }
+        generation = 1 if self._table is None else self._table.generation + 1
+        self.fields = fields
+        self._table = ColumnarTable(
+            generation, len(rows), columns, pk_index, indexes, orders)
+
+    def build_order(self, numbers, field):
+        """Sort row numbers by (`field`, pk).
+
+        Returns:
+            array: the sorted row numbers
+        """
+        return build_order(numbers, field, self.columns, self.pk_field)
+
+    def get_items(self, *args, **kwargs):
+        with self.pin_table():
+            return super().get_items(*args, **kwargs)
+
+    def export_items(self, *args, **kwargs):
+        with self.pin_table():
+            return super().export_items(*args, **kwargs)
+
+    def fetch_items(self):
+        return range(self.size)
+
+    def filter_items(self, items, filters):
+        """Select the rows matching every equality filter.
+
+        Indexed filters are applied first, starting with the smallest
+        index entry, the others check each remaining row.
+
+        Arguments:
+            items (sequence): row numbers, in ascending order
+            filters (dict): filter name to value
+
+        Returns:
+            sequence: the matching row numbers, in ascending order
+        """
+        indexed, scanned = [], []
+        for name, value in filters.items():
+            try:
+                field = self.filters[name]
+            except KeyError:
+                continue
+            try:
+                value = self.coerce_value(field, value)
+            except ValueError:
+                return array('q')
+            if field in self.indexes:
+                indexed.append(self.indexes[field].get(value, ()))
+            else:
+                scanned.append((self.columns[field], value))
+        if indexed:
+            if len(items) != self.size:
+                indexed.append(items)
+            indexed.sort(key=len)
+            items, others = indexed[0], indexed[1:]
+            for numbers in others:
+                numbers = frozenset(numbers)
+                items = array('q', (n for n in items if n in numbers))
+        for column, value in scanned:
+            items = array('q', (n for n in items if column[n] == value))
+        return items
+
+    def coerce_value(self, field, value):
+        """Convert a value from the request to the column type.
+
+        Raises:
+            ValueError: if the value doesn't convert
+        """
+        column = self.columns[field]
+        if not isinstance(column, array) or isinstance(value, bool):
+            return value
+        if column.typecode == 'q' and isinstance(value, str):
+            return int(value)
+        if column.typecode == 'd' and isinstance(value, (str, int)):
+            return float(value)
+        return value
+
+    def coerce_data(self, data):
+        """Convert the values of `data` to the column types, dropping
+        unknown fields."""
+        return {
+            field: self.coerce_value(field, value)
+            for field, value in data.items()
+            if field in self.columns
+        }
+
+    def sort_items(self, items, order_by, reverse=False):
+        """Order the rows lazily, the page is selected on slicing.
+
+        Returns:
+            OrderedRows: the ordered rows, sliceable
+        """
+        return OrderedRows(self, items, order_by, reverse)
+
+    def seek_items(self, items, cursor=None, order_by=None, reverse=False):
+        if order_by is not None and order_by not in self.columns:
+            raise InvalidCursor('Invalid cursor.')
+        field = self.pk_field if order_by is None else order_by
+        ordered = self.ordered(items, field)
+        keys = KeyView(ordered, self.row_cursor_key(order_by))
+        cursor_key = None
+        if cursor is not None:
+            cursor_key = decode_cursor(cursor)
+        if not reverse:
+            start = 0
+            if cursor_key is not None:
+                start = bisect_cursor(bisect.bisect_right, keys, cursor_key)
+            return ordered[start:start+self.per_page]
+        end = len(ordered)
+        if cursor_key is not None:
+            end = bisect_cursor(bisect.bisect_left, keys, cursor_key)
+        return ordered[max(0, end-self.per_page):end][::-1]
+
+    def row_cursor_key(self, order_by=None):
+        pks = self.columns[self.pk_field]
+        if order_by is None:
+            return lambda number: (pks[number],)
+        column = self.columns[order_by]
+        return lambda number: (column[number], pks[number])
+
+    def ordered(self, items, field):
+        """All of `items` ordered by (`field`, pk).
+
+        Uses the presorted order of `field` when there is one, walking it
+        for large selections and sorting small selections directly.
+
+        Returns:
+            sequence: the ordered row numbers
+        """
+        order = self.orders.get(field)
+        if order is not None:
+            if len(items) == self.size:
+                return order
+            if len(items) * SPARSE_RATIO >= self.size:
+                selected = frozenset(items)
+                return array('q', (n for n in order if n in selected))
+        return self.build_order(items, field)
+
+    def resolve_items(self, items):
+        """Turn row numbers into dicts."""
+        return [self.get_row(number) for number in items]
+
+    def stream_items(self, items):
+        """Turn row numbers into dicts, one at a time."""
+        return map(self.table.get_row, items)
+
+    def get_row(self, number):
+        return self.table.get_row(number)
+
+    def get_item(self, pk):
+        with self.pin_table():
+            try:
+                number = self.get_number(pk)
+            except LookupError:
+                return None
+            return self.get_row(number)
+
+    def get_number(self, pk):
+        """The row number of `pk`, a key from the request.
+
+        Raises:
+            LookupError: if no row has this key
+        """
+        try:
+            return self.pk_index[self.coerce_value(self.pk_field, pk)]
+        except (KeyError, ValueError):
+            raise LookupError('Item {!r} not found.'.format(pk)) from None
+
+    def get_item_version(self, pk):
+        return self.generation
+
+    def get_items_version(self, filters=None):
+        return self.generation
+
+    def iter_rows(self):
+        return (self.get_row(number) for number in range(self.size))
+
+    def create_item(self, data):
+        with self.write_lock:
+            item = dict.fromkeys(self.fields)
+            item.update(self.coerce_data(data))
+            self.load([*self.iter_rows(), item])
+        self.invalidate_counts()
+        return item
+
+    def update_item(self, item, data):
+        with self.write_lock:
+            data = self.coerce_data(data)
+            rows = list(self.iter_rows())
+            rows[self.get_number(item[self.pk_field])].update(data)
+            self.load(rows)
+        item.update(data)
+        return item
+
+    def delete_item(self, item):
+        with self.write_lock:
+            rows = list(self.iter_rows())
+            del rows[self.get_number(item[self.pk_field])]
+            self.load(rows)
+        self.invalidate_counts()
+
+    def create_items(self, rows):
+        """Like `create_item` for each row, rebuilding the indexes once."""
+        errors = []
+        with self.write_lock:
+            table_rows = list(self.iter_rows())
+            pks = set(self.pk_index)
+            for index, data in enumerate(rows):
+                try:
+                    item = dict.fromkeys(self.fields)
+                    item.update(self.coerce_data(data))
+                    self._check_new_pk(item[self.pk_field], pks)
+                except (ValueError, TypeError) as e:
+                    errors.append({'index': index, 'error': str(e)})
+                    continue
+                pks.add(item[self.pk_field])
+                table_rows.append(item)
+            self.load(table_rows)
+        self.invalidate_counts()
+        return errors
+
+    def update_items(self, rows):
+        """Like `update_item` for each row, rebuilding the indexes once."""
+        errors = []
+        with self.write_lock:
+            table_rows = list(self.iter_rows())
+            pks = set(self.pk_index)
+            for index, (key, data) in enumerate(rows):
+                try:
+                    row = table_rows[self.get_number(key)]
+                    data = self.coerce_data(data)
+                    pk = data.get(self.pk_field, row[self.pk_field])
+                    if pk != row[self.pk_field]:
+                        self._check_new_pk(pk, pks)
+                except (LookupError, ValueError, TypeError) as e:
+                    errors.append({'index': index, 'error': str(e)})
+                    continue
+                pks.discard(row[self.pk_field])
+                pks.add(pk)
+                row.update(data)
+            self.load(table_rows)
+        return errors
+
+    def delete_items(self, keys):
+        """Like `delete_item` for each key, rebuilding the indexes once."""
+        errors, numbers = [], set()
+        with self.write_lock:
+            for index, key in enumerate(keys):
+                try:
+                    numbers.add(self.get_number(key))
+                except LookupError as e:
+                    errors.append({'index': index, 'error': str(e)})
+            self.load(
+                row for number, row in enumerate(self.iter_rows())
+                if number not in numbers)
+        self.invalidate_counts()
+        return errors
+
+    def _check_new_pk(self, pk, pks):
+        if pk in pks:
+            raise ValueError('Duplicated {} {!r}.'.format(self.pk_field, pk))
+
+
+class ColumnarTable:
+    """One version of the rows of a ``ColumnarController``.
+
+    Arguments:
+        generation (int): the version, bumped by each rebuild
+        size (int): the number of rows
+        columns (dict): field to column
+        pk_index (dict): pk to row number
+        indexes (dict): field to hash index, see ``build_index``
+        orders (dict): field to presorted row numbers
+    """
+
+    __slots__ = (
+        'generation', 'size', 'columns', 'pk_index', 'indexes', 'orders')
+
+    def __init__(self, generation, size, columns, pk_index, indexes, orders):
+        self.generation = generation
+        self.size = size
+        self.columns = columns
+        self.pk_index = pk_index
+        self.indexes = indexes
+        self.orders = orders
+
+    def get_row(self, number):
+        return {
+            field: column[number]
+            for field, column in self.columns.items()
+        }
+
+
+class OrderedRows:
+    """Rows ordered by a field, computed when sliced.
+
+    Slices of a full presorted order are read directly, selections walk
+    the presorted order until the slice end, and fields without one use
+    ``heapq.nsmallest``/``nlargest`` for the rows up to the slice end.
+
+    Arguments:
+        controller (ColumnarController): the controller with the columns
+        items (sequence): the selected row numbers
+        field (str): the field to order by
+        reverse (bool): descending order
+    """
+
+    def __init__(self, controller, items, field, reverse=False):
+        self.controller = controller
+        self.table = controller.table
+        self.items = items
+        self.field = field
+        self.reverse = reverse
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index+1][0]
+        start, stop, step = index.indices(len(self.items))
+        return self.head(stop)[start:stop:step]
+
+    def head(self, stop):
+        """The first `stop` rows in order."""
+        table, items = self.table, self.items
+        order = table.orders.get(self.field)
+        if order is not None and len(items) == table.size:
+            if self.reverse:
+                return order[len(order)-stop:][::-1]
+            return order[:stop]
+        if (order is not None and
+                len(items) * SPARSE_RATIO >= table.size):
+            selected = frozenset(items)
+            ordered = reversed(order) if self.reverse else order
+            head = array('q')
+            for number in ordered:
+                if len(head) >= stop:
+                    break
+                if number in selected:
+                    head.append(number)
+            return head
+        # (value, pk, number) tuples are built in C, faster than a key
+        column = table.columns[self.field]
+        pks = table.columns[self.controller.pk_field]
+        if len(items) == table.size:
+            rows = zip(column, pks, items)
+        else:
+            rows = zip(map(column.__getitem__, items),
+                       map(pks.__getitem__, items), items)
+        select = heapq.nlargest if self.reverse else heapq.nsmallest
+        return [number for _, _, number in select(stop, rows)]
+
+
+def build_order(numbers, field, columns, pk_field):
+    """Sort row numbers by (`field`, `pk_field`) values in `columns`.
+
+    Returns:
+        array: the sorted row numbers
+    """
+    column, pks = columns[field], columns[pk_field]
+    if field == pk_field:
+        key = column.__getitem__
+    else:
+        def key(number):
+            return (column[number], pks[number])
+    return array('q', sorted(numbers, key=key))
+
+
+def make_column(values):
+    """Store values in an ``array.array`` when they all have one type."""
+    for python_type, typecode in ARRAY_TYPES:
+        if values and all(type(value) is python_type for value in values):
+            try:
+                return array(typecode, values)
+            except OverflowError:
+                break
+    return values
+
+
+def build_index(column):
+    """Map each value to the ascending row numbers holding it."""
+    index = {}
+    for number, value in enumerate(column):
+        try:
+            index[value].append(number)
+        except KeyError:
+            index[value] = array('q', (number,))
+    return index
@@ -1,16 +1,45 @@
 from contextlib import contextmanager
 from itertools import chain
+import operator as op
+import pickle
+import threading
+import uuid
 
 import sqlalchemy as sa
-from kitasato import resource
+from sqlalchemy import orm
+from taiga import cache, resource, response
+from taiga.pagination import InvalidCursor, decode_cursor
 
 flatten = chain.from_iterable
 
+LOADER_STRATEGIES = {
+    'selectin': orm.selectinload,
+    'joined': orm.joinedload,
+    'subquery': orm.subqueryload,
+}
+
 
 class SQLAlchhemyORMController(resource.ControllerMixin):
+    # read the unfiltered count from the planner statistics, when the
+    # database has them (PostgreSQL)
+    estimate_count = False
+    # fetch the page and the total in one statement with a
+    # ``count(*) OVER ()`` column, for page (not cursor) pagination,
+    # the count is not cached
+    window_count = False
+    # a ``taiga.cache.Cache`` for ``get_item``/``get_items`` results,
+    # ``None`` disables it
+    result_cache = None
+    # a version or ``updated_at`` field, read instead of the rows to
+    # answer conditional GETs, ``None`` disables them
+    version_field = None
+    # `executor` runs the count in another thread, `db_session` must be
+    # a ``scoped_session`` so each thread gets its own session, the
+    # session of a worker is removed after the count (see `offload`)
+
     def __init__(self, db_session, model_class, filters=None):
         if filters is not None:
-            for filter_func in filters:
+            for filter_func in filters.values():
                 filter_func.db_session = db_session
             self.filters = filters
         self.db_session = db_session
@@ -19,53 +48,576 @@ class SQLAlchhemyORMController(resource.ControllerMixin):
     def fetch_items(self):
         return self.db_session.query(self.model_class)
 
+    def get_items(self, page=1, order_by=None, reverse=False, filters=None,
+                  cursor=None, columns=None, relationships=None):
+        kwargs = {
+            'page': page, 'order_by': order_by, 'reverse': reverse,
+            'filters': filters, 'cursor': cursor, 'columns': columns,
+            'relationships': relationships,
+        }
+        if self.result_cache is None:
+            return self.query_items(**kwargs)
+        try:
+            key = (
+                'items', self.get_cache_namespace(), self.get_generation(),
+                page, order_by, reverse, cursor,
+                resource.normalize_filters(filters, self.filters),
+                None if columns is None else tuple(columns),
+                tuple(self.get_loader_strategies(relationships)),
+            )
+            data = self.result_cache.get(key)
+        except TypeError:  # unhashable filter values
+            return self.query_items(**kwargs)
+        if data is not None:
+            items, count = pickle.loads(data)
+            return self.merge_items(items), count
+        items, count = self.query_items(**kwargs)
+        items = list(items)
+        self.result_cache.set(key, pickle.dumps((items, count)))
+        return items, count
+
+    def query_items(self, page=1, order_by=None, reverse=False, filters=None,
+                    cursor=None, columns=None, relationships=None):
+        if not self.window_count or self.cursor_pagination:
+            return super().get_items(
+                page=page, order_by=order_by, reverse=reverse,
+                filters=filters, cursor=cursor, columns=columns,
+                relationships=relationships,
+            )
+        query = self.fetch_items()
+        if filters is not None:
+            query = self.filter_items(query, filters=filters)
+        page_query = self.load_items(
+            query, columns=columns, relationships=relationships)
+        if order_by is not None:
+            page_query = self.sort_items(
+                page_query, order_by=order_by, reverse=reverse)
+        page_query = self.slice_items(page_query, page=page)
+        rows = page_query.add_columns(sa.func.count().over()).all()
+        items = [item for item, _ in rows]
+        if rows:
+            count = rows[0][1]
+            if self.count_limit is not None:
+                count = min(count, self.count_limit + 1)
+        elif page <= 1:
+            count = 0
+        else:  # past the last page, the window has no rows to count
+            count = self.count_items(query)
+        return items, count
+
+    def offload(self, func, *args, **kwargs):
+        caller = threading.get_ident()
+
+        def call():
+            try:
+                return func(*args, **kwargs)
+            finally:
+                # return the worker's connection to the pool, not the
+                # caller's when the executor ran the call inline
+                if threading.get_ident() != caller:
+                    self.db_session.remove()
+        return super().offload(call)
+
     def filter_items(self, query, filters):
+        if not self.filters:
+            return query
+        filter_funcs = [
+            (self.filters[key], value)
+            for key, value in filters.items()
+            if key in self.filters
+        ]
         join_tables = unique(flatten(
-            filter_func.join_tables
-            for filter_func in self.filters.values()
+            filter_func.join_tables or ()
+            for filter_func, _ in filter_funcs
         ))
-        return super().filter_items(query, filters).join(join_tables)
+        for table in join_tables:
+            query = query.join(table)
+        for filter_func, value in filter_funcs:
+            query = filter_func.filter(value, query)
+        return query
+
+    def load_items(self, query, columns=None, relationships=None):
+        options = []
+        if columns is not None:
+            options.append(orm.load_only(*[
+                getattr(self.model_class, column) for column in columns
+            ]))
+        for name, strategy in self.get_loader_strategies(relationships):
+            loader = LOADER_STRATEGIES[strategy]
+            options.append(loader(getattr(self.model_class, name)))
+        if not options:
+            return query
+        return query.options(*options)
+
+    def get_loader_strategies(self, relationships=None):
+        """Normalize `relationships` to (name, strategy) pairs.
+
+        Arguments:
+            relationships (sequence or dict): relationship names, loaded
+                with ``selectinload``, or a dict of name to strategy, one
+                of ``LOADER_STRATEGIES``
+
+        Returns:
+            list: sorted (name, strategy) tuples
+        """
+        if not relationships:
+            return []
+        if not hasattr(relationships, 'items'):
+            relationships = dict.fromkeys(relationships, 'selectin')
+        return sorted(relationships.items())
 
     def sort_items(self, query, order_by, reverse=False):
         field = getattr(self.model_class, order_by)
         if reverse:
-            field = -field
-        query.order_by(field)
+            field = field.desc()
+        return query.order_by(field)
+
+    def seek_items(self, query, cursor=None, order_by=None, reverse=False):
+        return self.seek_query(
+            query, cursor=cursor, order_by=order_by, reverse=reverse).all()
+
+    def seek_query(self, query, cursor=None, order_by=None, reverse=False):
+        columns = self.cursor_columns(order_by)
+        if cursor is not None:
+            key = decode_cursor(cursor)
+            if len(key) != len(columns):
+                raise InvalidCursor('Invalid cursor.')
+            key = tuple(
+                coerce_cursor_value(column, value)
+                for column, value in zip(columns, key)
+            )
+            row = sa.tuple_(*columns)
+            query = query.filter(row < key if reverse else row > key)
+        if reverse:
+            columns = [column.desc() for column in columns]
+        return query.order_by(*columns).limit(self.per_page)
+
+    def cursor_columns(self, order_by=None):
+        return [
+            getattr(self.model_class, field)
+            for field in self.cursor_fields(order_by)
+        ]
+
+    def cursor_fields(self, order_by=None):
+        mapper = sa.inspect(self.model_class)
+        pk = mapper.get_property_by_column(mapper.primary_key[0]).key
+        if order_by is None:
+            return [pk]
+        return [order_by, pk]
+
+    def cursor_key(self, item, order_by=None):
+        return tuple(
+            getattr(item, field) for field in self.cursor_fields(order_by)
+        )
+
+    def resolve_items(self, query):
+        return list(query)
+
+    def stream_items(self, query):
+        return iter(query.yield_per(self.export_batch_size))
 
     def slice_items(self, query, page=1):
         start = (page-1)*self.per_page
         return query.offset(start).limit(self.per_page)
 
     def count_items(self, query):
-        stmt = query.statement.with_only_columns([sa.func.count()])
+        if self.estimate_count and query.whereclause is None:
+            count = self.estimate_items()
+            if count is not None:
+                return count
+        query = query.order_by(None)
+        if self.count_limit is not None:
+            query = query.limit(self.count_limit + 1)
+        stmt = sa.select(sa.func.count()).select_from(query.subquery())
         return self.db_session.execute(stmt).scalar()
 
+    def estimate_items(self):
+        """Read the table row estimate from the planner statistics.
+
+        Returns:
+            int: the estimate, ``None`` if the database has none
+        """
+        if self.db_session.get_bind().dialect.name != 'postgresql':
+            return None
+        table = sa.inspect(self.model_class).local_table
+        stmt = sa.text(
+            'SELECT reltuples::bigint FROM pg_class WHERE oid = '
+            'CAST(:table AS regclass)'
+        ).bindparams(table=table.fullname)
+        count = self.db_session.execute(stmt).scalar()
+        if count is None or count < 0:  # never analyzed
+            return None
+        return count
+
+    def get_count_namespace(self):
+        return self.model_class
+
+    def get_item_version(self, pk):
+        stmt = self.item_version_statement(pk)
+        if stmt is None:
+            return None
+        return self.db_session.execute(stmt).scalar()
+
+    def get_items_version(self, filters=None):
+        stmt = self.items_version_statement(self.fetch_items(), filters)
+        if stmt is None:
+            return None
+        return tuple(self.db_session.execute(stmt).one())
+
+    def item_version_statement(self, pk):
+        """Select `version_field` of one row.
+
+        Returns:
+            sqlalchemy.sql.Select: the statement, ``None`` without a
+            `version_field` or with an invalid key
+        """
+        if self.version_field is None:
+            return None
+        try:
+            pk = self.coerce_key(pk)
+        except (LookupError, ValueError):
+            return None
+        mapper = sa.inspect(self.model_class)
+        column = mapper.columns[self.version_field]
+        return sa.select(column).where(mapper.primary_key[0] == pk)
+
+    def items_version_statement(self, query, filters=None):
+        """Select the max `version_field` and the count of the filtered
+        rows, the count changes on deletes.
+
+        Returns:
+            sqlalchemy.sql.Select: the statement, ``None`` without a
+            `version_field`
+        """
+        if self.version_field is None:
+            return None
+        if filters is not None:
+            query = self.filter_items(query, filters=filters)
+        column = sa.inspect(self.model_class).columns[self.version_field]
+        subquery = query.order_by(None).subquery()
+        return sa.select(
+            sa.func.max(subquery.c[column.name]), sa.func.count(),
+        ).select_from(subquery)
+
     def create_item(self, data):
         item = self.new_obj()
-        return self.update_item(item, data)
+        item = self.update_item(item, data)
+        self.invalidate_counts()
+        return item
 
     def get_item(self, pk):
-        return self.fetch_items().get(pk)
+        if self.result_cache is None:
+            return self.db_session.get(self.model_class, pk)
+        key = self.get_item_cache_key(pk)
+        data = self.result_cache.get(key)
+        if data is not None:
+            return self.merge_items([pickle.loads(data)])[0]
+        item = self.db_session.get(self.model_class, pk)
+        if item is not None:
+            self.result_cache.set(key, pickle.dumps(item))
+        return item
+
+    def get_cache_namespace(self):
+        return '{0.__module__}.{0.__qualname__}'.format(self.model_class)
+
+    def get_item_cache_key(self, pk):
+        # keys from urls are strings like '05', keys from identities are
+        # not, both are converted to the primary key type first
+        try:
+            pk = self.coerce_key(pk)
+        except (LookupError, TypeError, ValueError):
+            pass
+        return ('item', self.get_cache_namespace(), str(pk))
+
+    def get_generation(self):
+        """The generation of cached listings, replaced by every write.
+
+        Generations are random tokens, not counters, the generation is
+        cached with the listings and may expire or be evicted, a new one
+        never matches listings cached before.
+        """
+        key = ('generation', self.get_cache_namespace())
+        generation = self.result_cache.peek(key)
+        if generation is cache.MISSING:
+            generation = self.new_generation()
+        return generation
+
+    def new_generation(self):
+        generation = uuid.uuid4().hex
+        self.result_cache.set(
+            ('generation', self.get_cache_namespace()), generation)
+        return generation
+
+    def invalidate_results(self, item):
+        """Drop cached results affected by a write to `item`.
+
+        Arguments:
+            item: the created, updated or deleted object
+        """
+        identity = sa.inspect(item).identity
+        keys = ()
+        if identity is not None:
+            keys = [identity[0] if len(identity) == 1 else identity]
+        self.invalidate_all_results(keys)
+
+    def invalidate_all_results(self, keys=()):
+        """Drop cached listings of the model, and cached items in `keys`.
+
+        Arguments:
+            keys (iterable): primary keys of the written items
+        """
+        if self.result_cache is None:
+            return
+        for key in keys:
+            self.result_cache.delete(self.get_item_cache_key(key))
+        self.new_generation()
+
+    def merge_items(self, items):
+        """Attach cached (detached) objects to the session, without
+        loading them from the database."""
+        return [self.db_session.merge(item, load=False) for item in items]
 
     def update_item(self, item, data):
         return self.save_obj(item)
 
     def delete_item(self, item):
-        return self.detete_obj(item)
+        self.detete_obj(item)
+        self.invalidate_counts()
+
+    def create_items(self, rows):
+        def check(row):
+            self.check_fields(row)
+            return row
+
+        def write(batch):
+            self.db_session.bulk_insert_mappings(self.model_class, batch)
+        return self.write_batches(rows, check, write)
+
+    def update_items(self, rows):
+        pk = self.get_pk_field()
+
+        def check(row):
+            key, data = row
+            self.check_fields(data)
+            return {**data, pk: self.coerce_key(key)}
+
+        def write(batch):
+            self.db_session.bulk_update_mappings(self.model_class, batch)
+        return self.write_batches(
+            rows, check, write, key=op.itemgetter(pk))
+
+    def delete_items(self, keys):
+        pk = self.get_pk_field()
+        column = getattr(self.model_class, pk)
+
+        def write(batch):
+            self.db_session.execute(
+                sa.delete(self.model_class).where(column.in_(batch)),
+                execution_options={'synchronize_session': False},
+            )
+        return self.write_batches(
+            keys, self.coerce_key, write, key=lambda key: key)
+
+    def write_batches(self, rows, check, write, key=None):
+        """Write `rows` in `batch_size` batches, in a single transaction.
+
+        A failed batch is rolled back to its savepoint and written again
+        one row at a time, so only the bad rows are reported.
+
+        Arguments:
+            rows (list): the rows
+            check (callable): validates a row and returns what ``write``
+                receives, raises ``ValueError`` or ``LookupError``
+            write (callable): writes a list of checked rows
+            key (callable): returns the key of a checked row, rows whose
+                key is not in the database are reported as not found
+
+        Returns:
+            list[dict]: the failed rows, as {'index': int, 'error': str}
+        """
+        errors, checked = [], []
+        for index, row in enumerate(rows):
+            try:
+                checked.append((index, check(row)))
+            except (ValueError, LookupError, TypeError) as e:
+                errors.append({'index': index, 'error': str(e)})
+        batches = [
+            checked[start:start+self.batch_size]
+            for start in range(0, len(checked), self.batch_size)
+        ]
+        with transaction(self.db_session) as session:
+            for batch in batches:
+                if key is not None:
+                    batch = self._drop_missing(batch, key, errors)
+                try:
+                    with session.begin_nested():
+                        write([row for _, row in batch])
+                except sa.exc.SQLAlchemyError:
+                    for index, row in batch:
+                        try:
+                            with session.begin_nested():
+                                write([row])
+                        except sa.exc.SQLAlchemyError as e:
+                            error = getattr(e, 'orig', None) or e
+                            errors.append(
+                                {'index': index, 'error': str(error)})
+        self.invalidate_counts()
+        if key is not None:
+            self.invalidate_all_results(key(row) for _, row in checked)
+        else:
+            self.invalidate_all_results()
+        errors.sort(key=op.itemgetter('index'))
+        return errors
+
+    def _drop_missing(self, batch, key, errors):
+        column = getattr(self.model_class, self.get_pk_field())
+        keys = [key(row) for _, row in batch]
+        existing = set(self.db_session.execute(
+            sa.select(column).where(column.in_(keys))).scalars())
+        found = []
+        for index, row in batch:
+            if key(row) in existing:
+                found.append((index, row))
+            else:
+                message = 'Item {!r} not found.'.format(key(row))
+                errors.append({'index': index, 'error': message})
+        return found
+
+    def assign_fields(self, item, data):
+        """Set the fields in `data` on `item`, converted to the column
+        types.
+
+        Raises:
+            ValueError: for unknown fields or values that don't convert
+        """
+        self.check_fields(data)
+        mapper = sa.inspect(self.model_class)
+        for key, value in data.items():
+            column = mapper.column_attrs[key].columns[0]
+            setattr(item, key, coerce_column_value(column, value))
+        return item
+
+    def check_fields(self, data):
+        mapper = sa.inspect(self.model_class)
+        fields = {attr.key for attr in mapper.column_attrs}
+        unknown = sorted(set(data) - fields)
+        if unknown:
+            raise ValueError('Unknown fields: {}.'.format(', '.join(unknown)))
+
+    def get_pk_field(self):
+        mapper = sa.inspect(self.model_class)
+        return mapper.get_property_by_column(mapper.primary_key[0]).key
+
+    def coerce_key(self, key):
+        """Convert a key from the request to the primary key type."""
+        if key is None:
+            raise LookupError('Missing key.')
+        column = sa.inspect(self.model_class).primary_key[0]
+        try:
+            python_type = column.type.python_type
+        except NotImplementedError:
+            return key
+        if isinstance(key, python_type):
+            return key
+        return python_type(key)
 
     def save_obj(self, item):
         with transaction(self.db_session) as session:
             session.add(item)
+        self.invalidate_results(item)
         return item
 
     def detete_obj(self, item):
         with transaction(self.db_session) as session:
             session.delete(item)
+        self.invalidate_results(item)
 
     def new_obj(self):
         return self.model_class()
 
 
+class AsyncSQLAlchemyORMController(resource.AsyncControllerMixin,
+                                   SQLAlchhemyORMController):
+    """Controller for ``sqlalchemy.ext.asyncio`` sessions.
+
+    Listings are built as ``select()`` statements, the page and the count
+    run concurrently, each in its own session from `session_factory`.
+    `result_cache`, `window_count` and `estimate_count` are not supported,
+    the bulk methods write one row at a time, see ``AsyncControllerMixin``.
+
+    Arguments:
+        session_factory (callable): returns a new ``AsyncSession``, like
+            ``async_sessionmaker(engine)``
+        model_class: the mapped class
+        filters (dict): name to ``SearchFilter``/``FieldFilter``
+    """
+
+    def __init__(self, session_factory, model_class, filters=None):
+        if filters is not None:
+            self.filters = filters
+        self.session_factory = session_factory
+        self.model_class = model_class
+
+    async def fetch_items(self):
+        return sa.select(self.model_class)
+
+    async def resolve_items(self, items):
+        async with self.session_factory() as session:
+            result = await session.scalars(items)
+            return list(result)
+
+    def seek_items(self, query, cursor=None, order_by=None, reverse=False):
+        return self.seek_query(
+            query, cursor=cursor, order_by=order_by, reverse=reverse)
+
+    async def count_items(self, query):
+        query = query.order_by(None)
+        if self.count_limit is not None:
+            query = query.limit(self.count_limit + 1)
+        stmt = sa.select(sa.func.count()).select_from(query.subquery())
+        async with self.session_factory() as session:
+            return await session.scalar(stmt)
+
+    async def get_item(self, pk):
+        async with self.session_factory() as session:
+            return await session.get(self.model_class, pk)
+
+    async def get_item_version(self, pk):
+        stmt = self.item_version_statement(pk)
+        if stmt is None:
+            return None
+        async with self.session_factory() as session:
+            return await session.scalar(stmt)
+
+    async def get_items_version(self, filters=None):
+        stmt = self.items_version_statement(await self.fetch_items(), filters)
+        if stmt is None:
+            return None
+        async with self.session_factory() as session:
+            return tuple((await session.execute(stmt)).one())
+
+    async def create_item(self, data):
+        item = self.new_obj()
+        item = await self.update_item(item, data)
+        self.invalidate_counts()
+        return item
+
+    async def update_item(self, item, data):
+        self.assign_fields(item, data)
+        async with self.session_factory() as session:
+            async with session.begin():
+                item = await session.merge(item)
+            await session.refresh(item)
+        return item
+
+    async def delete_item(self, item):
+        async with self.session_factory() as session:
+            async with session.begin():
+                item = await session.merge(item)
+                await session.delete(item)
+        self.invalidate_counts()
+
+
 class SearchFilter:
     def __init__(self, columns, join_tables=None):
         self.columns = columns
@@ -96,6 +648,78 @@ class FieldFilter:
             yield value, title
 
 
+def model_serializer(model_class):
+    """Build a JSON serializer for a mapped class.
+
+    The column attributes are read from the mapper once, the serializer
+    returns a dict of column key to value. columns a loaded object was
+    queried without (see ``load_items``) are left out instead of being
+    loaded one object at a time.
+
+    Arguments:
+        model_class (type): a class, mapped or not
+
+    Returns:
+        callable: the serializer, ``None`` if the class is not mapped
+    """
+    mapper = sa.inspect(model_class, raiseerr=False)
+    if not isinstance(mapper, orm.Mapper):
+        return None
+    keys = tuple(attr.key for attr in mapper.column_attrs)
+    getters = tuple(op.attrgetter(key) for key in keys)
+
+    def serialize(item):
+        state = sa.inspect(item)
+        deferred = ()
+        if state.key is not None:
+            # expired attributes are reloaded, the deferred ones are not
+            deferred = state.unloaded - state.expired_attributes
+        return {
+            key: getter(item) for key, getter in zip(keys, getters)
+            if key not in deferred
+        }
+    return serialize
+
+
+response.serializer.register_factory(model_serializer)
+
+
+def coerce_cursor_value(column, value):
+    """Convert a value decoded from a cursor to the `column` type.
+
+    Raises:
+        InvalidCursor: if the value doesn't convert
+    """
+    try:
+        return coerce_column_value(column, value)
+    except ValueError as e:
+        raise InvalidCursor('Invalid cursor.') from e
+
+
+def coerce_column_value(column, value):
+    """Convert a value, like a form string, to the `column` type.
+
+    Raises:
+        ValueError: if the value doesn't convert
+    """
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return value
+    if value is None or isinstance(value, python_type):
+        return value
+    try:
+        if isinstance(value, str):
+            if python_type is bool:
+                return value.lower() in ('1', 'true', 'on')
+            if hasattr(python_type, 'fromisoformat'):  # dates and times
+                return python_type.fromisoformat(value)
+        return python_type(value)
+    except (TypeError, ValueError, ArithmeticError) as e:
+        raise ValueError('Invalid value for {}: {!r}.'.format(
+            column.key, value)) from e
+
+
 @contextmanager
 def transaction(db_session):
     try:
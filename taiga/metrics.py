@@ -0,0 +1,267 @@
+"""
+    taiga.metrics
+    ~~~~~~~~~~~~~~~~
+
+    Per-request tracing and metrics.
+
+    This module implements the instrumentation hooks of ``Application``,
+    each request stage (routing, handler, controller steps, render) runs in
+    a ``span`` of the current request trace, and ``Metrics`` aggregates the
+    spans in per-endpoint histograms, exposed in the Prometheus text
+    format by ``taiga.response.MetricsHandler``.
+"""
+import bisect
+import contextlib
+import contextvars
+import cProfile
+import io
+import pstats
+import random
+import threading
+import time
+
+# the trace of the request being handled, ``None`` outside of one
+CURRENT_TRACE = contextvars.ContextVar('taiga_trace', default=None)
+
+# upper bounds in seconds, like the Prometheus client defaults
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+    2.5, 5.0, 10.0,
+)
+
+NULL_SPAN = contextlib.nullcontext()
+
+
+def span(stage):
+    """Time `stage` in the current request trace.
+
+    Outside of a traced request it returns a shared no-op context manager,
+    so instrumented code costs one context variable lookup.
+
+    Arguments:
+        stage (str): the stage name, like ``route`` or ``count``
+
+    Returns:
+        a context manager
+    """
+    trace = CURRENT_TRACE.get()
+    if trace is None:
+        return NULL_SPAN
+    return Span(trace, stage)
+
+
+def set_endpoint(endpoint):
+    """Label the current request trace with the matched `endpoint`."""
+    trace = CURRENT_TRACE.get()
+    if trace is not None:
+        trace.endpoint = endpoint
+
+
+class Span:
+    __slots__ = ('trace', 'stage', 'start')
+
+    def __init__(self, trace, stage):
+        self.trace = trace
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.trace.spans.append((self.stage, time.perf_counter()-self.start))
+
+
+class Trace:
+    """The spans of one request.
+
+    Arguments:
+        tracer: the tracer receiving the trace when `activate` exits
+
+    Attributes:
+        endpoint (str): the matched endpoint, ``''`` until routing
+        spans (list): (stage, seconds) tuples
+    """
+
+    __slots__ = ('tracer', 'endpoint', 'spans', 'token', 'start')
+
+    def __init__(self, tracer):
+        self.tracer = tracer
+        self.endpoint = ''
+        self.spans = []
+
+    def activate(self):
+        """Make this the current trace in a ``with`` block, the trace is
+        recorded when the block exits."""
+        return self
+
+    def __enter__(self):
+        self.token = CURRENT_TRACE.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.spans.append(('request', time.perf_counter()-self.start))
+        CURRENT_TRACE.reset(self.token)
+        self.tracer.record(self)
+
+
+class Histogram:
+    """Counts of observed values per bucket.
+
+    Arguments:
+        buckets (sequence): sorted upper bounds
+    """
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """(upper bound, count) pairs, the last bound is ``+Inf``."""
+        total, pairs = 0, []
+        for bound, count in zip((*self.buckets, float('inf')), self.counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+
+class Metrics:
+    """Tracer aggregating request stages in histograms.
+
+    Pass it as ``Application(tracer=Metrics())``, histograms are keyed by
+    (endpoint, stage), stages nest, so ``handler`` includes the controller
+    and render stages.
+
+    Endpoints can be profiled with ``cProfile``: a sampled fraction of
+    their requests runs under the profiler, one at a time, and the stats
+    are accumulated per endpoint.
+
+    Arguments:
+        buckets (sequence): histogram upper bounds, in seconds
+        namespace (str): prefix of the metric names
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, namespace='taiga'):
+        self.buckets = tuple(sorted(buckets))
+        self.namespace = namespace
+        self.histograms = {}
+        self.lock = threading.Lock()
+        self.profile_rates = {}
+        self.profiles = {}
+        self.profile_lock = threading.Lock()
+
+    def start_trace(self, request):  # pylint: disable=unused-argument
+        return Trace(self)
+
+    def record(self, trace):
+        histograms = self.histograms
+        with self.lock:
+            for stage, seconds in trace.spans:
+                key = (trace.endpoint, stage)
+                try:
+                    histogram = histograms[key]
+                except KeyError:
+                    histogram = histograms[key] = Histogram(self.buckets)
+                histogram.observe(seconds)
+
+    def set_profiling(self, endpoint, rate=0.01):
+        """Profile a fraction of the requests to `endpoint`.
+
+        Arguments:
+            endpoint (str): the endpoint
+            rate (float): the fraction of requests, ``0`` turns it off
+        """
+        if rate:
+            self.profile_rates[endpoint] = rate
+        else:
+            self.profile_rates.pop(endpoint, None)
+
+    def profile(self, endpoint):
+        """Run a ``with`` block under ``cProfile`` when `endpoint` is
+        sampled."""
+        rate = self.profile_rates.get(endpoint)
+        if rate is None or random.random() >= rate:
+            return NULL_SPAN
+        return self._profile(endpoint)
+
+    @contextlib.contextmanager
+    def _profile(self, endpoint):
+        if not self.profile_lock.acquire(blocking=False):
+            yield
+            return
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+            stats = self.profiles.get(endpoint)
+            if stats is None:
+                self.profiles[endpoint] = pstats.Stats(profiler)
+            else:
+                stats.add(profiler)
+        finally:
+            self.profile_lock.release()
+
+    def get_profile(self, endpoint, sort='cumulative', limit=40):
+        """The accumulated profile of `endpoint` as text.
+
+        Returns:
+            str: the ``pstats`` report, ``None`` without samples
+        """
+        stats = self.profiles.get(endpoint)
+        if stats is None:
+            return None
+        stream = io.StringIO()
+        with self.profile_lock:
+            stats.stream = stream
+            stats.sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+    def render_prometheus(self):
+        """The histograms in the Prometheus text exposition format.
+
+        Returns:
+            str: the metrics page
+        """
+        name = '{}_stage_duration_seconds'.format(self.namespace)
+        lines = [
+            '# HELP {} Time spent in each request stage.'.format(name),
+            '# TYPE {} histogram'.format(name),
+        ]
+        with self.lock:
+            histograms = [
+                (key, histogram.cumulative(), histogram.sum, histogram.count)
+                for key, histogram in sorted(self.histograms.items())
+            ]
+        for (endpoint, stage), buckets, total, count in histograms:
+            labels = 'endpoint="{}",stage="{}"'.format(
+                escape_label(endpoint), escape_label(stage))
+            for bound, bucket_count in buckets:
+                lines.append('{}_bucket{{{},le="{}"}} {}'.format(
+                    name, labels, format_bound(bound), bucket_count))
+            lines.append('{}_sum{{{}}} {!r}'.format(name, labels, total))
+            lines.append('{}_count{{{}}} {}'.format(name, labels, count))
+        return '\n'.join(lines) + '\n'
+
+
+def escape_label(value):
+    return (str(value).replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def format_bound(bound):
+    if bound == float('inf'):
+        return '+Inf'
+    return repr(float(bound))
@@ -0,0 +1,124 @@
+"""
+    taiga.pagination
+    ~~~~~~~~~~~~~~~~~~~
+
+    Helpers for cursor (keyset) pagination.
+
+    This module implements the opaque cursors used by
+    ``ControllerMixin.seek_items`` and ``Index``.
+"""
+import base64
+import datetime
+import decimal
+import json
+import uuid
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class KeyView:
+    """Read-only sequence of keys over sorted items, for ``bisect``.
+
+    Arguments:
+        items (sequence): sorted items
+        key (callable): the sort key
+        reverse (bool): items are sorted in descending order, the view is
+            still ascending
+    """
+
+    def __init__(self, items, key, reverse=False):
+        self.items = items
+        self.key = key
+        self.reverse = reverse
+
+    def __len__(self):
+        return len(self.items)
+
+    def __getitem__(self, index):
+        if self.reverse:
+            index = len(self.items) - 1 - index
+        return self.key(self.items[index])
+
+
+# sort key values JSON can't encode, as {name: text} objects, with
+# their (class, encode, decode) functions
+CURSOR_TYPES = {
+    'datetime': (datetime.datetime, datetime.datetime.isoformat,
+                 datetime.datetime.fromisoformat),
+    'date': (datetime.date, datetime.date.isoformat,
+             datetime.date.fromisoformat),
+    'time': (datetime.time, datetime.time.isoformat,
+             datetime.time.fromisoformat),
+    'decimal': (decimal.Decimal, str, decimal.Decimal),
+    'uuid': (uuid.UUID, str, uuid.UUID),
+}
+
+
+def encode_cursor(key):
+    """Encode a sort key as an opaque, url-safe cursor.
+
+    Arguments:
+        key (tuple): the sort key, of JSON values or ``CURSOR_TYPES``
+
+    Returns:
+        str: the cursor
+    """
+    data = json.dumps(
+        key, separators=(',', ':'), default=encode_cursor_value)
+    return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii')
+
+
+def encode_cursor_value(value):
+    # datetime is checked before its base class date
+    for name, (cls, encode, _) in CURSOR_TYPES.items():
+        if isinstance(value, cls):
+            return {name: encode(value)}
+    message = 'Object of type {} is not a cursor value'
+    raise TypeError(message.format(type(value).__name__))
+
+
+def decode_cursor_value(obj):
+    try:
+        (name, text), = obj.items()
+        _, _, decode = CURSOR_TYPES[name]
+        return decode(text)
+    except (KeyError, TypeError, ValueError, ArithmeticError) as e:
+        raise InvalidCursor('Invalid cursor.') from e
+
+
+def decode_cursor(cursor):
+    """Decode a cursor from ``encode_cursor``.
+
+    Arguments:
+        cursor (str): the cursor
+
+    Returns:
+        tuple: the sort key
+
+    Raises:
+        InvalidCursor: if the cursor is not valid
+    """
+    try:
+        data = base64.urlsafe_b64decode(cursor.encode('ascii'))
+        key = json.loads(
+            data.decode('utf-8'), object_hook=decode_cursor_value)
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise InvalidCursor('Invalid cursor.') from e
+    if not isinstance(key, list):
+        raise InvalidCursor('Invalid cursor.')
+    return tuple(key)
+
+
+def bisect_cursor(bisect_func, keys, cursor_key):
+    """Find `cursor_key` in `keys` with ``bisect_func``.
+
+    Raises:
+        InvalidCursor: if the cursor values don't compare with the keys,
+            like a string against integer keys
+    """
+    try:
+        return bisect_func(keys, cursor_key)
+    except TypeError as e:
+        raise InvalidCursor('Invalid cursor.') from e
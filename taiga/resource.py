@@ -6,9 +6,17 @@
 
     This module implements a simple RPC interface to help create HTTP APIs.
 """
+import asyncio
+import bisect
 import operator as op
+import threading
+import time
 
-from taiga import tree, component
+from taiga import tree, component, metrics
+from taiga.cache import LRUCache
+from taiga.pagination import (
+    KeyView, bisect_cursor, encode_cursor, decode_cursor,
+)
 
 
 DEFAULT_COMPONENTS = (
@@ -19,6 +27,21 @@ DEFAULT_COMPONENTS = (
     ('delete', '/delete/<key>', 'Delete', False, component.Delete),
 )
 
+# opt-in, use ``components = DEFAULT_COMPONENTS + BULK_COMPONENTS``
+BULK_COMPONENTS = (
+    ('bulk-create', '/bulk-create', 'Bulk Create', False,
+     component.BulkCreate),
+    ('bulk-update', '/bulk-update', 'Bulk Update', False,
+     component.BulkUpdate),
+    ('bulk-delete', '/bulk-delete', 'Bulk Delete', False,
+     component.BulkDelete),
+)
+
+# opt-in, use ``components = DEFAULT_COMPONENTS + EXPORT_COMPONENTS``
+EXPORT_COMPONENTS = (
+    ('export', '/export', 'Export', False, component.Export),
+)
+
 
 class Resource(tree.Tree):  # pylint: disable=abstract-method
     """A RPC-like Tree Node
@@ -41,6 +64,8 @@ class Resource(tree.Tree):  # pylint: disable=abstract-method
             the default value is ``taiga.resource.DEFAULT_COMPONENTS``
     """
 
+    __slots__ = ()
+
     components = DEFAULT_COMPONENTS
 
     def __init__(self, controller, *args, **kwargs):
@@ -57,29 +82,131 @@ class Resource(tree.Tree):  # pylint: disable=abstract-method
 class ControllerMixin:
     per_page = 50
     filters = None
-
-    def get_items(self, page=1, order_by=None, reverse=False, filters=None):
+    # paginate with ``seek_items`` and an opaque cursor instead of pages
+    cursor_pagination = False
+    # the item key used to break ``order_by`` ties in cursor pagination
+    pk_field = 0
+    # a ``CountCache`` shared by controllers, ``None`` disables it
+    count_cache = None
+    # stop counting after ``count_limit`` items, ``None`` counts all
+    count_limit = None
+    # rows written per statement by the bulk methods
+    batch_size = 500
+    # rows fetched per round-trip by `export_items`
+    export_batch_size = 1000
+    # a ``taiga.executor.BoundedExecutor`` to run `get_count` in while
+    # the page is resolved, ``None`` runs them one after the other
+    executor = None
+
+    def get_items(self, page=1, order_by=None, reverse=False, filters=None,
+                  cursor=None, columns=None, relationships=None):
         """Combines the methods::
             - `fetch_items`
             - `filter_items`
+            - `get_count`, with the filtered items
+            - `load_items`
             - `sort_items`
-            - `slice_items`
-            - `count_items`
+            - `slice_items` or `seek_items` with `cursor_pagination`
+            - `resolve_items`
+
+        With an `executor`, `get_count` runs in it (see `offload`) while
+        the page is resolved in the caller thread.
 
         Arguments:
             page (int): the page number
             filters (sequence): a sequence of 2-items tuple of (key, func)
             order_by (str): the field to order items by
             reverse (bool): reverse the sort order
+            cursor (str): the cursor from ``get_cursor``, used instead of
+                ``page`` with `cursor_pagination`
+            columns (sequence): the fields the caller reads
+            relationships (sequence or dict): the relationships the caller
+                reads, see `load_items`
+        """
+        with metrics.span('fetch'):
+            items = self.fetch_items()
+        if filters is not None:
+            with metrics.span('filter'):
+                items = self.filter_items(items, filters=filters)
+        if self.executor is None:
+            count = self.get_count(items, filters=filters)
+        else:
+            count = self.offload(self.get_count, items, filters=filters)
+        page_items = self.load_items(
+            items, columns=columns, relationships=relationships)
+        if self.cursor_pagination:
+            with metrics.span('seek'):
+                page_items = self.seek_items(
+                    page_items, cursor=cursor, order_by=order_by,
+                    reverse=reverse)
+        else:
+            if order_by is not None:
+                with metrics.span('sort'):
+                    page_items = self.sort_items(
+                        page_items, order_by=order_by, reverse=reverse)
+            with metrics.span('slice'):
+                page_items = self.slice_items(page_items, page=page)
+        with metrics.span('resolve'):
+            page_items = self.resolve_items(page_items)
+        if self.executor is not None:
+            count = count.result()
+        return page_items, count
+
+    def offload(self, func, *args, **kwargs):
+        """Run ``func(*args, **kwargs)`` in `executor`, or in the caller
+        thread when it is saturated.
+
+        Returns:
+            concurrent.futures.Future: the result of the call
+        """
+        return self.executor.submit_or_run(func, *args, **kwargs)
+
+    def resolve_items(self, items):
+        """Load the page built by `get_items`, in memory items are
+        already loaded.
+
+        Arguments:
+            items (sequence): the sliced items
+
+        Returns:
+            sequence: the page of items
+        """
+        return items
+
+    def export_items(self, order_by=None, reverse=False, filters=None,
+                     columns=None, relationships=None):
+        """Like `get_items`, without counting and slicing, for exports.
+
+        Arguments:
+            order_by (str): the field to order items by
+            reverse (bool): reverse the sort order
+            filters (dict): the filters
+            columns (sequence): the fields the caller reads
+            relationships (sequence or dict): the relationships the caller
+                reads, see `load_items`
+
+        Returns:
+            iterator: all filtered items, see `stream_items`
         """
         items = self.fetch_items()
-        count = self.count_items(items)
         if filters is not None:
             items = self.filter_items(items, filters=filters)
+        items = self.load_items(
+            items, columns=columns, relationships=relationships)
         if order_by is not None:
             items = self.sort_items(items, order_by=order_by, reverse=reverse)
-        items = self.slice_items(items, page=page)
-        return items, count
+        return self.stream_items(items)
+
+    def stream_items(self, items):
+        """Iterate items without loading them all at once.
+
+        Arguments:
+            items (sequence): the items to export
+
+        Returns:
+            iterator: the items
+        """
+        return iter(items)
 
     def filter_items(self, items, filters):
         """Filter items based on filters in `filters` attribute.
@@ -99,6 +226,20 @@ class ControllerMixin:
             items = filter_func(filter_value, items)
         return items
 
+    def load_items(self, items, columns=None, relationships=None):
+        """Plan how items are loaded, in memory items are already loaded.
+
+        Arguments:
+            items (sequence): the items returned from `fetch_items`
+            columns (sequence): the fields to load, ``None`` for all
+            relationships (sequence or dict): relationships to load
+                eagerly, a dict maps each one to a loader strategy
+
+        Returns:
+            sequence: the items
+        """
+        return items
+
     def sort_items(self, items, order_by, reverse=False):
         """Sort items based on `order_by` key in items.
 
@@ -126,6 +267,130 @@ class ControllerMixin:
         start, end = self.per_page*(page-1), self.per_page*page
         return items[start:end]
 
+    def seek_items(self, items, cursor=None, order_by=None, reverse=False):
+        """Sort items by (`order_by`, pk) and take the `per_page` items
+        after `cursor`, with a binary search.
+
+        Arguments:
+            items (sequence): the items returned from `fetch_items`
+            cursor (str): the cursor from ``get_cursor``, ``None`` for the
+                first page
+            order_by (str): the field to order items by
+            reverse (bool): reverse the sort order
+
+        Returns:
+            list: the page of items
+        """
+        def key(item):
+            return self.cursor_key(item, order_by)
+        items = sorted(items, key=key, reverse=reverse)
+        start = 0
+        if cursor is not None:
+            keys = KeyView(items, key, reverse)
+            cursor_key = decode_cursor(cursor)
+            if reverse:
+                start = len(items) - bisect_cursor(
+                    bisect.bisect_left, keys, cursor_key)
+            else:
+                start = bisect_cursor(bisect.bisect_right, keys, cursor_key)
+        return items[start:start+self.per_page]
+
+    def cursor_key(self, item, order_by=None):
+        """The sort key of `item` in cursor pagination.
+
+        Arguments:
+            item: an item returned from `fetch_items`
+            order_by (str): the field to order items by
+
+        Returns:
+            tuple: (`order_by` value, pk) or (pk,)
+        """
+        if order_by is None:
+            return (item[self.pk_field],)
+        return (item[order_by], item[self.pk_field])
+
+    def get_cursor(self, item, order_by=None):
+        """Build the cursor for the page after `item`.
+
+        Arguments:
+            item: the last item of a page
+            order_by (str): the field to order items by
+
+        Returns:
+            str: an opaque cursor
+        """
+        return encode_cursor(self.cursor_key(item, order_by))
+
+    def get_count(self, items, filters=None):
+        """Count items, through `count_cache` when it is set.
+
+        Arguments:
+            items (sequence): the filtered items
+            filters (dict): the filters applied to `items`
+
+        Returns:
+            int: the count, at most `count_limit` + 1
+        """
+        with metrics.span('count'):
+            key = self.get_count_key(filters)
+            if key is None:
+                return self.count_items(items)
+            count = self.count_cache.get(key)
+            if count is None:
+                count = self.count_items(items)
+                self.count_cache.set(key, count)
+            return count
+
+    def get_count_key(self, filters=None):
+        """The `count_cache` key for `filters`.
+
+        Returns:
+            tuple: the key, ``None`` when counts can't be cached
+        """
+        if self.count_cache is None:
+            return None
+        key = (self.get_count_namespace(),
+               normalize_filters(filters, self.filters))
+        try:
+            hash(key)
+        except TypeError:  # unhashable filter values
+            return None
+        return key
+
+    def get_count_namespace(self):
+        """The `count_cache` namespace of this controller's counts."""
+        return type(self)
+
+    def invalidate_counts(self):
+        """Drop cached counts, call it after creating or deleting items."""
+        if self.count_cache is not None:
+            self.count_cache.invalidate(self.get_count_namespace())
+
+    def get_item_version(self, pk):
+        """A cheap token that changes when the item changes, like a
+        version or ``updated_at`` field, for conditional GETs in ``Read``.
+
+        Arguments:
+            pk: the item key, as in `get_item`
+
+        Returns:
+            the version, ``None`` if it is unknown
+        """
+        return None
+
+    def get_items_version(self, filters=None):
+        """A cheap token that changes when the filtered items change, like
+        the max ``updated_at`` and the count, for conditional GETs in
+        ``Index``.
+
+        Arguments:
+            filters (dict): the filters, as in `get_items`
+
+        Returns:
+            the version, ``None`` if it is unknown
+        """
+        return None
+
     def count_items(self, items):
         """Items size.
 
@@ -133,10 +398,65 @@ class ControllerMixin:
             items (sequence): the items returned from `fetch_items`
 
         Returns:
-            int: len of items
+            int: len of items, at most `count_limit` + 1
         """
+        if self.count_limit is not None:
+            return min(len(items), self.count_limit + 1)
         return len(items)
 
+    def create_items(self, rows):
+        """Create an item for each row, one `create_item` at a time.
+
+        Arguments:
+            rows (list[dict]): the data of each item
+
+        Returns:
+            list[dict]: the failed rows, as {'index': int, 'error': str}
+        """
+        return self._bulk(self.create_item, rows)
+
+    def update_items(self, rows):
+        """Update the items in `rows`, one `update_item` at a time.
+
+        Arguments:
+            rows (list[tuple]): (key, data) of each item
+
+        Returns:
+            list[dict]: the failed rows, as {'index': int, 'error': str}
+        """
+        def update(row):
+            key, data = row
+            self.update_item(self._get_existing_item(key), data)
+        return self._bulk(update, rows)
+
+    def delete_items(self, keys):
+        """Delete the items in `keys`, one `delete_item` at a time.
+
+        Arguments:
+            keys (list): the key of each item
+
+        Returns:
+            list[dict]: the failed keys, as {'index': int, 'error': str}
+        """
+        def delete(key):
+            self.delete_item(self._get_existing_item(key))
+        return self._bulk(delete, keys)
+
+    def _get_existing_item(self, key):
+        item = self.get_item(key)
+        if item is None:
+            raise LookupError('Item {!r} not found.'.format(key))
+        return item
+
+    def _bulk(self, func, rows):
+        errors = []
+        for index, row in enumerate(rows):
+            try:
+                func(row)
+            except Exception as e:  # pylint: disable=broad-except
+                errors.append({'index': index, 'error': str(e)})
+        return errors
+
     def fetch_items(self):
         raise NotImplementedError
 
@@ -151,3 +471,187 @@ class ControllerMixin:
 
     def delete_item(self, item):
         raise NotImplementedError
+
+
+class AsyncControllerMixin(ControllerMixin):
+    """``ControllerMixin`` for storages with async clients.
+
+    The I/O methods (`fetch_items`, `resolve_items`, `count_items`,
+    `get_item`, `create_item`, `update_item` and `delete_item`) are
+    coroutines, the others build the query or transform items in memory
+    like in ``ControllerMixin``. `get_items` runs the count and the page
+    fetch concurrently.
+
+    The methods built on them (`get_items`, `export_items` and the bulk
+    methods) are coroutines too.
+    """
+
+    async def get_items(self, page=1, order_by=None, reverse=False,
+                        filters=None, cursor=None, columns=None,
+                        relationships=None):
+        """Like ``ControllerMixin.get_items``, awaiting `fetch_items`, and
+        `get_count` concurrently with `resolve_items`."""
+        with metrics.span('fetch'):
+            items = await self.fetch_items()
+        if filters is not None:
+            with metrics.span('filter'):
+                items = self.filter_items(items, filters=filters)
+        page_items = self.load_items(
+            items, columns=columns, relationships=relationships)
+        if self.cursor_pagination:
+            page_items = self.seek_items(
+                page_items, cursor=cursor, order_by=order_by,
+                reverse=reverse)
+        else:
+            if order_by is not None:
+                page_items = self.sort_items(
+                    page_items, order_by=order_by, reverse=reverse)
+            page_items = self.slice_items(page_items, page=page)
+        count, page_items = await asyncio.gather(
+            self.get_count(items, filters=filters),
+            self.traced_resolve_items(page_items),
+        )
+        return page_items, count
+
+    async def export_items(self, order_by=None, reverse=False, filters=None,
+                           columns=None, relationships=None):
+        """Like ``ControllerMixin.export_items``, awaiting `fetch_items`
+        and `stream_items`."""
+        items = await self.fetch_items()
+        if filters is not None:
+            items = self.filter_items(items, filters=filters)
+        items = self.load_items(
+            items, columns=columns, relationships=relationships)
+        if order_by is not None:
+            items = self.sort_items(items, order_by=order_by, reverse=reverse)
+        return await self.stream_items(items)
+
+    async def stream_items(self, items):
+        """Load the items to export, with `resolve_items`.
+
+        The response body is iterated synchronously, so the items are
+        loaded before it starts, not streamed.
+
+        Returns:
+            list: the items
+        """
+        return await self.resolve_items(items)
+
+    async def create_items(self, rows):
+        return await self._bulk(self.create_item, rows)
+
+    async def update_items(self, rows):
+        async def update(row):
+            key, data = row
+            await self.update_item(await self._get_existing_item(key), data)
+        return await self._bulk(update, rows)
+
+    async def delete_items(self, keys):
+        async def delete(key):
+            await self.delete_item(await self._get_existing_item(key))
+        return await self._bulk(delete, keys)
+
+    async def _get_existing_item(self, key):
+        item = await self.get_item(key)
+        if item is None:
+            raise LookupError('Item {!r} not found.'.format(key))
+        return item
+
+    async def _bulk(self, func, rows):
+        errors = []
+        for index, row in enumerate(rows):
+            try:
+                await func(row)
+            except Exception as e:  # pylint: disable=broad-except
+                errors.append({'index': index, 'error': str(e)})
+        return errors
+
+    async def get_count(self, items, filters=None):
+        with metrics.span('count'):
+            key = self.get_count_key(filters)
+            if key is None:
+                return await self.count_items(items)
+            count = self.count_cache.get(key)
+            if count is None:
+                count = await self.count_items(items)
+                self.count_cache.set(key, count)
+            return count
+
+    async def resolve_items(self, items):
+        return list(items)
+
+    async def traced_resolve_items(self, items):
+        with metrics.span('resolve'):
+            return await self.resolve_items(items)
+
+    async def get_item_version(self, pk):
+        return None
+
+    async def get_items_version(self, filters=None):
+        return None
+
+    async def count_items(self, items):
+        return super().count_items(items)
+
+    async def fetch_items(self):
+        raise NotImplementedError
+
+    async def get_item(self, pk):
+        raise NotImplementedError
+
+    async def create_item(self, data):
+        raise NotImplementedError
+
+    async def update_item(self, item, data):
+        raise NotImplementedError
+
+    async def delete_item(self, item):
+        raise NotImplementedError
+
+
+class CountCache(LRUCache):
+    """Cache counts for `ttl` seconds, at most `maxsize` of them.
+
+    Keys are (namespace, filters) tuples, a namespace (like the model
+    class) groups the counts dropped together by `invalidate`. filters come
+    from the request, so the least recently used counts are evicted.
+
+    Arguments:
+        ttl (float): seconds a count is valid
+        maxsize (int): max cached counts
+        clock (callable): returns the current time in seconds
+    """
+
+    def __init__(self, ttl=60, maxsize=10000, clock=time.monotonic):
+        super().__init__(maxsize=maxsize, ttl=ttl, clock=clock)
+
+    def invalidate(self, namespace=None):
+        """Drop cached counts.
+
+        Arguments:
+            namespace: drop only this namespace, ``None`` drops all
+        """
+        if namespace is None:
+            self.clear()
+            return
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == namespace]:
+                self.entries.pop(key, None)
+
+
+def normalize_filters(filters, known_filters):
+    """Turn filters in a hashable key, ignoring unknown filters.
+
+    Arguments:
+        filters (dict): filter key to value
+        known_filters (dict): the controller filters
+
+    Returns:
+        tuple: sorted (key, value) pairs
+    """
+    if not filters or not known_filters:
+        return ()
+    return tuple(sorted(
+        (key, value) for key, value in filters.items()
+        if key in known_filters
+    ))
@@ -1,6 +1,30 @@
+import asyncio
+import datetime
+import decimal
+import hashlib
+import inspect
 import json
+import operator as op
+import uuid
+from collections.abc import Mapping
+from functools import partial
+from types import MappingProxyType
 
-from werkzeug import wrappers, exceptions
+from werkzeug import http, wrappers, exceptions
+
+from . import metrics
+from .executor import ExecutorSaturated
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+# keys added by ``RenderHandler.make_context``, not part of the body
+CONTEXT_KEYS = ('request', 'url_for')
+
+# methods ``RenderHandler`` answers with 304 when the version matches
+CONDITIONAL_METHODS = ('GET', 'HEAD')
 
 HTTP_METHODS = (
     'GET', 'POST', 'HEAD', 'OPTIONS',
@@ -8,6 +32,171 @@ HTTP_METHODS = (
 )
 
 
+class JSONSerializer:
+    """Encode JSON with per-class serializers.
+
+    Objects JSON can't encode are converted by the function registered
+    for their class (or the nearest base class), or by the first factory
+    returning a function for it, like
+    ``taiga.ext.sqlalchemy.model_serializer``. The function found for a
+    class is cached.
+
+    Compact output uses ``orjson`` when it is installed, indented output
+    always uses the stdlib ``json``.
+
+    Arguments:
+        fast (bool): use ``orjson`` when it is installed
+    """
+
+    def __init__(self, fast=True):
+        self.serializers = {}
+        self.factories = []
+        self.cache = {}
+        self.fast = fast and orjson is not None
+        self.compact_encoder = json.JSONEncoder(
+            separators=(',', ':'), default=self.default)
+
+    def register(self, cls, func):
+        """Register ``func`` to convert instances of ``cls``.
+
+        Arguments:
+            cls (type): the class
+            func (callable): receives an instance, returns a JSON value
+        """
+        self.serializers[cls] = func
+        self.cache.clear()
+
+    def register_factory(self, factory):
+        """Register a serializer factory.
+
+        Arguments:
+            factory (callable): receives a class, returns a serializer
+                function for it or ``None``
+        """
+        self.factories.append(factory)
+        self.cache.clear()
+
+    def get_serializer(self, cls):
+        try:
+            return self.cache[cls]
+        except KeyError:
+            pass
+        func = None
+        for base in cls.__mro__:
+            if base in self.serializers:
+                func = self.serializers[base]
+                break
+        else:
+            for factory in self.factories:
+                func = factory(cls)
+                if func is not None:
+                    break
+        self.cache[cls] = func
+        return func
+
+    def default(self, obj):
+        func = self.get_serializer(type(obj))
+        if func is None:
+            message = 'Object of type {} is not JSON serializable'
+            raise TypeError(message.format(type(obj).__name__))
+        return func(obj)
+
+    def dumps(self, obj, indent=None):
+        """Encode ``obj``.
+
+        Arguments:
+            obj: the value to encode
+            indent (int): spaces to indent with, ``None`` for compact JSON
+
+        Returns:
+            str: the JSON document
+        """
+        if indent is not None:
+            return json.dumps(obj, indent=indent, default=self.default)
+        if self.fast:
+            # non-str keys are converted like the stdlib json does
+            return orjson.dumps(
+                obj, default=self.default, option=orjson.OPT_NON_STR_KEYS,
+            ).decode('utf-8')
+        return self.compact_encoder.encode(obj)
+
+
+serializer = JSONSerializer()
+serializer.register(MappingProxyType, dict)
+serializer.register(datetime.date, op.methodcaller('isoformat'))
+serializer.register(datetime.time, op.methodcaller('isoformat'))
+serializer.register(decimal.Decimal, str)
+serializer.register(uuid.UUID, str)
+serializer.register(set, list)
+serializer.register(frozenset, list)
+
+
+async def maybe_await(value):
+    """Await `value` if it is awaitable, so sync and async handlers and
+    controllers can be called the same way."""
+    if inspect.isawaitable(value):
+        return await value
+    return value
+
+
+def run_steps(steps, resolve=None):
+    """Run the generator of a step method to its return value.
+
+    A step method (a generator function, like ``Index.get``) yields each
+    controller call and gets its result back, so one implementation serves
+    sync and async controllers.
+
+    Arguments:
+        steps (generator): the step method call
+        resolve (callable): turns a yielded value into its result, the
+            exceptions it raises are thrown into `steps`. ``None`` sends
+            the yielded values back as they are
+
+    Returns:
+        the return value of `steps`
+    """
+    send, value = steps.send, None
+    while True:
+        try:
+            value = send(value)
+        except StopIteration as stop:
+            return stop.value
+        send = steps.send
+        if resolve is not None:
+            try:
+                value = resolve(value)
+            except Exception as e:  # pylint: disable=broad-except
+                send, value = steps.throw, e
+
+
+async def async_run_steps(steps):
+    """Same as `run_steps`, awaiting the yielded values."""
+    send, value = steps.send, None
+    while True:
+        try:
+            value = send(value)
+        except StopIteration as stop:
+            return stop.value
+        send = steps.send
+        try:
+            value = await maybe_await(value)
+        except Exception as e:  # pylint: disable=broad-except
+            send, value = steps.throw, e
+
+
+def call_steps(method, resolve, handler, *args, **kwargs):
+    """Call the step `method` of `handler` with `run_steps`."""
+    return run_steps(method(handler, *args, **kwargs), resolve)
+
+
+def resolve_in_loop(loop, value):
+    """Await `value` in the event `loop`, from another thread."""
+    if not inspect.isawaitable(value):
+        return value
+    future = asyncio.run_coroutine_threadsafe(maybe_await(value), loop)
+    return future.result()
+
+
 class EndpointHandler:
     def __init__(self, application, request):
         self.application = application
@@ -16,53 +205,321 @@ class EndpointHandler:
     def entrypoint(self, *args, **kwargs):
         raise NotImplementedError()
 
+    async def async_entrypoint(self, *args, **kwargs):
+        """Entrypoint used by ``ASGIApplication``."""
+        return await maybe_await(self.entrypoint(*args, **kwargs))
+
+
+class MenuHandler(EndpointHandler):
+    """Serve the application menu tree as JSON.
+
+    The body is encoded once by ``Tree.as_menu_json``, requests with a
+    matching ``If-None-Match`` get a 304.
+    """
+
+    def entrypoint(self, *args, **kwargs):
+        body, etag = self.application.tree.as_menu_json()
+        response = wrappers.Response(body, mimetype='application/json')
+        response.set_etag(etag)
+        return response.make_conditional(self.request)
+
+
+class MetricsHandler(EndpointHandler):
+    """Serve the application ``tracer`` metrics, for Prometheus.
+
+    Mount it with ``Leaf(..., handler=MetricsHandler, show_in_menu=False)``
+    and ``Application(tracer=taiga.metrics.Metrics())``. with a
+    ``profile`` argument it serves the accumulated profile of that
+    endpoint instead, see ``Metrics.set_profiling``.
+    """
+
+    mimetype = 'text/plain; version=0.0.4'
+
+    def entrypoint(self, *args, **kwargs):
+        tracer = self.application.tracer
+        if tracer is None:
+            raise exceptions.NotFound('Metrics are disabled.')
+        endpoint = self.request.args.get('profile')
+        if endpoint is None:
+            return wrappers.Response(
+                tracer.render_prometheus(), content_type=self.mimetype)
+        report = tracer.get_profile(endpoint)
+        if report is None:
+            raise exceptions.NotFound('No profile for this endpoint.')
+        return wrappers.Response(report, mimetype='text/plain')
+
 
 class MethodHandler(EndpointHandler):
+    # HTTP method -> unbound function, compiled once per subclass
+    http_methods = MappingProxyType({})
+    # same, preferring ``async_<method>`` when defined, for ASGI
+    async_http_methods = MappingProxyType({})
+    # a ``taiga.executor.BoundedExecutor`` to run the sync methods in, a
+    # saturated pool responds 503, ``None`` runs them in the caller thread.
+    # methods using a ``scoped_session`` need ``cleanup=Session.remove``
+    executor = None
+    # methods can also be step methods, generators yielding each controller
+    # call (see ``run_steps``), run with sync and async controllers alike
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.http_methods = MappingProxyType({
+            key: getattr(cls, key.lower())
+            for key in HTTP_METHODS
+            if hasattr(cls, key.lower())
+        })
+        async_methods = {
+            key: getattr(cls, 'async_{}'.format(key.lower()), None)
+            for key in HTTP_METHODS
+        }
+        cls.async_http_methods = MappingProxyType({
+            key: async_methods[key] or cls.http_methods.get(key)
+            for key in HTTP_METHODS
+            if async_methods[key] or key in cls.http_methods
+        })
+
     def entrypoint(self, *args, **kwargs):
-        allowed_methods = self.get_allowed_methods()
+        method = self.get_method(self.http_methods)
+        return self.call(method, *args, **kwargs)
+
+    async def async_entrypoint(self, *args, **kwargs):
+        method = self.get_method(self.async_http_methods)
+        return await self.async_call(method, *args, **kwargs)
+
+    def call(self, method, *args, **kwargs):
+        """Call the unbound `method` in `executor`, or in the caller thread
+        without one."""
+        if inspect.isgeneratorfunction(method):
+            method = partial(call_steps, method, None)
+        if self.executor is None:
+            return method(self, *args, **kwargs)
+        return self.offload(self.executor.run, method, *args, **kwargs)
+
+    async def async_call(self, method, *args, **kwargs):
+        """Same as `call` for ASGI, coroutine functions run in the event
+        loop. step methods run in `executor` too, awaiting the calls to
+        async controllers in the event loop."""
+        if inspect.isgeneratorfunction(method):
+            if self.executor is None:
+                return await async_run_steps(method(self, *args, **kwargs))
+            resolve = partial(resolve_in_loop, asyncio.get_running_loop())
+            method = partial(call_steps, method, resolve)
+        elif self.executor is None or inspect.iscoroutinefunction(method):
+            return await maybe_await(method(self, *args, **kwargs))
+        return await maybe_await(await self.offload(
+            self.executor.run_async, method, *args, **kwargs))
+
+    def offload(self, run, method, *args, **kwargs):
+        """Call `method` with the executor `run` function, shedding the
+        request with a 503 when the executor is saturated."""
+        try:
+            return run(method, self, *args, **kwargs)
+        except ExecutorSaturated:
+            raise exceptions.ServiceUnavailable(
+                retry_after=self.executor.retry_after)
+
+    def get_method(self, methods):
         try:
-            method = allowed_methods[self.request.method]
+            return methods[self.request.method]
         except KeyError:
-            valid_methods = list(allowed_methods.keys())
+            valid_methods = list(methods.keys())
             raise exceptions.MethodNotAllowed(valid_methods)
-        return method(*args, **kwargs)
 
     def get_allowed_methods(self):
         return {
-            key: getattr(self, key.lower())
-            for key in HTTP_METHODS
-            if hasattr(self, key.lower())
+            key: method.__get__(self)
+            for key, method in self.http_methods.items()
         }
 
 
 class RenderHandler(MethodHandler):
-    def __init__(self, application, request):
-        super().__init__(application, request)
-        self.renders = {
-            'html': self.render_html,
-            'json': self.render_json,
-        }
+    render_names = ('html', 'json')
+    default_render = 'html'
+    # ``None`` for compact JSON, or the number of spaces to indent
+    json_indent = None
+    json_serializer = serializer
+    # render html with ``Template.stream`` instead of one string, the
+    # chunk size is the number of template events buffered per chunk
+    stream_html = False
+    stream_chunk_size = 40
+    # render name -> unbound ``render_<name>``, compiled once per subclass
+    renders = MappingProxyType({})
 
-    def entrypoint(self, *args, render='html', **kwargs):
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.renders = MappingProxyType({
+            name: getattr(cls, 'render_{}'.format(name))
+            for name in cls.render_names
+        })
+
+    def entrypoint(self, *args, render=None, **kwargs):
+        render = self.get_render(render)
+        validators = None
+        if self.request.method in CONDITIONAL_METHODS:
+            version = self.call(type(self).get_version, *args, **kwargs)
+            validators = self.get_validators(render, version)
+            if not self.is_modified(validators):
+                return self.make_not_modified(validators)
+        body = super().entrypoint(*args, **kwargs)
+        return self.set_validators(
+            self.make_response(render, body), validators)
+
+    async def async_entrypoint(self, *args, render=None, **kwargs):
+        render = self.get_render(render)
+        validators = None
+        if self.request.method in CONDITIONAL_METHODS:
+            version = await self.async_call(
+                type(self).get_version, *args, **kwargs)
+            validators = self.get_validators(render, version)
+            if not self.is_modified(validators):
+                return self.make_not_modified(validators)
+        body = await super().async_entrypoint(*args, **kwargs)
+        return self.set_validators(
+            self.make_response(render, body), validators)
+
+    def get_version(self, *args, **kwargs):
+        """A cheap token that changes when the response body changes,
+        checked before the method runs, for conditional GETs.
+
+        It runs in `executor` like the method.
+
+        Arguments:
+            same as the method for the request
+
+        Returns:
+            the version, hashable with ``repr``, ``None`` to always run the
+            method. a ``datetime`` is also sent as ``Last-Modified``, other
+            versions (like a (max ``updated_at``, count) tuple, which a
+            delete doesn't advance) only as ``ETag``
+        """
+        return None
+
+    def get_validators(self, render, version):
+        """Build the ``ETag`` and ``Last-Modified`` for `version`.
+
+        The ``ETag`` also covers the handler, render and url, so each
+        representation of the same version has its own.
+
+        Returns:
+            tuple: (etag, last_modified), ``None`` without a version
+        """
+        if version is None:
+            return None
+        key = repr((
+            type(self).__qualname__, render.__name__,
+            self.request.full_path, version,
+        ))
+        etag = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        last_modified = None
+        if isinstance(version, datetime.datetime):
+            last_modified = version
+        return etag, last_modified
+
+    def is_modified(self, validators):
+        if validators is None:
+            return True
+        etag, last_modified = validators
+        return http.is_resource_modified(
+            self.request.environ, etag=etag, last_modified=last_modified)
+
+    def make_not_modified(self, validators):
+        return self.set_validators(wrappers.Response(status=304), validators)
+
+    def set_validators(self, response, validators):
+        if validators is not None:
+            etag, last_modified = validators
+            response.set_etag(etag)
+            if last_modified is not None:
+                response.last_modified = last_modified
+        return response
+
+    def get_render(self, name=None):
+        if name is None:
+            name = self.default_render
         try:
-            render = self.renders[render]
+            return self.renders[name]
         except KeyError:
-            message = 'Stream render "{}" not found.'.format(render)
+            message = 'Stream render "{}" not found.'.format(name)
             raise exceptions.NotFound(message)
-        body = super().entrypoint(*args, **kwargs)
+
+    def make_response(self, render, body):
         context = self.make_context(body=body)
-        return wrappers.Response(render(context))
+        with metrics.span('render'):
+            response = render(self, context)
+        if isinstance(response, wrappers.Response):
+            return response
+        return wrappers.Response(response)
 
     def make_context(self, body=None):
-        url_for = self.application.get_url_for()
+        url_for = self.application.get_url_for(self.request)
         return {
             'request': self.request,
             'url_for': url_for,
             **(body or {}),
         }
 
+    def get_template(self):
+        """Load ``template_name`` from the application environment.
+
+        Returns:
+            jinja2.Template: the compiled template
+        """
+        name = self.template_name  # pylint: disable=no-member
+        return self.application.get_template(name)
+
     def render_html(self, context):
-        return self.template.render(**context)  # pylint: disable=no-member
+        template = self.get_template()
+        if not self.stream_html:
+            return template.render(**context)
+        stream = template.stream(**context)
+        if self.stream_chunk_size > 1:
+            stream.enable_buffering(self.stream_chunk_size)
+        return wrappers.Response(stream, mimetype='text/html')
 
     def render_json(self, context):
-        return json.dumps(context['data'], indent=4)
+        body = {
+            key: value for key, value in context.items()
+            if key not in CONTEXT_KEYS
+        }
+        return wrappers.Response(
+            iter_json(body, indent=self.json_indent,
+                      serializer=self.json_serializer),
+            mimetype='application/json',
+        )
+
+
+def iter_json(body, indent=None, serializer=serializer):
+    """Encode ``body`` as a JSON object, one chunk at a time.
+
+    Sequences and iterables in ``body`` values (like ``items`` from
+    ``Index``), other than strings and mappings, are consumed and encoded
+    one element at a time, so memory stays flat for any number of elements.
+
+    Arguments:
+        body (dict): the values to encode
+        indent (int): spaces to indent with, ``None`` for compact JSON
+        serializer (JSONSerializer): the encoder for each value
+
+    Yields:
+        str: JSON chunks
+    """
+    dumps = partial(serializer.dumps, indent=indent)
+    if indent is None:
+        newline, pad, colon = '', '', ':'
+    else:
+        newline, pad, colon = '\n', ' ' * indent, ': '
+    yield '{'
+    for i, (key, value) in enumerate(body.items()):
+        yield ''.join([',' if i else '', newline, pad, dumps(key), colon])
+        if isinstance(value, (str, bytes, Mapping)) or \
+                not hasattr(value, '__iter__'):
+            yield dumps(value).replace('\n', newline + pad)
+            continue
+        yield '['
+        empty = True
+        for j, item in enumerate(value):
+            chunk = dumps(item).replace('\n', newline + pad * 2)
+            yield ''.join([',' if j else '', newline, pad * 2, chunk])
+            empty = False
+        yield ']' if empty else ''.join([newline, pad, ']'])
+    yield ''.join([newline, '}'])
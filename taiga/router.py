@@ -0,0 +1,237 @@
+"""
+    taiga.router
+    ~~~~~~~~~~~~~~~
+
+    Alternative router backends for ``Application``.
+
+    This module implements a segment-based radix trie, it matches a path
+    in time proportional to its depth instead of the number of rules.
+"""
+import copy
+import re
+
+from werkzeug import routing
+
+PLACEHOLDER_RE = re.compile(
+    r'^<(?:[a-zA-Z_][a-zA-Z0-9_]*(?:\(.*?\))?:)?'
+    r'(?P<variable>[a-zA-Z_][a-zA-Z0-9_]*)>$'
+)
+
+
+class TrieNode:
+    """A path segment in ``TrieRouter``.
+
+    Attributes:
+        static (dict): segment (str) to child node
+        wildcards (list): (key, regex, converter, variable, node) edges,
+            tried in insertion order after ``static``
+        endpoints (dict): method (str or ``None`` for any) to endpoint
+    """
+
+    __slots__ = ('static', 'wildcards', 'endpoints')
+
+    def __init__(self):
+        self.static = {}
+        self.wildcards = []
+        self.endpoints = {}
+
+    def copy(self):
+        node = TrieNode()
+        node.static = dict(self.static)
+        node.wildcards = list(self.wildcards)
+        node.endpoints = dict(self.endpoints)
+        return node
+
+    def add_static(self, segment, copied=None):
+        """The child for `segment`, created if needed.
+
+        With `copied`, the ids of the nodes owned by the caller, a shared
+        child is copied before it is returned, see ``TrieRouter.extend``.
+        """
+        node = self.static.get(segment)
+        if node is None:
+            node = self.static[segment] = TrieNode()
+        elif copied is not None and id(node) not in copied:
+            node = self.static[segment] = node.copy()
+        else:
+            return node
+        if copied is not None:
+            copied.add(id(node))
+        return node
+
+    def add_wildcard(self, variable, converter, copied=None):
+        """Same as `add_static`, for a converter edge."""
+        key = converter_key(converter, variable)
+        for index, edge in enumerate(self.wildcards):
+            if edge[0] == key:
+                node = edge[4]
+                if copied is not None and id(node) not in copied:
+                    node = node.copy()
+                    copied.add(id(node))
+                    self.wildcards[index] = (*edge[:4], node)
+                return node
+        node = TrieNode()
+        if copied is not None:
+            copied.add(id(node))
+        regex = re.compile(converter.regex)
+        self.wildcards.append((key, regex, converter, variable, node))
+        # the order werkzeug sorts the transitions of a state in, for a
+        # segment with a single converter, the sort is stable
+        self.wildcards.sort(key=lambda edge: edge[2].weight)
+        return node
+
+
+def converter_key(converter, variable):
+    """Identify a wildcard edge by converter class, arguments (like
+    ``min`` of ``int``) and variable, so differently bounded converters get
+    their own edges."""
+    arguments = tuple(sorted(
+        (name, repr(value)) for name, value in vars(converter).items()
+        if name != 'map'
+    ))
+    return (type(converter), converter.regex, arguments, variable)
+
+
+class TrieRouter:
+    """Match paths with a segment-based radix trie.
+
+    Rules are taken from a compiled ``werkzeug.routing.Map``, each path
+    segment is a static edge or, when it is a single converter like
+    ``<key>`` or ``<int:key>``, a typed wildcard edge. Static edges win over
+    wildcards, and wildcards are tried by converter weight then in rule
+    order, like in werkzeug.
+
+    Rules the trie can't represent (converters matching ``/``, converters
+    mixed with text in one segment, defaults, redirects, subdomains) are
+    not compiled, the caller should fall back to the werkzeug map when
+    ``match`` returns ``None``, which also gives werkzeug's redirects and
+    404/405 errors.
+
+    Arguments:
+        url_map (werkzeug.routing.Map): the map with the rules
+    """
+
+    def __init__(self, url_map):
+        self.root = TrieNode()
+        self.fallback_rules = []
+        for rule in url_map.iter_rules():
+            if not self.add_rule(rule):
+                self.fallback_rules.append(rule)
+
+    def extend(self, rules):
+        """Copy the router with `rules` added (copy-on-write).
+
+        Only the nodes on the paths of `rules` are copied, the others are
+        shared, this router keeps serving requests unchanged meanwhile.
+
+        Arguments:
+            rules (iterable): ``werkzeug.routing.Rule`` bound to a map
+
+        Returns:
+            TrieRouter: the new router
+        """
+        router = copy.copy(self)
+        router.root = self.root.copy()
+        router.fallback_rules = list(self.fallback_rules)
+        copied = {id(router.root)}
+        for rule in rules:
+            if not router.add_rule(rule, copied):
+                router.fallback_rules.append(rule)
+        return router
+
+    def add_rule(self, rule, copied=None):
+        """Compile ``rule`` into the trie.
+
+        Arguments:
+            rule (werkzeug.routing.Rule): a rule bound to a map
+            copied (set): ids of the nodes owned by this router, the
+                others are copied before they are changed, see `extend`
+
+        Returns:
+            bool: ``False`` if the rule can't be represented in the trie
+        """
+        if (rule.defaults or rule.build_only or rule.subdomain or
+                rule.redirect_to is not None or
+                getattr(rule, 'websocket', False) or
+                rule.map.host_matching):
+            return False
+        path = []
+        for segment in rule.rule.split('/')[1:]:
+            placeholder = PLACEHOLDER_RE.match(segment)
+            if placeholder is not None:
+                variable = placeholder.group('variable')
+                converter = rule._converters[variable]  # pylint: disable=protected-access
+                if not is_part_isolating(converter):
+                    return False
+                path.append((variable, converter))
+            elif '<' in segment:
+                return False
+            else:
+                path.append((None, segment))
+        node = self.root
+        for variable, segment in path:
+            if variable is None:
+                node = node.add_static(segment, copied)
+            else:
+                node = node.add_wildcard(variable, segment, copied)
+        if None in node.endpoints:
+            return True  # shadowed by an earlier any-method rule
+        for method in rule.methods or (None,):
+            node.endpoints.setdefault(method, rule.endpoint)
+        return True
+
+    def match(self, path, method):
+        """Find the endpoint for ``path``.
+
+        Arguments:
+            path (str): the path info, starting with ``/``
+            method (str): the HTTP method
+
+        Returns:
+            tuple: the endpoint (str) and the url values (dict), or
+            ``None`` if nothing in the trie matches
+        """
+        segments = path.split('/')[1:]
+        return self._match(self.root, segments, 0, method, {})
+
+    def _match(self, node, segments, depth, method, values):
+        if depth == len(segments):
+            endpoints = node.endpoints
+            try:
+                return endpoints[method], values
+            except KeyError:
+                pass
+            try:
+                return endpoints[None], values
+            except KeyError:
+                return None
+        segment = segments[depth]
+        try:
+            child = node.static[segment]
+        except KeyError:
+            pass
+        else:
+            found = self._match(child, segments, depth+1, method, values)
+            if found is not None:
+                return found
+        for _, regex, converter, variable, child in node.wildcards:
+            if regex.fullmatch(segment) is None:
+                continue
+            try:
+                value = converter.to_python(segment)
+            except routing.ValidationError:
+                continue
+            found = self._match(
+                child, segments, depth+1, method,
+                {**values, variable: value},
+            )
+            if found is not None:
+                return found
+        return None
+
+
+def is_part_isolating(converter):
+    try:
+        return converter.part_isolating
+    except AttributeError:  # werkzeug < 2.2
+        return '/' not in converter.regex
@@ -0,0 +1,41 @@
+"""
+    taiga.templating
+    ~~~~~~~~~~~~~~~~~~~
+
+    Shared Jinja2 environment for ``RenderHandler`` templates.
+
+    This module builds the application-level environment, templates are
+    looked up by name in the user search path and then in the templates
+    shipped with taiga.
+"""
+import jinja2
+
+
+def create_environment(search_path=None, bytecode_cache_dir=None,
+                       auto_reload=False, **options):
+    """Create the Jinja2 environment for an ``Application``.
+
+    Arguments:
+        search_path (str or list): directories searched before the
+            templates shipped with taiga
+        bytecode_cache_dir (str): directory for the compiled templates,
+            Jinja2 picks a temporary directory when it is ``None``
+        auto_reload (bool): check templates for changes on every render,
+            only useful in development
+        options: extra ``jinja2.Environment`` arguments
+
+    Returns:
+        jinja2.Environment: the environment
+    """
+    loaders = []
+    if search_path is not None:
+        loaders.append(jinja2.FileSystemLoader(search_path))
+    loaders.append(jinja2.PackageLoader('taiga', 'templates'))
+    options.setdefault('autoescape', jinja2.select_autoescape(['html']))
+    options.setdefault('cache_size', -1)
+    return jinja2.Environment(
+        loader=jinja2.ChoiceLoader(loaders),
+        bytecode_cache=jinja2.FileSystemBytecodeCache(bytecode_cache_dir),
+        auto_reload=auto_reload,
+        **options
+    )
@@ -7,9 +7,17 @@
     This module implements a simple tree-like structure to help create
     automated urls prefixes and endpoint prefixes.
 """
+import hashlib
+import json
+import weakref
+from types import MappingProxyType
+
 from werkzeug import routing
 
+from . import urls
+
 ENDPOINT_SEP = ':'
+MISSING = object()
 
 
 class Tree:
@@ -21,14 +29,32 @@ class Tree:
         items (iterable[Tree]): Sequence of nodes
         name (str): Human readable name
         show_in_menu (bool): If node should be in menu_tree
+
+    ``absolute_endpoint``, ``absolute_url`` and ``as_menu_tree`` are cached
+    on each node, the cache of a subtree is cleared by ``set_parent``, and
+    menus up to the root are rebuilt after ``register_items`` or a change
+    of ``show_in_menu``. call ``invalidate_cache`` after changing
+    ``endpoint``, ``url`` or ``name`` by hand.
+
+    Applications serving the tree are notified of the items registered
+    afterwards, see ``mount``.
     """
 
-    parent = None
+    __slots__ = (
+        'endpoint', 'url', 'items', 'name', '_show_in_menu', 'parent',
+        '_absolute_endpoint', '_absolute_url', '_menu_tree', '_menu_json',
+        'applications',
+    )
 
     def __init__(self, endpoint, url, items, name,
                  show_in_menu=True):
         self.endpoint = endpoint
         self.url = url
+        self.parent = None
+        self._absolute_endpoint = self._absolute_url = MISSING
+        self._menu_tree = self._menu_json = MISSING
+        self._show_in_menu = show_in_menu
+        self.applications = None
         self.items = []
         if items is not None:
             self.register_items(items)
@@ -54,6 +80,35 @@ class Tree:
         for item in items:
             item.set_parent(self)
         self.items.extend(items)
+        self.invalidate_menu()
+        node = self
+        while node is not None:
+            for application in node.applications or ():
+                application.add_items(self, items)
+            node = node.parent
+
+    def mount(self, application):
+        """Notify `application` of the items registered in this subtree.
+
+        ``application.add_items(node, items)`` is called after each
+        ``register_items``, the reference to `application` is weak.
+
+        Arguments:
+            application (Application): the application serving this node
+        """
+        if self.applications is None:
+            self.applications = weakref.WeakSet()
+        self.applications.add(application)
+
+    @property
+    def show_in_menu(self):
+        return self._show_in_menu
+
+    @show_in_menu.setter
+    def show_in_menu(self, value):
+        if value != self._show_in_menu and self.parent is not None:
+            self.parent.invalidate_menu()
+        self._show_in_menu = value
 
     def set_parent(self, parent):
         """Set parent node.
@@ -62,6 +117,25 @@ class Tree:
             parent (Tree): Node to become parent of ``self``
         """
         self.parent = parent
+        self.invalidate_cache()
+
+    def invalidate_cache(self):
+        """Clear cached absolute endpoints, urls and menus of this subtree,
+        and the menus of its parents."""
+        nodes = [self]
+        while nodes:
+            node = nodes.pop()
+            node._absolute_endpoint = node._absolute_url = MISSING
+            node._menu_tree = node._menu_json = MISSING
+            nodes.extend(node.items)
+        self.invalidate_menu()
+
+    def invalidate_menu(self):
+        """Clear cached menus from this node up to the root."""
+        node = self
+        while node is not None:
+            node._menu_tree = node._menu_json = MISSING
+            node = node.parent
 
     def get_url_rules(self):
         """Build a ``werkzeug.routiung.Rule`` for this node.
@@ -69,7 +143,18 @@ class Tree:
         Returns:
             werkzeug.routiung.Rule: A url Rule for this node
         """
-        url_rules = [item.get_url_rules() for item in self.items]
+        return self.wrap_url_rules(
+            [item.get_url_rules() for item in self.items])
+
+    def wrap_url_rules(self, url_rules):
+        """Apply this node url and endpoint prefixes to `url_rules`.
+
+        Arguments:
+            url_rules (list): ``werkzeug.routing.RuleFactory`` of children
+
+        Returns:
+            werkzeug.routing.RuleFactory: the prefixed rules
+        """
         prefix = ''
         if self.endpoint:
             prefix = ''.join([self.endpoint, ENDPOINT_SEP])
@@ -77,6 +162,26 @@ class Tree:
             url_rules = [routing.Submount(self.url, url_rules)]
         return routing.EndpointPrefix(prefix, url_rules)
 
+    def get_items_url_rules(self, items, root=None):
+        """Build the rules of `items`, children of this node, with the
+        prefixes of this node and its parents up to `root`.
+
+        Arguments:
+            items (iterable[Tree]): children of this node
+            root (Tree): the node of the url map, the top one by default
+
+        Returns:
+            werkzeug.routing.RuleFactory: the rules, as in
+            ``root.get_url_rules()``
+        """
+        node = self
+        url_rules = node.wrap_url_rules(
+            [item.get_url_rules() for item in items])
+        while node is not root and node.parent is not None:
+            node = node.parent
+            url_rules = node.wrap_url_rules([url_rules])
+        return url_rules
+
     def get_endpoints(self):
         """Yields all endpoints under this node.
 
@@ -92,13 +197,16 @@ class Tree:
         Returns:
             str: the absolute endpoint
         """
-        try:
-            base = self.parent.absolute_endpoint()
-        except AttributeError:
-            return self.endpoint
-        if not base:
-            return self.endpoint
-        return ENDPOINT_SEP.join([base, self.endpoint])
+        if self._absolute_endpoint is MISSING:
+            base = None
+            if self.parent is not None:
+                base = self.parent.absolute_endpoint()
+            if base:
+                self._absolute_endpoint = ENDPOINT_SEP.join(
+                    [base, self.endpoint])
+            else:
+                self._absolute_endpoint = self.endpoint
+        return self._absolute_endpoint
 
     def absolute_url(self):
         """Concat parent url with `self` url
@@ -106,29 +214,50 @@ class Tree:
         Returns:
             str: The absolute url
         """
-        try:
-            base = self.parent.absolute_url()
-        except AttributeError:
-            return self.url
-        if not base:
-            return self.url
-        return '/'.join([base.rstrip('/'), self.url.lstrip('/')])
+        if self._absolute_url is MISSING:
+            base = None
+            if self.parent is not None:
+                base = self.parent.absolute_url()
+            if base:
+                self._absolute_url = '/'.join(
+                    [base.rstrip('/'), self.url.lstrip('/')])
+            else:
+                self._absolute_url = self.url
+        return self._absolute_url
 
     def as_menu_tree(self):
         """Create a list with all nodes in a tree-like structure.
 
+        The structure is read-only and shared, it is built once and only
+        the changed nodes are rebuilt.
+
+        Returns:
+            mappingproxy: The tree-like structure
+        """
+        if self._menu_tree is MISSING:
+            self._menu_tree = MappingProxyType({
+                'endpoint': self.absolute_endpoint(),
+                'name': self.name,
+                'items': tuple(
+                    item.as_menu_tree()
+                    for item in self.items
+                    if item.show_in_menu
+                ),
+            })
+        return self._menu_tree
+
+    def as_menu_json(self):
+        """Encode ``as_menu_tree`` to JSON, once.
+
         Returns:
-            dict: The tree-like structure
+            tuple: the JSON (bytes) and its ETag (str)
         """
-        return {
-            'endpoint': self.absolute_endpoint(),
-            'name': self.name,
-            'items': [
-                item.as_menu_tree()
-                for item in self.items
-                if item.show_in_menu
-            ],
-        }
+        if self._menu_json is MISSING:
+            body = json.dumps(
+                self.as_menu_tree(), default=dict, separators=(',', ':'),
+            ).encode('utf-8')
+            self._menu_json = body, hashlib.sha1(body).hexdigest()
+        return self._menu_json
 
 
 class Leaf(Tree):
@@ -144,8 +273,12 @@ class Leaf(Tree):
         name (str): Human readable name
         show_in_menu (bool): If node should be in menu_tree
     """
+
+    __slots__ = ('handler',)
+
     def __init__(self, endpoint, url, name, handler, show_in_menu=True):
-        super().__init__(endpoint=endpoint, url=url, name=name, items=())
+        super().__init__(endpoint=endpoint, url=url, name=name, items=(),
+                         show_in_menu=show_in_menu)
         self.handler = handler
 
     def get_url_rules(self):
@@ -154,7 +287,7 @@ class Leaf(Tree):
         Returns:
             werkzeug.routiung.Rule: A url Rule for this node
         """
-        return routing.Rule(self.url, endpoint=self.endpoint)
+        return urls.Rule(self.url, endpoint=self.endpoint)
 
     def get_endpoints(self):
         """Returns this node endpoint and the handler.
@@ -0,0 +1,130 @@
+"""
+    taiga.urls
+    ~~~~~~~~~~~~~
+
+    Url rules that compile fast at startup.
+
+    This module implements the ``Rule`` built by ``Leaf``, its url builders
+    are generated on first use instead of when the url map is compiled, and
+    ``add_rules``, which adds rules to a compiled map without compiling it
+    again.
+"""
+import contextlib
+import copy
+import gc
+
+from werkzeug import routing
+from werkzeug.routing.matcher import State
+
+
+class Rule(routing.Rule):
+    """A ``werkzeug.routing.Rule`` with lazily generated url builders.
+
+    Werkzeug generates two url building functions per rule when the rule is
+    bound to a map, which is most of the time spent compiling the map, this
+    rule generates them on its first ``url_for``.
+    """
+
+    def _compile_builder(self, append_unknown=True):
+        if append_unknown:
+            return build_unknown_lazily
+        return build_lazily
+
+
+def build_lazily(self, **values):
+    # pylint: disable=protected-access
+    self._build = routing.Rule._compile_builder(self, False).__get__(self)
+    return self._build(**values)
+
+
+def build_unknown_lazily(self, **values):
+    # pylint: disable=protected-access
+    self._build_unknown = routing.Rule._compile_builder(
+        self, True).__get__(self)
+    return self._build_unknown(**values)
+
+
+def add_rules(url_map, rules):
+    """Add `rules` to a compiled `url_map`, without blocking its readers.
+
+    Matching iterates the matcher states and ``update`` sorts them in
+    place, so the states on the paths of `rules` are copied and the new
+    matcher is swapped in (copy-on-write), the other states are shared.
+    endpoint rule lists are replaced the same way. Requests being matched
+    keep the matcher they started with, and the cost of adding a few rules
+    doesn't depend on the size of the map.
+
+    Arguments:
+        url_map (werkzeug.routing.Map): a compiled map
+        rules (iterable): ``werkzeug.routing.Rule`` not bound to a map
+    """
+    # pylint: disable=protected-access
+    url_map.update()  # the shared states must be sorted already
+    rules_by_endpoint = url_map._rules_by_endpoint
+    matcher = copy.copy(url_map._matcher)
+    matcher._root = copy_state(url_map._matcher._root)
+    copied = {id(matcher._root): matcher._root}
+    endpoint_rules = {}
+    for rule in rules:
+        rule.bind(url_map)
+        if not rule.build_only:
+            add_matcher_rule(matcher._root, rule, copied)
+        if rule.endpoint not in endpoint_rules:
+            endpoint_rules[rule.endpoint] = list(
+                rules_by_endpoint.get(rule.endpoint, ()))
+        endpoint_rules[rule.endpoint].append(rule)
+    for state in copied.values():
+        state.dynamic.sort(key=lambda entry: entry[0].weight)
+    for endpoint_list in endpoint_rules.values():
+        endpoint_list.sort(key=lambda x: x.build_compare_key())
+    rules_by_endpoint.update(endpoint_rules)
+    url_map._matcher = matcher
+
+
+def copy_state(state):
+    return State(list(state.dynamic), list(state.rules), dict(state.static))
+
+
+def add_matcher_rule(state, rule, copied):
+    """Same as ``StateMachineMatcher.add``, copying the shared states.
+
+    Arguments:
+        state (werkzeug.routing.matcher.State): the copied root state
+        rule (werkzeug.routing.Rule): a rule bound to the map
+        copied (dict): id to state, for the states already copied
+    """
+    for part in rule._parts:  # pylint: disable=protected-access
+        if part.static:
+            child = state.static.get(part.content)
+            if child is None or id(child) not in copied:
+                child = State() if child is None else copy_state(child)
+                copied[id(child)] = state.static[part.content] = child
+        else:
+            for index, (test_part, child) in enumerate(state.dynamic):
+                if test_part == part:
+                    if id(child) not in copied:
+                        child = copied[id(child)] = copy_state(child)
+                        state.dynamic[index] = (test_part, child)
+                    break
+            else:
+                child = State()
+                copied[id(child)] = child
+                state.dynamic.append((part, child))
+        state = child
+    state.rules.append(rule)
+
+
+@contextlib.contextmanager
+def paused_gc():
+    """Disable the cyclic garbage collector in a ``with`` block.
+
+    Compiling a url map allocates many objects and no garbage, the
+    collections it triggers would only scan them.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
@@ -1,8 +1,8 @@
 import unittest
 
-from werkzeug import exceptions, wrappers, test as test_utils
+from werkzeug import exceptions, routing, wrappers, test as test_utils
 
-from taiga import Application, Tree, Leaf, EndpointHandler
+from taiga import Application, Tree, Leaf, EndpointHandler, Resource
 
 
 class RootHandler(EndpointHandler):
@@ -44,3 +44,73 @@ class ApplicationTest(unittest.TestCase):
     def test_get_url_for(self):
         url_for = self.app.get_url_for(self.request)
         self.assertEqual(url_for('root'), '/')
+
+    def test_get_url_adapter_once_per_request(self):
+        adapter = self.app.get_url_adapter(self.request)
+        self.assertIs(self.request.url_adapter, adapter)
+        self.assertIs(self.app.get_url_adapter(self.request), adapter)
+
+    def test_get_url_for_cache(self):
+        url_for = self.app.get_url_for(self.request)
+        self.assertEqual(url_for('root', {'page': 2}), '/?page=2')
+        cache, = self.app.url_for_cache.values()
+        self.assertEqual(cache, {('root', (('page', 2),), None, False):
+                                 '/?page=2'})
+        self.assertEqual(url_for('root', {'page': 2}), '/?page=2')
+
+    def test_get_url_for_cache_hosts(self):
+        self.app.url_for_cache_hosts = 2
+        for host in ('a', 'b', 'c'):
+            request = test_utils.EnvironBuilder(
+                headers={'Host': host}).get_request()
+            self.app.get_url_for(request)('root')
+        self.assertEqual([key[0] for key in self.app.url_for_cache], ['c'])
+
+    def test_get_url_for_unhashable_values(self):
+        url_for = self.app.get_url_for(self.request)
+        self.assertEqual(url_for('root', {'page': [2]}), '/?page=2')
+        cache, = self.app.url_for_cache.values()
+        self.assertEqual(cache, {})
+
+
+class StaticRoutesTest(unittest.TestCase):
+    def setUp(self):
+        self.app = Application(Tree(endpoint='', url='/', name='', items=[
+            Resource(None, endpoint='res', url='/res', name='Res'),
+            Leaf(endpoint='dir', url='/dir/', name='', handler=RootHandler),
+        ]))
+
+    def _match(self, path, method='GET'):
+        request = test_utils.EnvironBuilder(
+            path=path, method=method).get_request()
+        return self.app.match_request(request)
+
+    def test_static_routes(self):
+        self.assertEqual(self.app.static_routes[('/res/index', None)],
+                         'res:index')
+        self.assertNotIn(('/res/read/<key>', None), self.app.static_routes)
+
+    def test_match_static(self):
+        self.assertEqual(self._match('/res/index'), ('res:index', {}))
+        self.assertEqual(self._match('/res/create', 'POST'),
+                         ('res:create', {}))
+
+    def test_match_converter(self):
+        self.assertEqual(self._match('/res/read/1'),
+                         ('res:read', {'key': '1'}))
+
+    def test_match_strict_slashes(self):
+        with self.assertRaises(routing.RequestRedirect):
+            self._match('/dir')
+        with self.assertRaises(exceptions.NotFound):
+            self._match('/res/index/')
+
+
+class PackageTest(unittest.TestCase):
+    def test_lazy_exports(self):
+        import taiga
+        from taiga import tree
+        self.assertIn('Application', dir(taiga))
+        self.assertIs(taiga.Tree, tree.Tree)
+        with self.assertRaises(AttributeError):
+            taiga.Missing  # pylint: disable=pointless-statement
@@ -0,0 +1,218 @@
+import asyncio
+import json
+import unittest
+
+from werkzeug import wrappers
+
+from taiga import (
+    ASGIApplication, Tree, Leaf, EndpointHandler, MethodHandler, Index, Read,
+    Export, BulkCreate, BulkDelete, AsyncControllerMixin,
+)
+from taiga.asgi import make_environ
+
+
+class SyncHandler(EndpointHandler):
+    def entrypoint(self):
+        return wrappers.Response('sync')
+
+
+class AsyncHandler(MethodHandler):
+    def get(self):
+        return wrappers.Response('get')
+
+    async def async_get(self):
+        await asyncio.sleep(0)
+        return wrappers.Response('async get')
+
+    async def async_post(self):
+        return wrappers.Response(self.request.get_data())
+
+
+class AsyncController(AsyncControllerMixin):
+    per_page = 2
+
+    def __init__(self):
+        self.items = [{'id': i} for i in range(1, 6)]
+        self.calls = []
+
+    async def fetch_items(self):
+        return self.items
+
+    async def resolve_items(self, items):
+        self.calls.append('resolve')
+        await asyncio.sleep(0)
+        return list(items)
+
+    async def count_items(self, items):
+        self.calls.append('count')
+        await asyncio.sleep(0)
+        return len(items)
+
+    async def get_item(self, pk):
+        for item in self.items:
+            if str(item['id']) == str(pk):
+                return item
+        return None
+
+    async def create_item(self, data):
+        await asyncio.sleep(0)
+        if 'id' not in data:
+            raise ValueError('Missing id.')
+        self.items.append(dict(data))
+        return data
+
+    async def delete_item(self, item):
+        await asyncio.sleep(0)
+        self.items.remove(item)
+
+
+def call(app, method='GET', path='/', body=b'', headers=()):
+    scope = {
+        'type': 'http', 'method': method, 'path': path, 'root_path': '',
+        'query_string': b'', 'headers': list(headers),
+        'server': ('testserver', 80), 'scheme': 'http',
+    }
+    received = [{'type': 'http.request', 'body': body}]
+    sent = []
+
+    async def receive():
+        return received.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    status = sent[0]['status']
+    headers = dict(sent[0]['headers'])
+    body = b''.join(message.get('body', b'') for message in sent[1:])
+    return status, headers, body
+
+
+class ASGIApplicationTest(unittest.TestCase):
+    def setUp(self):
+        self.controller = AsyncController()
+        tree = Tree(endpoint='root', url='', name='', items=[
+            Leaf(endpoint='sync', url='/sync', name='', handler=SyncHandler),
+            Leaf(endpoint='async', url='/async', name='',
+                 handler=AsyncHandler),
+            Leaf(endpoint='index', url='/items', name='',
+                 handler=type('ItemIndex', (Index,), {
+                     'controller': self.controller,
+                     'default_render': 'json'})),
+            Leaf(endpoint='read', url='/items/<key>', name='',
+                 handler=type('ItemRead', (Read,), {
+                     'controller': self.controller,
+                     'default_render': 'json'})),
+            Leaf(endpoint='export', url='/export', name='',
+                 handler=type('ItemExport', (Export,), {
+                     'controller': self.controller})),
+            Leaf(endpoint='bulk-create', url='/bulk-create', name='',
+                 handler=type('ItemBulkCreate', (BulkCreate,), {
+                     'controller': self.controller,
+                     'default_render': 'json'})),
+            Leaf(endpoint='bulk-delete', url='/bulk-delete', name='',
+                 handler=type('ItemBulkDelete', (BulkDelete,), {
+                     'controller': self.controller,
+                     'default_render': 'json'})),
+        ])
+        self.app = ASGIApplication(tree)
+
+    def test_sync_handler(self):
+        status, _, body = call(self.app, path='/sync')
+        self.assertEqual(status, 200)
+        self.assertEqual(body, b'sync')
+
+    def test_async_method(self):
+        status, headers, body = call(self.app, path='/async')
+        self.assertEqual(status, 200)
+        self.assertEqual(body, b'async get')
+        self.assertIn(b'content-type', headers)
+
+    def test_request_body(self):
+        _, _, body = call(self.app, method='POST', path='/async',
+                          body=b'payload')
+        self.assertEqual(body, b'payload')
+
+    def test_not_found(self):
+        status, _, _ = call(self.app, path='/miss')
+        self.assertEqual(status, 404)
+
+    def test_method_not_allowed(self):
+        status, _, _ = call(self.app, method='DELETE', path='/async')
+        self.assertEqual(status, 405)
+
+    def test_async_controller_index(self):
+        status, _, body = call(self.app, path='/items')
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body)['count'], 5)
+        self.assertEqual(sorted(self.controller.calls), ['count', 'resolve'])
+
+    def test_async_controller_read(self):
+        status, _, body = call(self.app, path='/items/2')
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body)['item'], {'id': 2})
+
+    def test_async_controller_export(self):
+        status, _, body = call(self.app, path='/export')
+        self.assertEqual(status, 200)
+        self.assertEqual(body, b'id\r\n1\r\n2\r\n3\r\n4\r\n5\r\n')
+
+    def test_async_controller_bulk(self):
+        headers = [(b'content-type', b'application/json')]
+        status, _, body = call(
+            self.app, method='POST', path='/bulk-create', headers=headers,
+            body=json.dumps([{'id': 6}, {}, {'id': 7}]).encode())
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body), {
+            'count': 2, 'errors': [{'index': 1, 'error': 'Missing id.'}]})
+        self.assertEqual([item['id'] for item in self.controller.items],
+                         [1, 2, 3, 4, 5, 6, 7])
+        _, _, body = call(
+            self.app, method='POST', path='/bulk-delete', headers=headers,
+            body=json.dumps([1, 8]).encode())
+        self.assertEqual(json.loads(body)['errors'], [
+            {'index': 1, 'error': "Item 8 not found."}])
+        self.assertEqual(len(self.controller.items), 6)
+
+    def test_lifespan(self):
+        received = [{'type': 'lifespan.startup'},
+                    {'type': 'lifespan.shutdown'}]
+        sent = []
+
+        async def receive():
+            return received.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        asyncio.run(self.app({'type': 'lifespan'}, receive, send))
+        self.assertEqual([message['type'] for message in sent], [
+            'lifespan.startup.complete', 'lifespan.shutdown.complete'])
+
+
+class AsyncControllerMixinTest(unittest.TestCase):
+    def test_get_items(self):
+        controller = AsyncController()
+        items, count = asyncio.run(controller.get_items(page=2))
+        self.assertEqual(items, [{'id': 3}, {'id': 4}])
+        self.assertEqual(count, 5)
+
+    def test_get_items_cursor(self):
+        controller = AsyncController()
+        controller.cursor_pagination = True
+        controller.pk_field = 'id'
+        items, count = asyncio.run(controller.get_items())
+        self.assertEqual(items, [{'id': 1}, {'id': 2}])
+        self.assertEqual(count, 5)
+
+
+class MakeEnvironTest(unittest.TestCase):
+    def test_repeated_headers(self):
+        environ = make_environ({
+            'method': 'GET', 'path': '/', 'headers': [
+                (b'cookie', b'a=1'), (b'cookie', b'b=2'),
+                (b'accept', b'text/html'), (b'accept', b'*/*'),
+            ],
+        }, b'')
+        self.assertEqual(environ['HTTP_COOKIE'], 'a=1; b=2')
+        self.assertEqual(environ['HTTP_ACCEPT'], 'text/html,*/*')
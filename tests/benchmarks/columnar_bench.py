@@ -0,0 +1,76 @@
+"""Index requests over 1M in-memory rows: ``ControllerMixin`` on a list of
+dicts against ``ColumnarController``.
+
+Reports the load time of the columnar controller and the mean time of
+``get_items`` for an unfiltered page, a presorted order, an indexed
+filter, an order without a presorted permutation (``heapq`` selection),
+and a cursor page.
+
+Run with::
+
+    python -m tests.benchmarks.columnar_bench
+"""
+import time
+
+from taiga import ControllerMixin
+from taiga.ext.memory import ColumnarController
+
+QUERIES = (
+    ('page 100', {'page': 100}),
+    ('order_by=score', {'order_by': 'score', 'page': 3}),
+    ('order_by=score reverse', {'order_by': 'score', 'reverse': True}),
+    ('filter country', {'filters': {'country': 'country-7'}}),
+    ('filter + order_by=score', {
+        'filters': {'country': 'country-7'}, 'order_by': 'score'}),
+    ('order_by=name (heapq)', {'order_by': 'name'}),
+)
+
+
+class ListController(ControllerMixin):
+    def __init__(self, rows):
+        self.rows = rows
+        self.filters = {
+            'country': lambda value, items: [
+                item for item in items if item['country'] == value],
+        }
+
+    def fetch_items(self):
+        return self.rows
+
+
+def create_rows(size):
+    return [
+        {'id': i, 'name': 'name-{:07d}'.format((i * 7919) % size),
+         'country': 'country-{}'.format(i % 50), 'score': (i * 31) % 1000}
+        for i in range(size)
+    ]
+
+
+def timeit(controller, kwargs, number):
+    start = time.perf_counter()
+    for _ in range(number):
+        items, _ = controller.get_items(**kwargs)
+        list(items)
+    return (time.perf_counter() - start) / number
+
+
+def main(size=1000000, number=5):
+    rows = create_rows(size)
+    start = time.perf_counter()
+    columnar = ColumnarController(
+        rows, indexes=['country'], sortable=['score'])
+    print('columnar load: {:.2f} s'.format(time.perf_counter() - start))
+    baseline = ListController(rows)
+    for name, kwargs in QUERIES:
+        print('{:<26} list {:9.2f} ms   columnar {:7.3f} ms'.format(
+            name, timeit(baseline, kwargs, 1) * 1e3,
+            timeit(columnar, kwargs, number) * 1e3))
+    columnar.cursor_pagination = True
+    items, _ = columnar.get_items(order_by='score')
+    cursor = columnar.get_cursor(items[-1], 'score')
+    print('{:<26} columnar {:7.3f} ms'.format('cursor order_by=score', timeit(
+        columnar, {'order_by': 'score', 'cursor': cursor}, number) * 1e3))
+
+
+if __name__ == '__main__':
+    main()
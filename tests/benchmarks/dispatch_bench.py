@@ -0,0 +1,53 @@
+"""Per-request dispatch overhead of ``MethodHandler``.
+
+Compares the reflection over ``HTTP_METHODS`` done on every request with
+the dispatch table compiled once per handler class.
+
+Run with::
+
+    python -m tests.benchmarks.dispatch_bench
+"""
+import timeit
+
+from werkzeug import test as test_utils
+
+from taiga import MethodHandler
+from taiga.response import HTTP_METHODS
+
+
+class Handler(MethodHandler):
+    def get(self):
+        return 'get'
+
+    def post(self):
+        return 'post'
+
+
+class ReflectionHandler(Handler):
+    """The dispatch as it was, building the table on every request."""
+
+    def entrypoint(self, *args, **kwargs):
+        allowed_methods = {
+            key: getattr(self, key.lower())
+            for key in HTTP_METHODS
+            if hasattr(self, key.lower())
+        }
+        return allowed_methods[self.request.method](*args, **kwargs)
+
+
+def bench(handler_class, request, number):
+    def run():
+        handler_class(None, request).entrypoint()
+    return min(timeit.repeat(run, number=number, repeat=5)) / number
+
+
+def main(number=100000):
+    request = test_utils.EnvironBuilder().get_request()
+    for handler_class in (ReflectionHandler, Handler):
+        elapsed = bench(handler_class, request, number)
+        print('{:<20} {:8.3f} us/request'.format(
+            handler_class.__name__, elapsed * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Tail latency of blocking handlers during a spike, with and without load
+shedding.
+
+A spike of concurrent requests hits a handler that blocks for a fixed
+time (like a slow database call). With an unbounded queue every request
+waits for the ones before it, with ``BoundedExecutor`` the excess is
+rejected with a 503 right away and the accepted requests keep their
+latency.
+
+Run with::
+
+    python -m tests.benchmarks.offload_bench
+"""
+import threading
+import time
+
+from werkzeug import exceptions, test as test_utils, wrappers
+
+from taiga import Application, Leaf, MethodHandler
+from taiga.executor import BoundedExecutor
+
+
+class SlowHandler(MethodHandler):
+    delay = 0.01
+
+    def get(self):
+        time.sleep(self.delay)
+        return wrappers.Response('ok')
+
+
+def spike(app, clients):
+    latencies, shed = [], []
+    lock = threading.Lock()
+
+    def client():
+        request = test_utils.EnvironBuilder(path='/').get_request()
+        start = time.perf_counter()
+        response = app.dispatch_request(request)
+        elapsed = time.perf_counter() - start
+        with lock:
+            if isinstance(response, exceptions.ServiceUnavailable):
+                shed.append(elapsed)
+            else:
+                latencies.append(elapsed)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sorted(latencies), shed
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main(clients=200, workers=8):
+    for max_queue in (clients, workers):
+        executor = BoundedExecutor(max_workers=workers, max_queue=max_queue)
+        handler = type('Handler', (SlowHandler,), {'executor': executor})
+        app = Application(Leaf(endpoint='', url='/', name='',
+                               handler=handler))
+        latencies, shed = spike(app, clients)
+        executor.shutdown()
+        print('max_queue={:<4} served={:<4} shed={:<4} '
+              'p50={:7.1f} ms p99={:7.1f} ms'.format(
+                  max_queue, len(latencies), len(shed),
+                  percentile(latencies, 0.5) * 1e3,
+                  percentile(latencies, 0.99) * 1e3))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+"""Cost of registering a ``Resource`` on a running application.
+
+Registers one ``Resource`` (5 rules) at a time on a tree of 10,000 rules,
+incrementally through ``Tree.register_items``, and compares it with
+compiling a new ``Application`` for the same tree.
+
+Run with::
+
+    python -m tests.benchmarks.register_bench
+"""
+import statistics
+import time
+
+from taiga import Application, Resource
+from taiga.router import TrieRouter
+
+from .routing_bench import create_tree
+
+
+def main(resources=2000, number=50):
+    for router in (None, TrieRouter):
+        tree = create_tree(resources)
+        app = Application(tree, router=router)
+        timings = []
+        for i in range(number):
+            item = Resource(None, endpoint='new-{}'.format(i),
+                            url='/new-{}'.format(i), name='')
+            start = time.perf_counter()
+            tree.register_items([item])
+            timings.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        Application(tree, router=router)
+        compiled = time.perf_counter() - start
+        name = 'werkzeug' if router is None else router.__name__
+        print('{:<10} {} rules: register {:8.1f} us (median), '
+              'compile {:8.1f} ms'.format(
+                  name, len(app.get_url_rules()),
+                  statistics.median(timings) * 1e6, compiled * 1e3))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""Serializing 10k rows from ``SQLAlchhemyORMController``.
+
+Compares the stdlib ``json`` backend of ``JSONSerializer`` with ``orjson``
+(when installed), both with the cached model serializer.
+
+Run with::
+
+    python -m tests.benchmarks.serializer_bench
+"""
+import datetime
+import timeit
+
+import sqlalchemy as sa
+from sqlalchemy import orm
+
+from taiga.ext.sqlalchemy import SQLAlchhemyORMController, model_serializer
+from taiga.response import JSONSerializer, iter_json, orjson
+
+Base = orm.declarative_base()
+
+
+class Row(Base):
+    __tablename__ = 'row'
+    id = sa.Column(sa.Integer, primary_key=True)
+    name = sa.Column(sa.String)
+    price = sa.Column(sa.Float)
+    active = sa.Column(sa.Boolean)
+    created = sa.Column(sa.DateTime)
+
+
+def create_controller(rows):
+    engine = sa.create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    db_session = orm.Session(engine)
+    now = datetime.datetime(2020, 1, 1)
+    db_session.add_all(
+        Row(id=i, name='row-{}'.format(i), price=i / 3, active=bool(i % 2),
+            created=now)
+        for i in range(rows)
+    )
+    db_session.commit()
+    return SQLAlchhemyORMController(db_session, Row)
+
+
+def main(rows=10000, number=5):
+    controller = create_controller(rows)
+    items = controller.fetch_items().all()
+    backends = [('stdlib', JSONSerializer(fast=False))]
+    if orjson is not None:
+        backends.append(('orjson', JSONSerializer(fast=True)))
+    for name, serializer in backends:
+        serializer.register(datetime.datetime, datetime.datetime.isoformat)
+        serializer.register_factory(model_serializer)
+
+        def run():
+            return ''.join(iter_json({'items': items}, serializer=serializer))
+        elapsed = min(timeit.repeat(run, number=number, repeat=3)) / number
+        print('{:<8} {:8.2f} ms / {} rows'.format(name, elapsed * 1e3, rows))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Startup time: import, application and first requests.
+
+Each measurement runs in a fresh interpreter, on trees of increasing size
+(5 rules per ``Resource``), with the default ``Application`` and with
+``lazy=True``. The first request is a static route, the second one has a
+converter. ``Index`` builds its pagination links with ``url_for``, so with
+``lazy=True`` the url map is compiled by the first request.
+
+Run with::
+
+    python -m tests.benchmarks.startup_bench
+"""
+import json
+import subprocess
+import sys
+import time
+
+MODES = ('eager', 'lazy')
+
+
+def child(resources, mode):
+    start = time.perf_counter()
+    from werkzeug import test as test_utils
+    from taiga import (
+        Application, Tree, Resource, ControllerMixin, Index, Read,
+    )
+    from taiga.resource import DEFAULT_COMPONENTS
+    imported = time.perf_counter()
+
+    class Controller(ControllerMixin):
+        per_page = 10
+
+        def fetch_items(self):
+            return [{'id': 1}]
+
+        def get_item(self, key):
+            return {'id': key}
+
+    class ItemIndex(Index):
+        controller = Controller()
+        default_render = 'json'
+
+    class ItemRead(Read):
+        controller = ItemIndex.controller
+        default_render = 'json'
+
+    handlers = {'index': ItemIndex, 'read': ItemRead}
+
+    class ItemResource(Resource):  # pylint: disable=abstract-method
+        components = tuple(
+            (endpoint, url, name, show, handlers.get(endpoint, handler))
+            for endpoint, url, name, show, handler in DEFAULT_COMPONENTS
+        )
+
+    tree = Tree(endpoint='', url='/', name='', items=[
+        ItemResource(None, endpoint='res-{}'.format(i),
+                     url='/res-{}'.format(i), name='')
+        for i in range(resources)
+    ])
+    built = time.perf_counter()
+    app = Application(tree, lazy=mode == 'lazy')
+    created = time.perf_counter()
+    timings = [imported - start, built - imported, created - built]
+    for path in ('/res-0/index', '/res-0/read/1'):
+        request = test_utils.EnvironBuilder(path=path).get_request()
+        app.dispatch_request(request).get_data()
+        timings.append(time.perf_counter() - sum(timings) - start)
+    print(json.dumps(timings))
+
+
+def run_child(resources, mode):
+    output = subprocess.check_output([
+        sys.executable, '-m', 'tests.benchmarks.startup_bench', '--child',
+        str(resources), mode,
+    ])
+    return json.loads(output)
+
+
+def main(sizes=(10, 100, 1000, 5000), repeat=3):
+    print('{:>6} {:<6} {:>8} {:>8} {:>8} {:>8} {:>8} {:>8}'.format(
+        'rules', 'mode', 'import', 'tree', 'app', 'static', 'dynamic',
+        'total'))
+    for resources in sizes:
+        for mode in MODES:
+            runs = [run_child(resources, mode) for _ in range(repeat)]
+            timings = min(runs, key=sum)
+            print('{:>6} {:<6} {} {:8.1f}'.format(
+                resources * 5, mode,
+                ' '.join('{:8.1f}'.format(t * 1e3) for t in timings),
+                sum(timings) * 1e3))
+    print('(milliseconds)')
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--child']:
+        child(int(sys.argv[2]), sys.argv[3])
+    else:
+        main()
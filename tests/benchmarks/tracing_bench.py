@@ -0,0 +1,49 @@
+"""Overhead of request tracing.
+
+Dispatches a request to an ``Index`` over an in-memory controller without
+a tracer, and with ``taiga.metrics.Metrics`` recording every stage.
+
+Run with::
+
+    python -m tests.benchmarks.tracing_bench
+"""
+import timeit
+
+from werkzeug import test as test_utils
+
+from taiga import Application, Leaf, ControllerMixin, Index
+from taiga.metrics import Metrics
+
+
+class Controller(ControllerMixin):
+    per_page = 10
+
+    def fetch_items(self):
+        return ITEMS
+
+
+class ItemIndex(Index):
+    controller = Controller()
+    default_render = 'json'
+
+
+ITEMS = [{'id': i, 'name': 'item-{}'.format(i)} for i in range(100)]
+
+
+def bench(app, number):
+    def run():
+        request = test_utils.EnvironBuilder(path='/').get_request()
+        response = app.dispatch_request(request)
+        response.get_data()
+    return min(timeit.repeat(run, number=number, repeat=5)) / number
+
+
+def main(number=2000):
+    leaf = Leaf(endpoint='index', url='/', name='', handler=ItemIndex)
+    for name, tracer in (('no tracer', None), ('metrics', Metrics())):
+        elapsed = bench(Application(leaf, tracer=tracer), number)
+        print('{:<10} {:8.1f} us/request'.format(name, elapsed * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""Match latency of ``TrieRouter`` against the werkzeug map.
+
+Matches the last ``Resource`` read url (``/res-N/read/<key>``), so the
+static-route table is not involved, at 100, 1k and 10k routes.
+
+Run with::
+
+    python -m tests.benchmarks.trie_router_bench
+"""
+import timeit
+
+from werkzeug import routing
+
+from taiga import Tree, Resource
+from taiga.router import TrieRouter
+
+
+def create_tree(resources):
+    return Tree(endpoint='', url='/', name='', items=[
+        Resource(None, endpoint='res-{}'.format(i),
+                 url='/res-{}'.format(i), name='')
+        for i in range(resources)
+    ])
+
+
+def bench(match, number):
+    return min(timeit.repeat(match, number=number, repeat=5)) / number
+
+
+def main(number=2000):
+    for routes in (100, 1000, 10000):
+        resources = routes // 5
+        url_map = routing.Map([create_tree(resources).get_url_rules()])
+        adapter = url_map.bind('localhost')
+        router = TrieRouter(url_map)
+        path = '/res-{}/read/1'.format(resources - 1)
+        assert router.match(path, 'GET') == adapter.match(path, 'GET')
+
+        werkzeug = bench(lambda: adapter.match(path, 'GET'), number)
+        trie = bench(lambda: router.match(path, 'GET'), number)
+        print('{:>6} routes  werkzeug {:8.3f} us  trie {:8.3f} us'.format(
+            routes, werkzeug * 1e6, trie * 1e6))
+
+
+if __name__ == '__main__':
+    main()
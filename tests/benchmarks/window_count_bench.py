@@ -0,0 +1,70 @@
+"""Index page plus total: two queries against one ``count(*) OVER ()``.
+
+Uses a SQLite database with 1M rows in a temporary file, and reports the
+statements sent and the wall time of ``SQLAlchhemyORMController.get_items``
+with and without ``window_count``.
+
+Run with::
+
+    python -m tests.benchmarks.window_count_bench
+"""
+import os
+import tempfile
+import time
+
+import sqlalchemy as sa
+from sqlalchemy import orm
+
+from taiga.ext.sqlalchemy import SQLAlchhemyORMController, SearchFilter
+
+Base = orm.declarative_base()
+
+
+class Row(Base):
+    __tablename__ = 'row'
+    id = sa.Column(sa.Integer, primary_key=True)
+    name = sa.Column(sa.String)
+
+
+def create_engine(path, rows):
+    engine = sa.create_engine('sqlite:///{}'.format(path))
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        batch = 50000
+        for start in range(0, rows, batch):
+            connection.execute(Row.__table__.insert(), [
+                {'id': i, 'name': 'row-{}'.format(i)}
+                for i in range(start, min(start + batch, rows))
+            ])
+    return engine
+
+
+def main(rows=1000000, number=5):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(os.path.join(tmp, 'bench.db'), rows)
+        statements = []
+        sa.event.listen(engine, 'before_cursor_execute',
+                        lambda *args: statements.append(args))
+        db_session = orm.Session(engine)
+        filters = {'name': SearchFilter([Row.name])}
+        for window_count in (False, True):
+            controller = SQLAlchhemyORMController(
+                db_session, Row, filters=filters)
+            controller.window_count = window_count
+            for filters_args in ({}, {'name': 'row-99'}):
+                del statements[:]
+                start = time.perf_counter()
+                for _ in range(number):
+                    items, _ = controller.get_items(
+                        page=10, order_by='id', filters=filters_args)
+                    list(items)
+                elapsed = (time.perf_counter() - start) / number
+                print('window_count={!s:<5} filters={!s:<18} '
+                      '{} statements {:8.2f} ms'.format(
+                          window_count, filters_args,
+                          len(statements) // number, elapsed * 1e3))
+        db_session.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+import unittest
+
+from taiga.cache import LRUCache, MappingCache
+
+
+class LRUCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 0
+        self.cache = LRUCache(maxsize=2, ttl=10, clock=self._clock)
+
+    def _clock(self):
+        return self.now
+
+    def test_get(self):
+        self.cache.set('a', 1)
+        self.assertEqual(self.cache.get('a'), 1)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(self.cache.stats(),
+                         {'hits': 1, 'misses': 1, 'size': 1})
+
+    def test_lru_eviction(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.get('a')
+        self.cache.set('c', 3)
+        self.assertEqual(list(self.cache.entries), ['a', 'c'])
+
+    def test_ttl(self):
+        self.cache.set('a', 1)
+        self.now = 11
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_delete(self):
+        self.cache.set('a', 1)
+        self.cache.delete('a')
+        self.cache.delete('a')
+        self.assertIsNone(self.cache.get('a'))
+
+
+class MappingCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 0
+        self.mapping = {}
+        self.cache = MappingCache(
+            self.mapping, maxsize=2, ttl=10, clock=self._clock)
+
+    def _clock(self):
+        return self.now
+
+    def test_get_copies(self):
+        value = [1]
+        self.cache.set('a', value)
+        value.append(2)
+        self.assertEqual(self.cache.get('a'), [1])
+        self.assertIsInstance(self.mapping['a'], bytes)
+
+    def test_eviction(self):
+        for key in 'abc':
+            self.cache.set(key, key)
+        self.assertEqual(list(self.mapping), ['b', 'c'])
+
+    def test_ttl(self):
+        self.cache.set('a', 1)
+        self.now = 11
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache.stats(),
+                         {'hits': 0, 'misses': 1, 'size': 0})
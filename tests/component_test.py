@@ -0,0 +1,187 @@
+import json
+import unittest
+
+from werkzeug import exceptions, test as test_utils
+
+from taiga import (
+    Application, Leaf, ControllerMixin, BulkCreate, BulkUpdate, BulkDelete,
+    Export, Index, Read,
+)
+
+
+class Controller(ControllerMixin):
+    def __init__(self):
+        self.items = {'1': {'name': 'a'}, '2': {'name': 'b'}}
+
+    def get_item(self, pk):
+        return self.items.get(pk)
+
+    def create_item(self, data):
+        if 'name' not in data:
+            raise ValueError('Missing name.')
+        self.items[str(len(self.items) + 1)] = data
+
+    def update_item(self, item, data):
+        item.update(data)
+
+    def delete_item(self, item):
+        for key, value in list(self.items.items()):
+            if value is item:
+                del self.items[key]
+
+
+class BulkComponentTest(unittest.TestCase):
+    def setUp(self):
+        self.controller = Controller()
+        self.app = Application(Leaf(endpoint='', url='/', name='',
+                                    handler=None))
+
+    def _post(self, handler_class, **kwargs):
+        request = test_utils.EnvironBuilder(
+            method='POST', **kwargs).get_request()
+        handler = handler_class(self.app, request)
+        handler.controller = self.controller
+        response = handler.entrypoint(render='json')
+        return json.loads(response.get_data().decode('utf-8'))
+
+    def test_bulk_create_json(self):
+        body = self._post(BulkCreate, json=[{'name': 'c'}, {}])
+        self.assertEqual(body, {
+            'count': 1, 'errors': [{'index': 1, 'error': 'Missing name.'}],
+        })
+        self.assertEqual(self.controller.items['3'], {'name': 'c'})
+
+    def test_bulk_update_form(self):
+        body = self._post(BulkUpdate, data={
+            '0-key': '1', '0-name': 'x', '1-key': '9', '1-name': 'y',
+        })
+        self.assertEqual(body['count'], 1)
+        self.assertEqual(self.controller.items['1'], {'name': 'x'})
+
+    def test_bulk_delete(self):
+        body = self._post(BulkDelete, json=['2', '9'])
+        self.assertEqual(body['errors'],
+                         [{'index': 1, 'error': "Item '9' not found."}])
+        self.assertEqual(list(self.controller.items), ['1'])
+
+    def test_bulk_not_array(self):
+        request = test_utils.EnvironBuilder(
+            method='POST', json={'name': 'c'}).get_request()
+        handler = BulkCreate(self.app, request)
+        handler.controller = self.controller
+        with self.assertRaises(exceptions.BadRequest):
+            handler.entrypoint()
+
+
+class ExportController(ControllerMixin):
+    filters = {
+        'name': lambda value, items: [
+            item for item in items if item['name'] == value],
+    }
+
+    def fetch_items(self):
+        return [{'id': i, 'name': 'ab'[i % 2]} for i in range(5)]
+
+
+class NameExport(Export):
+    columns = ('name', 'id')
+
+
+class ExportTest(unittest.TestCase):
+    def setUp(self):
+        self.app = Application(Leaf(endpoint='', url='/', name='',
+                                    handler=None))
+
+    def _get(self, handler_class, query_string):
+        request = test_utils.EnvironBuilder(
+            query_string=query_string).get_request()
+        handler = handler_class(self.app, request)
+        handler.controller = ExportController()
+        return handler.entrypoint()
+
+    def test_export_csv(self):
+        response = self._get(Export, 'order_by=id&reverse=1&name=a')
+        self.assertTrue(response.is_streamed)
+        self.assertEqual(response.mimetype, 'text/csv')
+        self.assertEqual(response.get_data().decode('utf-8'),
+                         'id,name\r\n4,a\r\n2,a\r\n0,a\r\n')
+
+    def test_export_ndjson_columns(self):
+        response = self._get(NameExport, 'format=ndjson&name=b')
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        lines = response.get_data().decode('utf-8').splitlines()
+        self.assertEqual([json.loads(line) for line in lines], [
+            {'name': 'b', 'id': 1}, {'name': 'b', 'id': 3},
+        ])
+
+    def test_export_unknown_format(self):
+        with self.assertRaises(exceptions.NotFound):
+            self._get(Export, 'format=xml')
+
+
+class VersionedController(Controller):
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def get_item(self, pk):
+        self.calls.append('get_item')
+        return super().get_item(pk)
+
+    def get_item_version(self, pk):
+        return (pk, 1)
+
+    def get_items(self, **kwargs):
+        self.calls.append('get_items')
+        return list(self.items.values()), len(self.items)
+
+    def get_items_version(self, filters=None):
+        return (sorted(filters.items()), len(self.items))
+
+
+class ConditionalGetTest(unittest.TestCase):
+    def setUp(self):
+        self.controller = VersionedController()
+        self.app = Application(Leaf(endpoint='', url='/', name='',
+                                    handler=None))
+
+    def _get(self, handler_class, etag=None, values=None, **kwargs):
+        headers = {}
+        if etag is not None:
+            headers['If-None-Match'] = '"{}"'.format(etag)
+        request = test_utils.EnvironBuilder(
+            headers=headers, **kwargs).get_request()
+        handler = handler_class(self.app, request)
+        handler.controller = self.controller
+        return handler.entrypoint(render='json', **(values or {}))
+
+    def test_read(self):
+        response = self._get(Read, values={'key': '1'})
+        etag, _ = response.get_etag()
+        response = self._get(Read, etag=etag, values={'key': '1'})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.controller.calls, ['get_item'])
+
+    def test_index(self):
+        etag, _ = self._get(Index, query_string='name=a').get_etag()
+        response = self._get(Index, etag=etag, query_string='name=a')
+        self.assertEqual(response.status_code, 304)
+        self.controller.items['3'] = {'name': 'c'}
+        response = self._get(Index, etag=etag, query_string='name=a')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.controller.calls, ['get_items', 'get_items'])
+
+
+class IndexArgsTest(unittest.TestCase):
+    def setUp(self):
+        self.app = Application(Leaf(endpoint='', url='/', name='',
+                                    handler=None))
+
+    def test_invalid_args(self):
+        for query_string in ('page=x', 'page=0', 'page=-1', 'reverse=x'):
+            request = test_utils.EnvironBuilder(
+                query_string=query_string).get_request()
+            handler = Index(self.app, request)
+            handler.controller = Controller()
+            with self.assertRaises(exceptions.BadRequest):
+                handler.entrypoint(render='json')
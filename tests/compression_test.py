@@ -0,0 +1,118 @@
+import gzip
+import unittest
+import zlib
+
+from werkzeug import test as test_utils, wrappers
+
+from taiga import Application, Leaf, EndpointHandler
+from taiga.compression import Compressor, available_codecs
+
+BODY = b'{"items":[' + b','.join(b'{"a":1}' for _ in range(200)) + b']}'
+
+
+def make_request(encoding='gzip', method='GET', path='/'):
+    return test_utils.EnvironBuilder(
+        path=path, method=method,
+        headers={'Accept-Encoding': encoding}).get_request()
+
+
+def make_response(body=BODY, **kwargs):
+    kwargs.setdefault('mimetype', 'application/json')
+    return wrappers.Response(body, **kwargs)
+
+
+class CompressorTest(unittest.TestCase):
+    def setUp(self):
+        self.compressor = Compressor(min_size=100)
+
+    def test_gzip(self):
+        response = self.compressor(make_request(), make_response())
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response.vary)
+        self.assertEqual(gzip.decompress(response.get_data()), BODY)
+        self.assertEqual(response.content_length, len(response.get_data()))
+
+    def test_deflate(self):
+        response = self.compressor(make_request('deflate'), make_response())
+        self.assertEqual(response.headers['Content-Encoding'], 'deflate')
+        self.assertEqual(zlib.decompress(response.get_data()), BODY)
+
+    def test_quality_values(self):
+        request = make_request('gzip;q=0.5, deflate')
+        response = self.compressor(request, make_response())
+        self.assertEqual(response.headers['Content-Encoding'], 'deflate')
+
+    def test_identity(self):
+        response = self.compressor(make_request('identity'), make_response())
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertIn('Accept-Encoding', response.vary)
+
+    def test_min_size(self):
+        response = self.compressor(make_request(), make_response(b'{}'))
+        self.assertNotIn('Content-Encoding', response.headers)
+
+    def test_not_compressible(self):
+        for response in (make_response(mimetype='image/png'),
+                         make_response(status=304),
+                         make_response(headers={'Content-Encoding': 'br'})):
+            response = self.compressor(make_request(), response)
+            self.assertNotEqual(
+                response.headers.get('Content-Encoding'), 'gzip')
+
+    def test_level(self):
+        fast = Compressor(min_size=0, level=1)
+        response = fast(make_request(), make_response())
+        self.assertEqual(gzip.decompress(response.get_data()), BODY)
+
+    def test_streamed(self):
+        chunks = [BODY[i:i+100] for i in range(0, len(BODY), 100)]
+        compressor = Compressor(flush_size=200)
+        response = compressor(make_request(), make_response(iter(chunks)))
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertNotIn('Content-Length', response.headers)
+        parts = list(response.response)
+        self.assertGreater(len([part for part in parts if part]), 2)
+        self.assertEqual(gzip.decompress(b''.join(parts)), BODY)
+
+    def test_cached_by_etag(self):
+        response = make_response()
+        response.set_etag('abc')
+        self.compressor(make_request(), response)
+        self.assertEqual(response.get_etag(), ('abc', True))
+        self.assertEqual(len(self.compressor.cache), 1)
+        response = make_response(b'ignored' * 100)
+        response.set_etag('abc')
+        response = self.compressor(make_request(), response)
+        self.assertEqual(gzip.decompress(response.get_data()), BODY)
+        self.assertEqual(self.compressor.cache.hits, 1)
+
+    def test_cached_by_url(self):
+        response = make_response()
+        response.set_etag('v1')
+        self.compressor(make_request(path='/a'), response)
+        body = b'{"b":2}' * 100
+        response = make_response(body)
+        response.set_etag('v1')
+        response = self.compressor(make_request(path='/b'), response)
+        self.assertEqual(gzip.decompress(response.get_data()), body)
+        self.assertEqual(self.compressor.cache.hits, 0)
+
+    def test_available_codecs(self):
+        codecs = available_codecs()
+        self.assertIn('gzip', codecs)
+        self.assertIn('deflate', codecs)
+
+
+class Handler(EndpointHandler):
+    def entrypoint(self):
+        return make_response()
+
+
+class ApplicationCompressionTest(unittest.TestCase):
+    def test_process_response(self):
+        app = Application(Leaf(endpoint='', url='/', name='',
+                               handler=Handler), compressor=Compressor())
+        client = test_utils.Client(app)
+        response = client.get('/', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.get_data()), BODY)
@@ -0,0 +1,162 @@
+import asyncio
+import threading
+import unittest
+
+from werkzeug import exceptions, test as test_utils, wrappers
+
+from taiga import (
+    Application, Leaf, MethodHandler, RenderHandler, ControllerMixin,
+)
+from taiga.executor import BoundedExecutor, ExecutorSaturated
+
+
+class BoundedExecutorTest(unittest.TestCase):
+    def setUp(self):
+        self.executor = BoundedExecutor(max_workers=1, max_queue=1)
+        self.release = threading.Event()
+        self.addCleanup(self.executor.shutdown)
+        self.addCleanup(self.release.set)
+
+    def test_run(self):
+        self.assertEqual(self.executor.run(lambda x: x * 2, 2), 4)
+
+    def test_run_async(self):
+        result = asyncio.run(self.executor.run_async(lambda: 'ok'))
+        self.assertEqual(result, 'ok')
+
+    def test_saturated(self):
+        self.executor.submit(self.release.wait)
+        self.executor.submit(self.release.wait)
+        with self.assertRaises(ExecutorSaturated):
+            self.executor.submit(self.release.wait)
+        self.assertEqual(self.executor.stats()['rejected'], 1)
+
+    def test_slots_released(self):
+        for _ in range(5):
+            self.executor.run(lambda: None)
+
+    def test_cleanup(self):
+        calls = []
+        executor = BoundedExecutor(
+            max_workers=1, cleanup=lambda: calls.append('cleanup'))
+        self.addCleanup(executor.shutdown)
+        executor.run(lambda: executor.run(calls.append, 'nested'))
+        self.assertEqual(calls, ['nested', 'cleanup'])
+
+    def test_submit_or_run_saturated(self):
+        self.executor.submit(self.release.wait)
+        self.executor.submit(self.release.wait)
+        future = self.executor.submit_or_run(threading.get_ident)
+        self.assertEqual(future.result(), threading.get_ident())
+
+    def test_nested_submit_runs_inline(self):
+        def outer():
+            return self.executor.run(threading.get_ident)
+        self.assertNotEqual(self.executor.run(outer), threading.get_ident())
+
+    def test_exception(self):
+        future = self.executor.submit(lambda: 1 / 0)
+        with self.assertRaises(ZeroDivisionError):
+            future.result()
+
+
+class BlockingHandler(MethodHandler):
+    def get(self):
+        return wrappers.Response(threading.current_thread().name)
+
+
+class VersionedHandler(RenderHandler):
+    threads = []
+
+    def get_version(self):
+        self.threads.append(threading.current_thread().name)
+        return 1
+
+    def get(self):
+        return {}
+
+
+async def current_thread_name():
+    return threading.current_thread().name
+
+
+class StepHandler(MethodHandler):
+    def get(self):
+        loop_thread = yield current_thread_name()
+        return loop_thread, threading.current_thread().name
+
+
+class OffloadTest(unittest.TestCase):
+    def setUp(self):
+        self.executor = BoundedExecutor(max_workers=1, max_queue=0,
+                                        retry_after=5)
+        self.addCleanup(self.executor.shutdown)
+        BlockingHandler.executor = self.executor
+        self.addCleanup(setattr, BlockingHandler, 'executor', None)
+        self.app = Application(Leaf(endpoint='', url='/', name='',
+                                    handler=BlockingHandler))
+        self.request = test_utils.EnvironBuilder(path='/').get_request()
+
+    def test_entrypoint(self):
+        response = BlockingHandler(self.app, self.request).entrypoint()
+        self.assertTrue(response.get_data().startswith(b'taiga'))
+
+    def test_async_entrypoint(self):
+        handler = BlockingHandler(self.app, self.request)
+        response = asyncio.run(handler.async_entrypoint())
+        self.assertTrue(response.get_data().startswith(b'taiga'))
+
+    def test_version_offloaded(self):
+        VersionedHandler.executor = self.executor
+        self.addCleanup(setattr, VersionedHandler, 'executor', None)
+        self.addCleanup(VersionedHandler.threads.clear)
+        VersionedHandler(self.app, self.request).entrypoint(render='json')
+        handler = VersionedHandler(self.app, self.request)
+        asyncio.run(handler.async_entrypoint(render='json'))
+        self.assertEqual(len(VersionedHandler.threads), 2)
+        for name in VersionedHandler.threads:
+            self.assertTrue(name.startswith('taiga'))
+
+    def test_step_method_offloaded(self):
+        StepHandler.executor = self.executor
+        self.addCleanup(setattr, StepHandler, 'executor', None)
+        handler = StepHandler(self.app, self.request)
+        loop_thread, thread = asyncio.run(handler.async_entrypoint())
+        self.assertEqual(loop_thread, threading.current_thread().name)
+        self.assertTrue(thread.startswith('taiga'))
+
+    def test_shed_load(self):
+        release = threading.Event()
+        self.executor.submit(release.wait)
+        try:
+            with self.assertRaises(exceptions.ServiceUnavailable) as ctx:
+                BlockingHandler(self.app, self.request).entrypoint()
+        finally:
+            release.set()
+        headers = dict(ctx.exception.get_headers())
+        self.assertEqual(headers['Retry-After'], '5')
+
+
+class Controller(ControllerMixin):
+    per_page = 2
+
+    def __init__(self):
+        self.count_thread = None
+
+    def fetch_items(self):
+        return list(range(5))
+
+    def count_items(self, items):
+        self.count_thread = threading.get_ident()
+        return len(items)
+
+
+class ParallelCountTest(unittest.TestCase):
+    def test_get_items(self):
+        controller = Controller()
+        controller.executor = BoundedExecutor(max_workers=1)
+        self.addCleanup(controller.executor.shutdown)
+        items, count = controller.get_items(page=2)
+        self.assertEqual(list(items), [2, 3])
+        self.assertEqual(count, 5)
+        self.assertNotEqual(controller.count_thread, threading.get_ident())
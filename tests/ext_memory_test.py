@@ -0,0 +1,193 @@
+import json
+import unittest
+
+from werkzeug import test as test_utils
+
+from taiga import Application, Tree, Leaf, Export
+from taiga.ext.memory import ColumnarController, OrderedRows
+from taiga.pagination import InvalidCursor
+
+
+def create_rows(size=20):
+    return [
+        {'id': i, 'name': 'name-{}'.format(i % 3), 'score': (i * 7) % 10,
+         'ratio': i / 2}
+        for i in range(size)
+    ]
+
+
+def reference(rows, order_by, reverse=False, **filters):
+    rows = [
+        row for row in rows
+        if all(row[key] == value for key, value in filters.items())
+    ]
+    key = (lambda row: (row[order_by], row['id']))
+    return sorted(rows, key=key, reverse=reverse)
+
+
+class ColumnarControllerTest(unittest.TestCase):
+    def setUp(self):
+        self.rows = create_rows()
+        self.controller = ColumnarController(
+            self.rows, indexes=['name', 'score'], sortable=['score'],
+            filters={'name': 'name', 'score': 'score', 'ratio': 'ratio'})
+        self.controller.per_page = 4
+
+    def test_columns(self):
+        columns = self.controller.columns
+        self.assertEqual(columns['id'].typecode, 'q')
+        self.assertEqual(columns['ratio'].typecode, 'd')
+        self.assertIsInstance(columns['name'], list)
+
+    def test_get_items(self):
+        items, count = self.controller.get_items(page=2)
+        self.assertEqual(items, self.rows[4:8])
+        self.assertEqual(count, 20)
+
+    def test_presorted(self):
+        for reverse in (False, True):
+            items, _ = self.controller.get_items(
+                page=2, order_by='score', reverse=reverse)
+            expected = reference(self.rows, 'score', reverse)[4:8]
+            self.assertEqual(items, expected)
+
+    def test_presorted_selection(self):
+        for reverse in (False, True):
+            items, count = self.controller.get_items(
+                order_by='score', reverse=reverse,
+                filters={'name': 'name-1'})
+            expected = reference(self.rows, 'score', reverse, name='name-1')
+            self.assertEqual(items, expected[:4])
+            self.assertEqual(count, len(expected))
+
+    def test_partial_selection(self):
+        for reverse in (False, True):
+            items, _ = self.controller.get_items(
+                page=2, order_by='name', reverse=reverse)
+            expected = reference(self.rows, 'name', reverse)[4:8]
+            self.assertEqual(items, expected)
+
+    def test_filters(self):
+        items, count = self.controller.get_items(filters={
+            'name': 'name-1', 'score': '7', 'unknown': 'x'})
+        self.assertEqual(items, reference(
+            self.rows, 'id', name='name-1', score=7))
+        self.assertEqual(count, 1)
+
+    def test_filters_scan(self):
+        items, _ = self.controller.get_items(filters={'ratio': '1.5'})
+        self.assertEqual(items, [self.rows[3]])
+
+    def test_filters_bad_value(self):
+        items, count = self.controller.get_items(filters={'score': 'x'})
+        self.assertEqual((items, count), ([], 0))
+
+    def test_cursor_pagination(self):
+        self.controller.cursor_pagination = True
+        for reverse in (False, True):
+            for filters in ({}, {'name': 'name-2'}):
+                expected = reference(
+                    self.rows, 'score', reverse, **filters)
+                seen, cursor = [], None
+                while True:
+                    items, _ = self.controller.get_items(
+                        order_by='score', reverse=reverse, cursor=cursor,
+                        filters=filters)
+                    seen.extend(items)
+                    if len(items) < self.controller.per_page:
+                        break
+                    cursor = self.controller.get_cursor(items[-1], 'score')
+                self.assertEqual(seen, expected)
+
+    def test_cursor_unknown_field(self):
+        self.controller.cursor_pagination = True
+        with self.assertRaises(InvalidCursor):
+            self.controller.get_items(order_by='missing')
+
+    def test_ordered_rows_index(self):
+        rows = OrderedRows(self.controller, range(20), 'score')
+        self.assertEqual(len(rows), 20)
+        self.assertEqual(rows[0], self.controller.orders['score'][0])
+
+    def test_export_items(self):
+        items = self.controller.export_items(
+            order_by='score', filters={'name': 'name-1'})
+        self.assertEqual(list(items),
+                         reference(self.rows, 'score', name='name-1'))
+
+    def test_export(self):
+        export = type('RowExport', (Export,), {
+            'controller': self.controller, 'columns': ('id', 'score')})
+        app = Application(Tree(endpoint='', url='/', name='', items=[
+            Leaf(endpoint='export', url='/export', name='', handler=export),
+        ]))
+        request = test_utils.EnvironBuilder(
+            path='/export', query_string={'format': 'ndjson'}).get_request()
+        response = app.dispatch_request(request)
+        lines = response.get_data(as_text=True).splitlines()
+        self.assertEqual([json.loads(line) for line in lines], [
+            {'id': row['id'], 'score': row['score']} for row in self.rows])
+
+    def test_get_item(self):
+        self.assertEqual(self.controller.get_item('3'), self.rows[3])
+        self.assertIsNone(self.controller.get_item('99'))
+        self.assertIsNone(self.controller.get_item('x'))
+
+    def test_writes(self):
+        item = self.controller.create_item(
+            {'id': 20, 'name': 'name-1', 'score': 1})
+        self.assertIsNone(item['ratio'])
+        self.assertEqual(len(self.controller.indexes['name']['name-1']), 8)
+        item = self.controller.get_item(5)
+        self.controller.update_item(item, {'name': 'other'})
+        self.assertEqual(self.controller.get_item(5)['name'], 'other')
+        self.controller.delete_item(item)
+        self.assertIsNone(self.controller.get_item(5))
+        self.assertEqual(self.controller.size, 20)
+
+    def test_writes_coerced(self):
+        item = self.controller.get_item(5)
+        self.controller.update_item(item, {'score': '7', 'ratio': '1'})
+        self.assertEqual(self.controller.get_item(5)['score'], 7)
+        self.assertEqual(self.controller.columns['score'].typecode, 'q')
+        self.assertEqual(self.controller.columns['ratio'].typecode, 'd')
+        with self.assertRaises(ValueError):
+            self.controller.create_item({'id': 'x'})
+
+    def test_failed_write_keeps_rows(self):
+        table = self.controller.table
+        item = self.controller.get_item(5)
+        with self.assertRaises(TypeError):
+            self.controller.update_item(item, {'score': None})
+        with self.assertRaises(ValueError):
+            self.controller.create_item({'id': 1})
+        self.assertIs(self.controller.table, table)
+        self.assertEqual(self.controller.get_item(5), self.rows[5])
+
+    def test_bulk_writes(self):
+        generation = self.controller.generation
+        errors = self.controller.create_items([
+            {'id': 20, 'score': '1'}, {'id': 3}, {'id': 'x'},
+            {'id': 21, 'score': 2}])
+        self.assertEqual([error['index'] for error in errors], [1, 2])
+        self.assertEqual(self.controller.size, 22)
+        self.assertEqual(self.controller.generation, generation + 1)
+        errors = self.controller.update_items([
+            ('20', {'score': '9'}), ('99', {}), ('21', {'id': 1})])
+        self.assertEqual([error['index'] for error in errors], [1, 2])
+        self.assertEqual(self.controller.get_item(20)['score'], 9)
+        self.assertEqual(self.controller.generation, generation + 2)
+        errors = self.controller.delete_items(['20', '21', '99'])
+        self.assertEqual([error['index'] for error in errors], [2])
+        self.assertEqual(self.controller.size, 20)
+        self.assertEqual(self.controller.generation, generation + 3)
+
+    def test_version(self):
+        version = self.controller.get_items_version()
+        self.assertEqual(self.controller.get_item_version(1), version)
+        self.controller.create_item({'id': 20, 'name': 'x', 'score': 1})
+        self.assertNotEqual(self.controller.get_items_version(), version)
+
+    def test_duplicated_pk(self):
+        with self.assertRaises(ValueError):
+            ColumnarController([{'id': 1}, {'id': 1}])
@@ -0,0 +1,489 @@
+import asyncio
+import datetime
+import json
+import tempfile
+import unittest
+
+import sqlalchemy as sa
+from sqlalchemy import orm
+
+from taiga.ext.sqlalchemy import (
+    SQLAlchhemyORMController, AsyncSQLAlchemyORMController, FieldFilter,
+    SearchFilter, model_serializer,
+)
+from taiga.cache import LRUCache
+from taiga.executor import BoundedExecutor
+from taiga.pagination import InvalidCursor, encode_cursor
+from taiga.resource import CountCache
+from taiga.response import serializer
+
+Base = orm.declarative_base()
+
+
+class Model(Base):
+    __tablename__ = 'model'
+    id = sa.Column(sa.Integer, primary_key=True)
+    name = sa.Column(sa.String)
+
+
+class Child(Base):
+    __tablename__ = 'child'
+    id = sa.Column(sa.Integer, primary_key=True)
+    model_id = sa.Column(sa.Integer, sa.ForeignKey('model.id'))
+    model = orm.relationship(Model, backref='children')
+
+
+def create_session(rows=0):
+    engine = sa.create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    db_session = orm.Session(engine)
+    db_session.add_all(
+        Model(id=i, name='name-{}'.format(i)) for i in range(1, rows+1))
+    db_session.add_all(
+        Child(model_id=i % rows + 1) for i in range(rows * 2))
+    db_session.commit()
+    return db_session
+
+
+class ModelSerializerTest(unittest.TestCase):
+    def test_model_serializer(self):
+        func = model_serializer(Model)
+        self.assertEqual(func(Model(id=1, name='a')), {'id': 1, 'name': 'a'})
+
+    def test_model_serializer_not_mapped(self):
+        self.assertIsNone(model_serializer(object))
+
+    def test_serializer_dumps_model(self):
+        self.assertEqual(serializer.dumps([Model(id=1, name='a')]),
+                         '[{"id":1,"name":"a"}]')
+
+
+class CursorPaginationTest(unittest.TestCase):
+    def setUp(self):
+        self.controller = SQLAlchhemyORMController(create_session(10), Model)
+        self.controller.cursor_pagination = True
+        self.controller.per_page = 4
+
+    def _ids(self, cursor=None, **kwargs):
+        items = self.controller.seek_items(
+            self.controller.fetch_items(), cursor=cursor, **kwargs)
+        return [item.id for item in items], items
+
+    def test_seek_items(self):
+        ids, items = self._ids()
+        self.assertEqual(ids, [1, 2, 3, 4])
+        cursor = self.controller.get_cursor(items[-1])
+        self.assertEqual(self._ids(cursor)[0], [5, 6, 7, 8])
+
+    def test_seek_items_order_by_reverse(self):
+        ids, items = self._ids(order_by='name', reverse=True)
+        self.assertEqual(ids, [9, 8, 7, 6])
+        cursor = self.controller.get_cursor(items[-1], 'name')
+        ids, _ = self._ids(cursor, order_by='name', reverse=True)
+        self.assertEqual(ids, [5, 4, 3, 2])
+
+
+class CountTest(unittest.TestCase):
+    def setUp(self):
+        filters = {'name': FieldFilter(Model.name)}
+        self.controller = SQLAlchhemyORMController(
+            create_session(10), Model, filters=filters)
+        self.controller.count_cache = CountCache()
+
+    def test_get_items_count_filtered(self):
+        items, count = self.controller.get_items(filters={'name': 'name-2'})
+        self.assertEqual(count, 1)
+        self.assertEqual([item.id for item in items], [2])
+
+    def test_count_limit(self):
+        self.controller.count_limit = 4
+        _, count = self.controller.get_items(filters={})
+        self.assertEqual(count, 5)
+
+    def test_count_cache_invalidation(self):
+        self.assertEqual(self.controller.get_items()[1], 10)
+        self.assertEqual(list(self.controller.count_cache.entries),
+                         [(Model, ())])
+        self.controller.delete_item(self.controller.get_item(1))
+        self.assertEqual(self.controller.get_items()[1], 9)
+
+
+class ExecutorCountTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.engine = sa.create_engine(
+            'sqlite:///{}/db.sqlite'.format(directory.name),
+            poolclass=sa.pool.QueuePool, pool_size=2, max_overflow=0,
+            pool_timeout=1)
+        self.addCleanup(self.engine.dispose)
+        Base.metadata.create_all(self.engine)
+        with orm.Session(self.engine) as session:
+            session.add_all(Model(id=i) for i in range(1, 11))
+            session.commit()
+        self.db_session = orm.scoped_session(orm.sessionmaker(self.engine))
+        self.controller = SQLAlchhemyORMController(self.db_session, Model)
+        self.controller.executor = BoundedExecutor(max_workers=4)
+        self.addCleanup(self.controller.executor.shutdown)
+
+    def test_worker_sessions_removed(self):
+        for _ in range(3):
+            try:
+                self.assertEqual(self.controller.get_items()[1], 10)
+            finally:
+                self.db_session.remove()
+        self.assertEqual(self.engine.pool.checkedout(), 0)
+
+
+class WindowCountTest(unittest.TestCase):
+    def setUp(self):
+        filters = {'name': SearchFilter([Model.name])}
+        self.db_session = create_session(10)
+        self.controller = SQLAlchhemyORMController(
+            self.db_session, Model, filters=filters)
+        self.controller.window_count = True
+        self.controller.per_page = 3
+        self.statements = []
+        sa.event.listen(self.db_session.get_bind(), 'before_cursor_execute',
+                        self._count_statement)
+
+    def _count_statement(self, *args):
+        self.statements.append(args)
+
+    def test_get_items(self):
+        items, count = self.controller.get_items(
+            page=2, order_by='id', reverse=True, filters={'name': 'name-'})
+        self.assertEqual([item.id for item in items], [7, 6, 5])
+        self.assertEqual(count, 10)
+        self.assertEqual(len(self.statements), 1)
+
+    def test_get_items_filtered(self):
+        items, count = self.controller.get_items(filters={'name': 'name-1'})
+        self.assertEqual(sorted(item.id for item in items), [1, 10])
+        self.assertEqual(count, 2)
+
+    def test_get_items_past_last_page(self):
+        items, count = self.controller.get_items(page=5)
+        self.assertEqual((items, count), ([], 10))
+
+
+class ResultCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.db_session = create_session(10)
+        self.controller = SQLAlchhemyORMController(self.db_session, Model)
+        self.controller.result_cache = LRUCache()
+        self.statements = []
+        sa.event.listen(self.db_session.get_bind(), 'before_cursor_execute',
+                        self._count_statement)
+
+    def _count_statement(self, *args):
+        self.statements.append(args)
+
+    def test_get_item(self):
+        self.assertEqual(self.controller.get_item(2).name, 'name-2')
+        self.db_session.expunge_all()
+        del self.statements[:]
+        self.assertEqual(self.controller.get_item(2).name, 'name-2')
+        self.assertEqual(self.statements, [])
+        self.assertEqual(self.controller.result_cache.hits, 1)
+
+    def test_get_items(self):
+        items, count = self.controller.get_items(page=1, order_by='id')
+        self.db_session.expunge_all()
+        del self.statements[:]
+        cached_items, cached_count = self.controller.get_items(
+            page=1, order_by='id')
+        self.assertEqual([item.name for item in cached_items],
+                         [item.name for item in items])
+        self.assertEqual(cached_count, count)
+        self.assertEqual(self.statements, [])
+
+    def test_write_invalidates(self):
+        item = self.controller.get_item(2)
+        _, count = self.controller.get_items()
+        self.controller.delete_item(item)
+        self.assertIsNone(self.controller.get_item(2))
+        self.assertEqual(self.controller.get_items()[1], count - 1)
+
+    def test_write_invalidates_url_key(self):
+        item = self.controller.get_item('02')
+        item.name = 'changed'
+        self.controller.update_item(item, {})
+        self.db_session.expunge_all()
+        self.assertEqual(self.controller.get_item('02').name, 'changed')
+
+    def test_generation_expires(self):
+        now = [0]
+        self.controller.result_cache = LRUCache(ttl=10, clock=lambda: now[0])
+        item = self.controller.get_item(1)
+        item.name = 'w1'
+        self.controller.update_item(item, {})
+        now[0] = 5
+        self.assertEqual(self.controller.get_items()[0][0].name, 'w1')
+        now[0] = 13  # the generation expired, the listing did not
+        item.name = 'w2'
+        self.controller.update_item(item, {})
+        self.db_session.expunge_all()
+        self.assertEqual(self.controller.get_items()[0][0].name, 'w2')
+
+
+class LoadItemsTest(unittest.TestCase):
+    def setUp(self):
+        self.db_session = create_session(10)
+        self.controller = SQLAlchhemyORMController(self.db_session, Model)
+        self.controller.per_page = 5
+        self.statements = []
+        sa.event.listen(self.db_session.get_bind(), 'before_cursor_execute',
+                        self._count_statement)
+
+    def _count_statement(self, conn, cursor, statement, *args):
+        self.statements.append(statement)
+
+    def _children(self, **kwargs):
+        del self.statements[:]
+        items, _ = self.controller.get_items(**kwargs)
+        return [len(item.children) for item in items]
+
+    def test_lazy_load(self):
+        self.assertEqual(self._children(), [2] * 5)
+        # count, page, one per item
+        self.assertEqual(len(self.statements), 7)
+
+    def test_selectinload(self):
+        children = self._children(relationships=['children'])
+        self.assertEqual(children, [2] * 5)
+        # count, page, children
+        self.assertEqual(len(self.statements), 3)
+
+    def test_joinedload(self):
+        self.controller.window_count = True
+        items, count = self.controller.get_items(
+            relationships={'children': 'joined'})
+        self.assertEqual(count, 10)
+        self.assertEqual(len(items), 5)
+
+    def test_load_only(self):
+        query = self.controller.load_items(
+            self.controller.fetch_items(), columns=['id'])
+        self.assertNotIn('model.name', str(query))
+
+    def test_load_only_serialized(self):
+        self.controller.per_page = 20
+        del self.statements[:]
+        items, _ = self.controller.get_items(columns=['id'])
+        self.assertEqual(json.loads(serializer.dumps(items)),
+                         [{'id': i} for i in range(1, 11)])
+        # count, page
+        self.assertEqual(len(self.statements), 2)
+
+    def test_expired_serialized(self):
+        items, _ = self.controller.get_items()
+        self.db_session.commit()
+        self.assertEqual(json.loads(serializer.dumps(items[0])),
+                         {'id': 1, 'name': 'name-1'})
+
+
+class BulkTest(unittest.TestCase):
+    def setUp(self):
+        self.db_session = create_session(5)
+        self.controller = SQLAlchhemyORMController(self.db_session, Model)
+        self.controller.batch_size = 2
+
+    def _names(self):
+        query = self.db_session.query(Model).order_by(Model.id)
+        return [(item.id, item.name) for item in query]
+
+    def test_create_items(self):
+        errors = self.controller.create_items([
+            {'id': 6, 'name': 'new-6'},
+            {'id': 1, 'name': 'duplicated'},
+            {'id': 7, 'other': 'x'},
+            {'id': 8, 'name': 'new-8'},
+        ])
+        self.assertEqual([error['index'] for error in errors], [1, 2])
+        self.assertEqual(errors[1]['error'], 'Unknown fields: other.')
+        self.assertEqual(self._names()[5:], [(6, 'new-6'), (8, 'new-8')])
+
+    def test_update_items(self):
+        errors = self.controller.update_items([
+            ('1', {'name': 'updated-1'}),
+            ('99', {'name': 'missing'}),
+            ('x', {'name': 'bad key'}),
+            (3, {'name': 'updated-3'}),
+        ])
+        self.assertEqual([error['index'] for error in errors], [1, 2])
+        self.assertEqual(self._names()[:3], [
+            (1, 'updated-1'), (2, 'name-2'), (3, 'updated-3')])
+
+    def test_delete_items(self):
+        errors = self.controller.delete_items(['1', '2', '99', 4, None])
+        self.assertEqual([error['index'] for error in errors], [2, 4])
+        self.assertEqual([pk for pk, _ in self._names()], [3, 5])
+
+
+class ExportItemsTest(unittest.TestCase):
+    def test_export_items(self):
+        controller = SQLAlchhemyORMController(create_session(10), Model)
+        controller.export_batch_size = 3
+        items = controller.export_items(order_by='id', reverse=True)
+        self.assertEqual([item.id for item in items], list(range(10, 0, -1)))
+
+
+class Document(Base):
+    __tablename__ = 'document'
+    id = sa.Column(sa.Integer, primary_key=True)
+    name = sa.Column(sa.String)
+    updated = sa.Column('updated_at', sa.DateTime)
+
+
+class VersionTest(unittest.TestCase):
+    def setUp(self):
+        self.db_session = create_session()
+        self.db_session.add_all(
+            Document(id=i, name='doc-{}'.format(i % 2),
+                     updated=datetime.datetime(2020, 1, i))
+            for i in range(1, 5))
+        self.db_session.commit()
+        self.controller = SQLAlchhemyORMController(
+            self.db_session, Document,
+            filters={'name': FieldFilter(Document.name)})
+        self.controller.version_field = 'updated'
+
+    def test_get_item_version(self):
+        self.assertEqual(self.controller.get_item_version('2'),
+                         datetime.datetime(2020, 1, 2))
+        self.assertIsNone(self.controller.get_item_version('99'))
+        self.assertIsNone(self.controller.get_item_version('x'))
+
+    def test_get_items_version(self):
+        self.assertEqual(
+            self.controller.get_items_version({'name': 'doc-1'}),
+            (datetime.datetime(2020, 1, 3), 2))
+        self.controller.delete_item(self.controller.get_item(1))
+        self.assertEqual(
+            self.controller.get_items_version({'name': 'doc-1'}),
+            (datetime.datetime(2020, 1, 3), 1))
+
+    def test_cursor_datetime(self):
+        self.controller.cursor_pagination = True
+        self.controller.per_page = 3
+        items, _ = self.controller.get_items(order_by='updated')
+        cursor = self.controller.get_cursor(items[-1], 'updated')
+        items, _ = self.controller.get_items(
+            order_by='updated', cursor=cursor)
+        self.assertEqual([item.id for item in items], [4])
+        with self.assertRaises(InvalidCursor):
+            self.controller.get_items(
+                order_by='updated', cursor=encode_cursor(('x', 1)))
+
+    def test_no_version_field(self):
+        self.controller.version_field = None
+        self.assertIsNone(self.controller.get_item_version('2'))
+        self.assertIsNone(self.controller.get_items_version())
+
+
+def create_async_sessionmaker(rows=0):
+    from sqlalchemy.ext import asyncio as sa_asyncio
+
+    engine = sa_asyncio.create_async_engine('sqlite+aiosqlite://')
+    session_factory = sa_asyncio.async_sessionmaker(
+        engine, expire_on_commit=False)
+
+    async def setup():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with session_factory() as session:
+            session.add_all(
+                Model(id=i, name='name-{}'.format(i))
+                for i in range(1, rows+1))
+            await session.commit()
+    return session_factory, setup
+
+
+class AsyncControllerTest(unittest.TestCase):
+    def setUp(self):
+        try:
+            import aiosqlite  # noqa: F401
+            import greenlet  # noqa: F401
+        except ImportError:
+            self.skipTest('aiosqlite and greenlet are needed')
+        self.session_factory, self.setup = create_async_sessionmaker(10)
+        self.controller = AsyncSQLAlchemyORMController(
+            self.session_factory, Model,
+            filters={'name': SearchFilter([Model.name])})
+        self.controller.per_page = 4
+
+    def run_async(self, func):
+        async def main():
+            await self.setup()
+            return await func()
+        return asyncio.run(main())
+
+    def test_get_items(self):
+        items, count = self.run_async(
+            lambda: self.controller.get_items(page=2, order_by='id'))
+        self.assertEqual([item.id for item in items], [5, 6, 7, 8])
+        self.assertEqual(count, 10)
+
+    def test_get_items_filtered(self):
+        items, count = self.run_async(
+            lambda: self.controller.get_items(filters={'name': '-1'}))
+        self.assertEqual(sorted(item.id for item in items), [1, 10])
+        self.assertEqual(count, 2)
+
+    def test_get_items_cursor(self):
+        self.controller.cursor_pagination = True
+        items, _ = self.run_async(self.controller.get_items)
+        self.assertEqual([item.id for item in items], [1, 2, 3, 4])
+
+    def test_get_item(self):
+        item = self.run_async(lambda: self.controller.get_item(3))
+        self.assertEqual(item.name, 'name-3')
+
+    def test_create_and_delete_item(self):
+        async def main():
+            item = await self.controller.create_item({})
+            item = await self.controller.get_item(item.id)
+            await self.controller.delete_item(item)
+            return await self.controller.get_item(item.id)
+        self.assertIsNone(self.run_async(main))
+
+    def _write(self, write):
+        async def main():
+            errors = await write()
+            items = await self.controller.export_items(order_by='id')
+            return errors, [(item.id, item.name) for item in items]
+        return self.run_async(main)
+
+    def test_create_items(self):
+        errors, rows = self._write(lambda: self.controller.create_items([
+            {'id': '50', 'name': 'new'}, {'id': 51, 'other': 'x'},
+        ]))
+        self.assertEqual(errors, [
+            {'index': 1, 'error': 'Unknown fields: other.'}])
+        self.assertEqual(len(rows), 11)
+        self.assertEqual(rows[-1], (50, 'new'))
+
+    def test_update_items(self):
+        errors, rows = self._write(lambda: self.controller.update_items([
+            ('1', {'name': 'changed'}), ('99', {'name': 'missing'}),
+        ]))
+        self.assertEqual(errors, [
+            {'index': 1, 'error': "Item '99' not found."}])
+        self.assertEqual(rows[:2], [(1, 'changed'), (2, 'name-2')])
+
+    def test_update_item_invalid_value(self):
+        async def main():
+            item = await self.controller.get_item(2)
+            await self.controller.update_item(item, {'id': 'x'})
+        with self.assertRaises(ValueError):
+            self.run_async(main)
+
+    def test_versions(self):
+        async def main():
+            return (
+                await self.controller.get_items_version({'name': '-1'}),
+                await self.controller.get_item_version(3),
+            )
+        self.controller.version_field = 'name'
+        self.assertEqual(self.run_async(main), (('name-10', 2), 'name-3'))
@@ -0,0 +1,116 @@
+import asyncio
+import unittest
+
+from werkzeug import test as test_utils, wrappers
+
+from taiga import (
+    Application, ASGIApplication, Tree, Leaf, ControllerMixin,
+    EndpointHandler, Index, MetricsHandler,
+)
+from taiga.metrics import NULL_SPAN, Histogram, Metrics, span
+
+
+class Controller(ControllerMixin):
+    per_page = 2
+
+    def fetch_items(self):
+        return [{'id': i} for i in range(5)]
+
+
+class ItemIndex(Index):
+    controller = Controller()
+    default_render = 'json'
+
+
+class Hello(EndpointHandler):
+    def entrypoint(self):
+        return wrappers.Response('hello')
+
+
+def create_tree():
+    return Tree(endpoint='root', url='', name='', items=[
+        Leaf(endpoint='items', url='/items', name='', handler=ItemIndex),
+        Leaf(endpoint='hello', url='/hello', name='', handler=Hello),
+        Leaf(endpoint='metrics', url='/metrics', name='',
+             handler=MetricsHandler, show_in_menu=False),
+    ])
+
+
+class HistogramTest(unittest.TestCase):
+    def test_cumulative(self):
+        histogram = Histogram((0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe(value)
+        self.assertEqual(histogram.cumulative(), [
+            (0.1, 2), (1.0, 3), (float('inf'), 4)])
+        self.assertEqual(histogram.count, 4)
+        self.assertAlmostEqual(histogram.sum, 2.65)
+
+
+class MetricsTest(unittest.TestCase):
+    def setUp(self):
+        self.metrics = Metrics()
+        self.app = Application(create_tree(), tracer=self.metrics)
+        self.client = test_utils.Client(self.app)
+
+    def _stages(self, endpoint):
+        return {
+            stage for key_endpoint, stage in self.metrics.histograms
+            if key_endpoint == endpoint
+        }
+
+    def test_span_outside_request(self):
+        self.assertIs(span('route'), NULL_SPAN)
+
+    def test_stages(self):
+        self.app.dispatch_request(
+            test_utils.EnvironBuilder(path='/items').get_request())
+        self.assertEqual(self._stages('root:items'), {
+            'request', 'route', 'handler', 'fetch', 'filter', 'count',
+            'slice', 'resolve', 'render',
+        })
+
+    def test_not_found(self):
+        self.app.dispatch_request(
+            test_utils.EnvironBuilder(path='/miss').get_request())
+        self.assertEqual(self._stages(''), {'request', 'route'})
+
+    def test_prometheus(self):
+        self.client.get('/hello')
+        body = self.client.get('/metrics').get_data(as_text=True)
+        self.assertIn('# TYPE taiga_stage_duration_seconds histogram', body)
+        self.assertIn(
+            'taiga_stage_duration_seconds_bucket{endpoint="root:hello",'
+            'stage="handler",le="+Inf"} 1', body)
+        self.assertIn(
+            'taiga_stage_duration_seconds_count{endpoint="root:hello",'
+            'stage="request"} 1', body)
+
+    def test_profile(self):
+        self.assertEqual(
+            self.client.get('/metrics?profile=root:hello').status_code, 404)
+        self.metrics.set_profiling('root:hello', rate=1)
+        self.client.get('/hello')
+        response = self.client.get('/metrics?profile=root:hello')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('function calls', response.get_data(as_text=True))
+        self.metrics.set_profiling('root:hello', rate=0)
+        self.assertEqual(self.metrics.profile_rates, {})
+
+    def test_metrics_disabled(self):
+        client = test_utils.Client(Application(create_tree()))
+        self.assertEqual(client.get('/metrics').status_code, 404)
+
+    def test_asgi(self):
+        app = ASGIApplication(create_tree(), tracer=self.metrics)
+        scope = {'type': 'http', 'method': 'GET', 'path': '/items',
+                 'query_string': b'', 'headers': []}
+
+        async def receive():
+            return {'type': 'http.request', 'body': b''}
+
+        async def send(message):
+            pass
+
+        asyncio.run(app(scope, receive, send))
+        self.assertIn('render', self._stages('root:items'))
@@ -1,7 +1,16 @@
+import base64
+import datetime
+import decimal
+import json
+import sys
+import threading
 import unittest
+import uuid
 
 from taiga import (
     Resource, Index, Create, Read, Update, Delete, ControllerMixin)
+from taiga.resource import CountCache
+from taiga.pagination import InvalidCursor, encode_cursor, decode_cursor
 
 
 def filter_0(value, items):
@@ -37,6 +46,10 @@ class ResourceTest(unittest.TestCase):
         ]
         self.assertEqual(list(resource.get_endpoints()), sample)
 
+    def test_no_instance_dict(self):
+        resource = Resource(None, endpoint='res', url='/', name='Res')
+        self.assertFalse(hasattr(resource, '__dict__'))
+
 
 class ControllerTest(unittest.TestCase):
     def setUp(self):
@@ -90,4 +103,147 @@ class ControllerTest(unittest.TestCase):
             page=2, order_by=1, reverse=True, filters={'0': 'a'}
         )
         self.assertEqual(items, [('a', 1), ('a', 0)])
-        self.assertEqual(count, len(self.items))
+        self.assertEqual(count, 4)
+
+
+class CountCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 0
+        self.controller = Controller()
+        self.controller.count_cache = CountCache(ttl=10, clock=self._clock)
+
+    def _clock(self):
+        return self.now
+
+    def test_get_count_cached(self):
+        self.controller.get_items(filters={'0': 'a', 'other': 1})
+        self.assertEqual(self.controller.count_cache.entries, {
+            (Controller, (('0', 'a'),)): (4, 10),
+        })
+
+    def test_get_count_ttl(self):
+        cache = self.controller.count_cache
+        cache.set((Controller, ()), 3)
+        self.assertEqual(self.controller.get_count([]), 3)
+        self.now = 11
+        self.assertEqual(self.controller.get_count([]), 0)
+
+    def test_invalidate_counts(self):
+        cache = self.controller.count_cache
+        cache.set((Controller, ()), 3)
+        cache.set((ControllerMixin, ()), 3)
+        self.controller.invalidate_counts()
+        self.assertEqual(list(cache.entries), [(ControllerMixin, ())])
+
+    def test_maxsize(self):
+        cache = CountCache(maxsize=2)
+        for i in range(3):
+            cache.set((Controller, i), i)
+        self.assertIsNone(cache.get((Controller, 0)))
+        self.assertEqual(cache.get((Controller, 2)), 2)
+        self.assertEqual(len(cache), 2)
+
+    def test_concurrent_invalidate(self):
+        cache = CountCache()
+        errors = []
+
+        def set_counts():
+            for i in range(5000):
+                cache.set((Controller, i), i)
+
+        def invalidate():
+            try:
+                for _ in range(500):
+                    cache.invalidate(ControllerMixin)
+            except RuntimeError as e:
+                errors.append(e)
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        self.addCleanup(sys.setswitchinterval, interval)
+        threads = [threading.Thread(target=set_counts),
+                   threading.Thread(target=invalidate)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(cache.entries), 5000)
+
+    def test_count_limit(self):
+        self.controller.count_limit = 10
+        _, count = self.controller.get_items()
+        self.assertEqual(count, 11)
+
+
+class CursorController(Controller):
+    cursor_pagination = True
+    pk_field = 0
+    per_page = 3
+
+    def fetch_items(self):
+        return [(chr(ord('a') + i), i % 4) for i in range(10)]
+
+
+class CursorPaginationTest(unittest.TestCase):
+    def setUp(self):
+        self.controller = CursorController()
+
+    def _pages(self, **kwargs):
+        pages, cursor = [], None
+        while True:
+            items, _ = self.controller.get_items(cursor=cursor, **kwargs)
+            if not items:
+                return pages
+            pages.append(items)
+            cursor = self.controller.get_cursor(items[-1], kwargs.get(
+                'order_by'))
+
+    def test_seek_items(self):
+        items = self.controller.fetch_items()
+        pages = self._pages()
+        self.assertEqual([len(page) for page in pages], [3, 3, 3, 1])
+        self.assertEqual(sum(pages, []), items)
+
+    def test_seek_items_order_by(self):
+        items = self.controller.fetch_items()
+        pages = self._pages(order_by=1)
+        self.assertEqual(sum(pages, []),
+                         sorted(items, key=lambda item: (item[1], item[0])))
+
+    def test_seek_items_reverse(self):
+        items = self.controller.fetch_items()
+        pages = self._pages(order_by=1, reverse=True)
+        self.assertEqual(sum(pages, []), sorted(
+            items, key=lambda item: (item[1], item[0]), reverse=True))
+
+    def test_decode_cursor_invalid(self):
+        with self.assertRaises(InvalidCursor):
+            self.controller.get_items(cursor='not a cursor')
+
+    def test_cursor_roundtrip(self):
+        self.assertEqual(decode_cursor(encode_cursor(('a', 1))), ('a', 1))
+
+    def test_cursor_roundtrip_typed(self):
+        key = (
+            datetime.datetime(2020, 1, 2, 3, tzinfo=datetime.timezone.utc),
+            datetime.date(2020, 1, 2), decimal.Decimal('1.50'),
+            uuid.UUID(int=1), None,
+        )
+        self.assertEqual(decode_cursor(encode_cursor(key)), key)
+
+    def test_decode_cursor_invalid_typed(self):
+        for key in ([{'date': 'x'}], [{'bytes': 'x'}], [{'a': 1, 'b': 2}]):
+            cursor = base64.urlsafe_b64encode(json.dumps(key).encode())
+            with self.assertRaises(InvalidCursor):
+                decode_cursor(cursor.decode('ascii'))
+
+    def test_seek_items_datetime(self):
+        items = [(datetime.datetime(2020, 1, i % 4 + 1), i) for i in range(7)]
+        self.controller.fetch_items = lambda: items
+        self.controller.pk_field = 1
+        pages = self._pages(order_by=0)
+        self.assertEqual(sum(pages, []), sorted(items))
+
+    def test_cursor_wrong_type(self):
+        with self.assertRaises(InvalidCursor):
+            self.controller.get_items(cursor=encode_cursor((1,)))
@@ -1,7 +1,18 @@
+import asyncio
+import datetime
+import json
 import unittest
+from types import MappingProxyType
 
 from werkzeug import exceptions, test as test_utils
-from taiga import MethodHandler
+
+from taiga import (
+    Application, Tree, Leaf, MethodHandler, MenuHandler, RenderHandler,
+)
+from taiga.response import (
+    JSONSerializer, async_run_steps, iter_json, maybe_await, orjson,
+    run_steps, serializer,
+)
 
 
 class Handler(MethodHandler):
@@ -35,3 +46,225 @@ class MethodHandlerTest(unittest.TestCase):
         sample = {'GET': self.handler.get, 'POST': self.handler.post}
         allowed_methods = self.handler.get_allowed_methods()
         self.assertEqual(allowed_methods, sample)
+
+    def test_http_methods_compiled_per_class(self):
+        sample = {'GET': Handler.get, 'POST': Handler.post}
+        self.assertEqual(dict(Handler.http_methods), sample)
+        with self.assertRaises(TypeError):
+            Handler.http_methods['PUT'] = Handler.get
+
+
+class MenuHandlerTest(unittest.TestCase):
+    def setUp(self):
+        self.app = Application(Tree(endpoint='', url='/', name='', items=[
+            Leaf(endpoint='menu', url='/menu', name='Menu',
+                 handler=MenuHandler),
+        ]))
+
+    def test_menu(self):
+        request = test_utils.EnvironBuilder(path='/menu').get_request()
+        response = self.app.dispatch_request(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_data(), self.app.tree.as_menu_json()[0])
+
+    def test_menu_not_modified(self):
+        _, etag = self.app.tree.as_menu_json()
+        request = test_utils.EnvironBuilder(
+            path='/menu', headers={'If-None-Match': '"{}"'.format(etag)},
+        ).get_request()
+        response = self.app.dispatch_request(request)
+        self.assertEqual(response.status_code, 304)
+
+
+class JSONHandler(RenderHandler):
+    def get(self):
+        return {'items': (item for item in [{'a': 1}, {'a': 2}]), 'count': 2}
+
+
+class IndentedJSONHandler(JSONHandler):
+    json_indent = 4
+
+
+class RenderJSONTest(unittest.TestCase):
+    def _get(self, handler_class):
+        app = Application(Leaf(endpoint='', url='/', name='', handler=None))
+        request = test_utils.EnvironBuilder().get_request()
+        return handler_class(app, request).entrypoint(render='json')
+
+    def test_render_json(self):
+        response = self._get(JSONHandler)
+        self.assertTrue(response.is_streamed)
+        self.assertEqual(response.mimetype, 'application/json')
+        self.assertEqual(response.get_data(),
+                         b'{"items":[{"a":1},{"a":2}],"count":2}')
+
+    def test_render_json_indent(self):
+        response = self._get(IndentedJSONHandler)
+        body = json.loads(response.get_data().decode('utf-8'))
+        self.assertEqual(body, {'items': [{'a': 1}, {'a': 2}], 'count': 2})
+        self.assertIn(b'\n    "count": 2', response.get_data())
+
+    def test_render_json_empty_items(self):
+        self.assertEqual(''.join(iter_json({'items': []})), '{"items":[]}')
+
+    def test_iter_json_mapping_value(self):
+        body = {'meta': MappingProxyType({'a': 1}), 'items': iter([1])}
+        self.assertEqual(''.join(iter_json(body)),
+                         '{"meta":{"a":1},"items":[1]}')
+
+
+def steps():
+    try:
+        value = yield 1
+    except KeyError:
+        value = 'caught'
+    return [value, (yield 2)]
+
+
+class StepsTest(unittest.TestCase):
+    def test_run_steps(self):
+        self.assertEqual(run_steps(steps()), [1, 2])
+
+    def test_run_steps_resolve(self):
+        def resolve(value):
+            if value == 1:
+                raise KeyError(value)
+            return value * 10
+        self.assertEqual(run_steps(steps(), resolve), ['caught', 20])
+
+    def test_async_run_steps(self):
+        async def fail():
+            raise KeyError
+
+        def awaiting_steps():
+            try:
+                yield fail()
+            except KeyError:
+                pass
+            return (yield maybe_await(3)), (yield 4)
+        self.assertEqual(asyncio.run(async_run_steps(awaiting_steps())),
+                         (3, 4))
+
+
+class VersionedHandler(RenderHandler):
+    version = datetime.datetime(2020, 1, 2, 3, 4, 5)
+    calls = 0
+
+    def get_version(self):
+        return self.version
+
+    def get(self):
+        type(self).calls += 1
+        return {'count': 7}
+
+
+class ConditionalGetTest(unittest.TestCase):
+    def setUp(self):
+        VersionedHandler.calls = 0
+        self.app = Application(Leaf(endpoint='', url='/', name='',
+                                    handler=None))
+
+    def _get(self, handler_class=VersionedHandler, **kwargs):
+        request = test_utils.EnvironBuilder(**kwargs).get_request()
+        return handler_class(self.app, request).entrypoint(render='json')
+
+    def test_validators(self):
+        response = self._get()
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(response.get_etag()[0])
+        self.assertEqual(response.last_modified, VersionedHandler.version
+                         .replace(tzinfo=datetime.timezone.utc))
+
+    def test_tuple_version_etag_only(self):
+        class Handler(VersionedHandler):
+            version = (VersionedHandler.version, 7)
+        response = self._get(Handler)
+        self.assertIsNotNone(response.get_etag()[0])
+        self.assertIsNone(response.last_modified)
+        response = self._get(Handler, headers={
+            'If-Modified-Since': 'Thu, 02 Jan 2020 03:04:05 GMT'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_if_none_match(self):
+        etag, _ = self._get().get_etag()
+        response = self._get(headers={'If-None-Match': '"{}"'.format(etag)})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.get_etag()[0], etag)
+        self.assertEqual(VersionedHandler.calls, 1)
+
+    def test_if_modified_since(self):
+        response = self._get(headers={
+            'If-Modified-Since': 'Thu, 02 Jan 2020 03:04:05 GMT'})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(VersionedHandler.calls, 0)
+
+    def test_etag_per_url(self):
+        etag, _ = self._get().get_etag()
+        response = self._get(
+            query_string={'page': '2'},
+            headers={'If-None-Match': '"{}"'.format(etag)})
+        self.assertEqual(response.status_code, 200)
+
+    def test_no_version(self):
+        response = self._get(JSONHandler)
+        self.assertIsNone(response.get_etag()[0])
+
+    def test_post_skips_version(self):
+        class Handler(VersionedHandler):
+            def post(self):
+                return {}
+        etag, _ = self._get().get_etag()
+        response = self._get(Handler, method='POST', headers={
+            'If-None-Match': '"{}"'.format(etag)})
+        self.assertEqual(response.status_code, 200)
+
+
+class Point:
+    def __init__(self, x, y):
+        self.x, self.y = x, y
+
+
+class Point3D(Point):
+    pass
+
+
+class JSONSerializerTest(unittest.TestCase):
+    def setUp(self):
+        self.serializer = JSONSerializer(fast=False)
+        self.serializer.register(Point, lambda point: [point.x, point.y])
+
+    def test_dumps(self):
+        self.assertEqual(self.serializer.dumps({'a': [1, 2]}),
+                         '{"a":[1,2]}')
+        self.assertEqual(self.serializer.dumps({'a': 1}, indent=2),
+                         '{\n  "a": 1\n}')
+
+    def test_dumps_registered(self):
+        self.assertEqual(self.serializer.dumps(Point3D(1, 2)), '[1,2]')
+
+    def test_dumps_factory(self):
+        self.serializer.register_factory(
+            lambda cls: str if cls is complex else None)
+        self.assertEqual(self.serializer.dumps(1j), '"1j"')
+        self.assertIs(self.serializer.cache[complex], str)
+
+    def test_dumps_unknown(self):
+        with self.assertRaises(TypeError):
+            self.serializer.dumps(object())
+
+    def test_backends_agree(self):
+        if orjson is None:
+            self.skipTest('orjson is not installed')
+        fast = JSONSerializer(fast=True)
+        fast.register(Point, lambda point: [point.x, point.y])
+        for value in ({1: 'a'}, {1.5: 'a', True: 1, None: 2},
+                      [1, 'x', {'n': {2: Point(1, 2)}}]):
+            self.assertEqual(fast.dumps(value), self.serializer.dumps(value))
+
+    def test_default_serializer(self):
+        sample = {'date': datetime.date(2020, 1, 2),
+                  'datetime': datetime.datetime(2020, 1, 2, 3, 4)}
+        self.assertEqual(
+            json.loads(serializer.dumps(sample)),
+            {'date': '2020-01-02', 'datetime': '2020-01-02T03:04:00'},
+        )
@@ -0,0 +1,119 @@
+import unittest
+
+from werkzeug import exceptions, routing, test as test_utils
+
+from taiga import Application, Tree, Leaf, Resource
+from taiga.router import TrieRouter
+
+
+class TrieRouterTest(unittest.TestCase):
+    def setUp(self):
+        self.url_map = routing.Map([
+            routing.Rule('/res/index', endpoint='index'),
+            routing.Rule('/res/read/<key>', endpoint='read'),
+            routing.Rule('/res/read/new', endpoint='new'),
+            routing.Rule('/res/page/<int:page>', endpoint='page'),
+            routing.Rule('/res/page/<name>', endpoint='page_name'),
+            routing.Rule('/res/post', endpoint='post', methods=['POST']),
+            routing.Rule('/res/file/<path:name>', endpoint='file'),
+            routing.Rule('/res/dir/', endpoint='dir'),
+        ])
+        self.router = TrieRouter(self.url_map)
+
+    def test_match_static(self):
+        self.assertEqual(self.router.match('/res/index', 'GET'),
+                         ('index', {}))
+
+    def test_match_wildcard(self):
+        self.assertEqual(self.router.match('/res/read/1', 'GET'),
+                         ('read', {'key': '1'}))
+
+    def test_match_static_over_wildcard(self):
+        self.assertEqual(self.router.match('/res/read/new', 'GET'),
+                         ('new', {}))
+
+    def test_match_typed_wildcard(self):
+        self.assertEqual(self.router.match('/res/page/2', 'GET'),
+                         ('page', {'page': 2}))
+        self.assertEqual(self.router.match('/res/page/last', 'GET'),
+                         ('page_name', {'name': 'last'}))
+
+    def test_match_converter_weight(self):
+        url_map = routing.Map([
+            routing.Rule('/x/<key>', endpoint='str'),
+            routing.Rule('/x/<int:id>', endpoint='int'),
+        ])
+        router = TrieRouter(url_map)
+        adapter = url_map.bind('localhost')
+        for path in ('/x/5', '/x/a'):
+            self.assertEqual(router.match(path, 'GET'), adapter.match(path))
+        self.assertEqual(router.match('/x/5', 'GET'), ('int', {'id': 5}))
+
+    def test_match_converter_arguments(self):
+        url_map = routing.Map([
+            routing.Rule('/a/<int:x>', endpoint='any'),
+            routing.Rule('/a/<int(min=5):x>/b', endpoint='min'),
+        ])
+        router = TrieRouter(url_map)
+        self.assertIsNone(router.match('/a/3/b', 'GET'))
+        self.assertEqual(router.match('/a/7/b', 'GET'), ('min', {'x': 7}))
+        self.assertEqual(router.match('/a/3', 'GET'), ('any', {'x': 3}))
+
+    def test_match_method(self):
+        self.assertEqual(self.router.match('/res/post', 'POST'),
+                         ('post', {}))
+        self.assertIsNone(self.router.match('/res/post', 'GET'))
+
+    def test_match_miss(self):
+        self.assertIsNone(self.router.match('/res/miss', 'GET'))
+        self.assertIsNone(self.router.match('/res/dir', 'GET'))
+        self.assertEqual(self.router.match('/res/dir/', 'GET'),
+                         ('dir', {}))
+
+    def test_fallback_rules(self):
+        self.assertEqual([rule.endpoint for rule in self.router.fallback_rules],
+                         ['file'])
+        self.assertIsNone(self.router.match('/res/file/a/b', 'GET'))
+
+    def test_extend(self):
+        rules = [
+            routing.Rule('/res/read/<key>/edit', endpoint='edit'),
+            routing.Rule('/res/post', endpoint='put', methods=['PUT']),
+            routing.Rule('/other/<path:name>', endpoint='other'),
+        ]
+        url_map = routing.Map(rules)
+        router = self.router.extend(url_map.iter_rules())
+        self.assertEqual(router.match('/res/read/1/edit', 'GET'),
+                         ('edit', {'key': '1'}))
+        self.assertEqual(router.match('/res/post', 'PUT'), ('put', {}))
+        self.assertEqual(router.match('/res/post', 'POST'), ('post', {}))
+        self.assertEqual(router.match('/res/read/1', 'GET'),
+                         ('read', {'key': '1'}))
+        self.assertEqual([rule.endpoint for rule in router.fallback_rules],
+                         ['file', 'other'])
+        self.assertIsNone(self.router.match('/res/read/1/edit', 'GET'))
+        self.assertIsNone(self.router.match('/res/post', 'PUT'))
+        self.assertEqual(len(self.router.fallback_rules), 1)
+
+
+class ApplicationTrieRouterTest(unittest.TestCase):
+    def setUp(self):
+        self.app = Application(Tree(endpoint='', url='/', name='', items=[
+            Resource(None, endpoint='res', url='/res', name='Res'),
+            Leaf(endpoint='dir', url='/dir/', name='', handler=None),
+        ]), router=TrieRouter)
+
+    def _match(self, path, method='GET'):
+        request = test_utils.EnvironBuilder(
+            path=path, method=method).get_request()
+        return self.app.match_request(request)
+
+    def test_match_request(self):
+        self.assertEqual(self._match('/res/read/1'),
+                         ('res:read', {'key': '1'}))
+
+    def test_match_request_fallback(self):
+        with self.assertRaises(routing.RequestRedirect):
+            self._match('/dir')
+        with self.assertRaises(exceptions.NotFound):
+            self._match('/res/read/1/')
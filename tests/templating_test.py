@@ -0,0 +1,63 @@
+import os
+import tempfile
+import unittest
+
+from werkzeug import test as test_utils
+
+from taiga import Application, Leaf, Index
+from taiga.templating import create_environment
+
+
+class CustomIndex(Index):
+    template_name = 'custom.html'
+
+
+class StreamIndex(CustomIndex):
+    stream_html = True
+    stream_chunk_size = 4
+
+
+class TemplatingTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        with open(os.path.join(self.tmp.name, 'custom.html'), 'w') as f:
+            f.write('custom: {{ name }}')
+
+    def test_package_templates(self):
+        env = create_environment(bytecode_cache_dir=self.tmp.name)
+        template = env.get_template('component.html')
+        self.assertEqual(template.render(request='r', url_for='u'),
+                         'request: r\nurl_for: u')
+
+    def test_search_path(self):
+        env = create_environment(search_path=self.tmp.name)
+        self.assertEqual(env.get_template('custom.html').render(name='a'),
+                         'custom: a')
+        self.assertFalse(env.auto_reload)
+
+    def test_application_precompile_templates(self):
+        env = create_environment(search_path=self.tmp.name)
+        app = Application(
+            Leaf(endpoint='index', url='/', name='', handler=CustomIndex),
+            template_env=env,
+        )
+        self.assertEqual(len(env.cache), 1)
+        request = test_utils.EnvironBuilder().get_request()
+        handler = CustomIndex(app, request)
+        self.assertEqual(handler.get_template().render(name='b'), 'custom: b')
+
+    def test_render_html_stream(self):
+        with open(os.path.join(self.tmp.name, 'custom.html'), 'w') as f:
+            f.write('{% for item in items %}{{ item }},{% endfor %}')
+        env = create_environment(search_path=self.tmp.name)
+        app = Application(
+            Leaf(endpoint='index', url='/', name='', handler=StreamIndex),
+            template_env=env,
+        )
+        request = test_utils.EnvironBuilder().get_request()
+        response = StreamIndex(app, request).render_html({'items': range(4)})
+        self.assertTrue(response.is_streamed)
+        self.assertEqual(response.mimetype, 'text/html')
+        self.assertEqual(list(response.iter_encoded()),
+                         [b'0,1,', b'2,3,'])
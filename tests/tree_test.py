@@ -1,3 +1,4 @@
+import json
 import unittest
 
 from taiga import Tree, Leaf
@@ -29,6 +30,44 @@ class TreeTest(unittest.TestCase):
             self.assertIn(item, root.items)
         self.assertEqual(root.items, items)
 
+    def test_register_items_notifies_mounted(self):
+        calls = []
+
+        class Application:
+            def add_items(self, node, items):
+                calls.append((node, items))
+
+        application = Application()
+        child = self._create_node(1)
+        root = self._create_node(items=[child])
+        root.mount(application)
+        items = [self._create_node(2)]
+        child.register_items(items)
+        self.assertEqual(calls, [(child, items)])
+        del application
+        child.register_items([self._create_node(3)])
+        self.assertEqual(len(calls), 1)
+
+    def test_get_items_url_rules(self):
+        child = self._create_node(1)
+        root = self._create_node(items=[child])
+        item = self._create_node(2, items=[self._create_leaf(3)])
+        child.register_items([item])
+        rules = list(child.get_items_url_rules([item]).get_rules(None))
+        self.assertEqual([(rule.endpoint, rule.rule) for rule in rules], [(
+            'level-0:level-1:level-2:level-3',
+            '/level-0/level-1/level-2/level-3',
+        )])
+        rules = list(child.get_items_url_rules([item], root).get_rules(None))
+        self.assertEqual([(rule.endpoint, rule.rule) for rule in rules], [(
+            'level-0:level-1:level-2:level-3',
+            '/level-0/level-1/level-2/level-3',
+        )])
+        rules = list(child.get_items_url_rules([item], child).get_rules(None))
+        self.assertEqual([(rule.endpoint, rule.rule) for rule in rules], [(
+            'level-1:level-2:level-3', '/level-1/level-2/level-3',
+        )])
+
     def test_set_parent(self):
         items = [self._create_node(i) for i in range(2)]
         root = self._create_node()
@@ -94,22 +133,75 @@ class TreeTest(unittest.TestCase):
         self.assertEqual(level1.absolute_url(), '/level-1')
         self.assertEqual(root.absolute_url(), '')
 
+    def test_absolute_url_set_parent_invalidates_subtree(self):
+        level2 = self._create_node(2)
+        level1 = self._create_node(1, items=[level2])
+        self.assertEqual(level2.absolute_url(), '/level-1/level-2')
+        root = self._create_node(items=[level1])
+        self.assertEqual(level2.absolute_url(), '/level-0/level-1/level-2')
+        self.assertEqual(level2.absolute_endpoint(),
+                         'level-0:level-1:level-2')
+
+    def test_invalidate_cache(self):
+        level1 = self._create_node(1)
+        root = self._create_node(items=[level1])
+        self.assertEqual(level1.absolute_endpoint(), 'level-0:level-1')
+        root.endpoint = 'root'
+        root.invalidate_cache()
+        self.assertEqual(level1.absolute_endpoint(), 'root:level-1')
+
     def test_as_menu_tree(self):
         items = [self._create_node(i) for i in range(2)]
         root = self._create_node(items=items)
         sample = {
-            'items': [{
+            'items': tuple({
                 'endpoint': item.absolute_endpoint(),
-                'name': item.name, 'items': [],
-            } for item in items],
+                'name': item.name, 'items': (),
+            } for item in items),
             'endpoint': 'level-0', 'name': 'level-0',
         }
-        self.assertEqual(root.as_menu_tree(), sample)
+        self.assertEqual(dict(root.as_menu_tree()), sample)
 
     def test_as_menu_tree_empty(self):
         root = self._create_node()
-        sample = {'endpoint': 'level-0', 'name': 'level-0', 'items': []}
-        self.assertEqual(root.as_menu_tree(), sample)
+        sample = {'endpoint': 'level-0', 'name': 'level-0', 'items': ()}
+        self.assertEqual(dict(root.as_menu_tree()), sample)
+
+    def test_as_menu_tree_cached(self):
+        items = [self._create_node(i) for i in range(1, 3)]
+        root = self._create_node(items=items)
+        menu_tree = root.as_menu_tree()
+        self.assertIs(root.as_menu_tree(), menu_tree)
+        with self.assertRaises(TypeError):
+            menu_tree['name'] = 'other'
+
+    def test_as_menu_tree_register_items(self):
+        level1 = self._create_node(1)
+        root = self._create_node(items=[level1])
+        level1_menu = level1.as_menu_tree()
+        self.assertEqual(len(root.as_menu_tree()['items']), 1)
+        root.register_items([self._create_node(2)])
+        self.assertEqual(len(root.as_menu_tree()['items']), 2)
+        self.assertIs(root.as_menu_tree()['items'][0], level1_menu)
+
+    def test_as_menu_tree_show_in_menu(self):
+        level2 = self._create_node(2)
+        level1 = self._create_node(1, items=[level2])
+        root = self._create_node(items=[level1])
+        self.assertEqual(len(level1.as_menu_tree()['items']), 1)
+        level2.show_in_menu = False
+        self.assertEqual(root.as_menu_tree()['items'][0]['items'], ())
+
+    def test_as_menu_json(self):
+        root = self._create_node(items=[self._create_node(1)])
+        body, etag = root.as_menu_json()
+        self.assertEqual(json.loads(body.decode('utf-8')), {
+            'endpoint': 'level-0', 'name': 'level-0', 'items': [
+                {'endpoint': 'level-0:level-1', 'name': 'level-1',
+                 'items': []},
+            ],
+        })
+        self.assertIs(root.as_menu_json()[1], etag)
 
 
 class LeafTest(unittest.TestCase):
@@ -0,0 +1,167 @@
+import unittest
+
+from werkzeug import routing, test as test_utils
+from werkzeug.routing.exceptions import NoMatch
+
+from taiga import Application, Tree, Leaf, Resource
+from taiga.router import TrieRouter
+from taiga.urls import Rule, add_rules, build_lazily, build_unknown_lazily
+
+from .application_test import RootHandler
+
+
+def create_rules():
+    return [
+        Rule('/res/index', endpoint='index'),
+        Rule('/res/read/<key>', endpoint='read'),
+        Rule('/res/page/<int(min=1):page>', endpoint='page'),
+        Rule('/res/file/<path:name>', endpoint='file'),
+        Rule('/res/post', endpoint='post', methods=['POST']),
+    ]
+
+
+class RuleTest(unittest.TestCase):
+    def test_lazy_builders(self):
+        url_map = routing.Map(create_rules())
+        rule, = url_map.iter_rules('page')
+        self.assertIs(rule._build.__func__, build_lazily)
+        adapter = url_map.bind('localhost')
+        self.assertEqual(adapter.build('page', {'page': 2}), '/res/page/2')
+        self.assertEqual(adapter.build('page', {'page': 2, 'q': 'a'}),
+                         '/res/page/2?q=a')
+        self.assertIsNot(rule._build_unknown.__func__, build_unknown_lazily)
+        self.assertIs(rule._build.__func__, build_lazily)
+        self.assertEqual(adapter.match('/res/page/3'), ('page', {'page': 3}))
+
+    def test_trie_router(self):
+        router = TrieRouter(routing.Map(create_rules()))
+        self.assertEqual(router.match('/res/read/1', 'GET'),
+                         ('read', {'key': '1'}))
+
+    def test_add_rules(self):
+        url_map = routing.Map(create_rules())
+        matcher = url_map._matcher
+        add_rules(url_map, [
+            Rule('/res/read/<key>/edit', endpoint='edit'),
+            Rule('/res/page/<int(min=1):page>', endpoint='page',
+                 methods=['POST']),
+            Rule('/other', endpoint='other'),
+        ])
+        adapter = url_map.bind('localhost')
+        self.assertEqual(adapter.match('/res/read/1/edit'),
+                         ('edit', {'key': '1'}))
+        self.assertEqual(adapter.match('/res/page/2', 'POST'),
+                         ('page', {'page': 2}))
+        self.assertEqual(adapter.match('/res/read/1'), ('read', {'key': '1'}))
+        self.assertEqual(adapter.build('other'), '/other')
+        self.assertEqual(len(list(url_map.iter_rules('page'))), 2)
+        self.assertIsNot(url_map._matcher, matcher)
+        # the previous matcher, used by requests in flight, is unchanged
+        for path in ('/res/read/1/edit', '/other'):
+            with self.assertRaises(NoMatch):
+                matcher.match('', path, 'GET', False)
+
+
+class RegisterItemsTest(unittest.TestCase):
+    def create_tree(self):
+        return Tree(endpoint='', url='/', name='', items=[
+            Tree(endpoint='api', url='/api', name='Api', items=[
+                Resource(None, endpoint='res', url='/res', name='Res'),
+            ]),
+            Leaf(endpoint='root', url='/root', name='', handler=RootHandler),
+        ])
+
+    def request(self, path, method='GET'):
+        return test_utils.EnvironBuilder(
+            path=path, method=method).get_request()
+
+    def register(self, app):
+        api = app.tree.items[0]
+        api.register_items([
+            Resource(None, endpoint='new', url='/new', name='New'),
+            Leaf(endpoint='leaf', url='/leaf', name='', handler=RootHandler),
+        ])
+
+    def assertRegistered(self, app):
+        self.assertEqual(app.match_request(self.request('/api/new/read/1')),
+                         ('api:new:read', {'key': '1'}))
+        self.assertEqual(app.match_request(self.request('/api/new/index')),
+                         ('api:new:index', {}))
+        self.assertEqual(app.match_request(self.request('/api/res/index')),
+                         ('api:res:index', {}))
+        request = self.request('/api/leaf')
+        self.assertEqual(app.match_request(request), ('api:leaf', {}))
+        self.assertEqual(app.get_url_for(request)('api:new:read', {'key': 2}),
+                         '/api/new/read/2')
+        self.assertIs(app.endpoint_map['api:leaf'], RootHandler)
+        reply = app.dispatch_request(request)
+        self.assertEqual(reply.response, [b'ok'])
+
+    def test_register_items(self):
+        app = Application(self.create_tree())
+        url_map, rules = app.url_map, len(app.get_url_rules())
+        static_routes = app.static_routes
+        self.register(app)
+        self.assertIs(app.url_map, url_map)
+        self.assertEqual(len(app.get_url_rules()), rules + 6)
+        self.assertEqual(len(list(url_map.iter_rules())), rules + 6)
+        self.assertEqual(static_routes[('/api/leaf', None)], 'api:leaf')
+        self.assertRegistered(app)
+
+    def test_register_items_trie_router(self):
+        app = Application(self.create_tree(), router=TrieRouter)
+        router = app.router
+        self.register(app)
+        self.assertIsNot(app.router, router)
+        self.assertIsNone(router.match('/api/new/read/1', 'GET'))
+        self.assertEqual(app.router.match('/api/new/read/1', 'GET'),
+                         ('api:new:read', {'key': '1'}))
+        self.assertRegistered(app)
+
+    def test_register_items_lazy(self):
+        app = Application(self.create_tree(), lazy=True)
+        self.register(app)
+        self.assertIsNone(app._url_map)
+        self.assertRegistered(app)
+
+    def test_register_items_matches_compile(self):
+        app = Application(self.create_tree())
+        self.register(app)
+        compiled = Application(app.tree)
+        self.assertEqual(
+            sorted(rule.rule for rule in app.get_url_rules()),
+            sorted(rule.rule for rule in compiled.get_url_rules()))
+        self.assertEqual(app.static_routes, compiled.static_routes)
+        self.assertEqual(app.endpoint_map, compiled.endpoint_map)
+
+
+class LazyApplicationTest(unittest.TestCase):
+    def create_tree(self):
+        return Tree(endpoint='', url='/', name='', items=[
+            Resource(None, endpoint='res', url='/res', name='Res'),
+            Leaf(endpoint='root', url='/root', name='', handler=RootHandler),
+        ])
+
+    def request(self, path):
+        return test_utils.EnvironBuilder(path=path).get_request()
+
+    def test_static_route_without_url_map(self):
+        app = Application(self.create_tree(), lazy=True)
+        self.assertIsNone(app._url_map)
+        reply = app.dispatch_request(self.request('/root'))
+        self.assertEqual(reply.response, [b'ok'])
+        self.assertIsNone(app._url_map)
+        self.assertEqual(app.match_request(self.request('/res/read/1')),
+                         ('res:read', {'key': '1'}))
+        self.assertIsNotNone(app._url_map)
+
+    def test_lazy_router(self):
+        app = Application(self.create_tree(), router=TrieRouter, lazy=True)
+        self.assertIsNone(app._router)
+        self.assertIsInstance(app.router, TrieRouter)
+
+    def test_lazy_template_env(self):
+        app = Application(self.create_tree(), lazy=True)
+        self.assertIsNone(app.template_env)
+        self.assertIsNotNone(app.get_template('component.html'))
+        self.assertIsNotNone(app.template_env)